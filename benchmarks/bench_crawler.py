@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# Crawl throughput against a local fake Esplora server with simulated latency.
+# Run from the repository root: python -m benchmarks.bench_crawler
+from __future__ import annotations
+
+import argparse
+import time
+
+from src.crawler import AddressCrawler
+from src.providers.blockstream import BlockstreamProvider, RateLimiter
+from benchmarks.fake_esplora import FakeEsplora
+from benchmarks.common import synthetic_txs
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="AddressCrawler benchmark against FakeEsplora")
+    p.add_argument("--txs", type=int, default=3000)
+    p.add_argument("--addresses", type=int, default=60)
+    p.add_argument("--workers", default="1,4,16")
+    p.add_argument("--latency", type=float, default=0.02)
+    p.add_argument("--throttle-every", type=int, default=50)
+    args = p.parse_args()
+
+    txs = synthetic_txs(args.txs, n_addrs=args.addresses * 10)
+    frontier = [f"A{i}" for i in range(args.addresses)]
+    print(f"{'workers':>7} {'seconds':>8} {'txs':>6} {'dups':>6} {'requests':>8} {'429s':>5}")
+    for w in (int(x) for x in args.workers.split(",")):
+        with FakeEsplora(txs, latency=args.latency, throttle_every=args.throttle_every) as srv:
+            provider = BlockstreamProvider(base_url=srv.base_url, limiter=RateLimiter(), pool_size=w)
+            t = time.perf_counter()
+            res = AddressCrawler(provider, workers=w).crawl(frontier)
+            sec = time.perf_counter() - t
+            print(f"{w:>7} {sec:>8.2f} {len(res.txs):>6} {res.duplicates:>6} {srv.requests:>8} {srv.throttled:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# Dataset.load time and peak memory: JSON vs chunked binary (.bftx).
+# Run from the repository root: python -m benchmarks.bench_dataset_load
+from __future__ import annotations
+
+import argparse
+import tempfile
+from pathlib import Path
+
+from src.dataset import Dataset
+from benchmarks.common import synthetic_txs, timed, traced_peak
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Dataset.load benchmark (JSON vs .bftx)")
+    p.add_argument("--sizes", default="10000,50000,200000")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    print(f"{'txs':>8} {'format':>6} {'MB':>8} {'load s':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory(prefix="bf_bench_") as td:
+        for n in (int(x) for x in args.sizes.split(",")):
+            ds = Dataset(root_address="bench", txs=synthetic_txs(n))
+            for suffix in (".json", ".bftx"):
+                path = Path(td) / f"ds{n}{suffix}"
+                ds.save(path)
+                sec, _ = timed(lambda: Dataset.load(path), repeat=args.repeat)
+                peak = traced_peak(lambda: Dataset.load(path))
+                print(f"{n:>8} {suffix[1:]:>6} {path.stat().st_size / 1e6:>8.1f} {sec:>8.3f} {peak / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
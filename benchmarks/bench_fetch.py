@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# `fetch` pipeline throughput against a local fake Esplora server: one address
+# with a long history, written as JSON or *.bftx, with and without page
+# prefetching, and with the stdlib json decoder vs orjson (when installed).
+# History pages are a chain (each request names the last txid of the previous
+# page), so prefetching hides normalization and writing behind the requests,
+# not the requests themselves.
+# Run from the repository root:
+#   python -m benchmarks.bench_fetch --txs 20000 --latency 0.005
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+from dataclasses import replace
+from pathlib import Path
+
+from src.fetch_pipeline import fetch_to_file
+from src.providers import jsondecode
+from src.providers.blockstream import BlockstreamProvider
+from src.providers.cache import ResponseCache
+from benchmarks.fake_esplora import FakeEsplora
+from benchmarks.common import synthetic_txs
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Pipelined fetch benchmark against FakeEsplora")
+    p.add_argument("--txs", type=int, default=20_000, help="History length of the fetched address.")
+    p.add_argument("--latency", type=float, default=0.005, help="Seconds per request.")
+    p.add_argument("--prefetch", default="0,2")
+    p.add_argument("--formats", default="json,bftx")
+    args = p.parse_args()
+
+    # every tx spends from A0, so its history holds all of them
+    txs = [replace(tx, vin=[replace(tx.vin[0], addr="A0"), *tx.vin[1:]])
+           for tx in synthetic_txs(args.txs, n_addrs=1000)]
+    decoders = ["json"]
+    try:
+        import orjson  # noqa: F401
+
+        decoders.append("orjson")
+    except ImportError:
+        print("orjson not installed: stdlib json only")
+
+    print(f"{'source':<6} {'format':<6} {'decoder':<7} {'prefetch':>8} {'seconds':>8} {'tx/s':>8} "
+          f"{'fetch':>7} {'norm':>7} {'write':>7} {'wait':>7}")
+    with FakeEsplora(txs, latency=args.latency) as srv, tempfile.TemporaryDirectory(prefix="bf_fetch_") as td:
+        # "http": every page from the server; "cache": the same pages from a
+        # warm ResponseCache, where decoding and writing dominate
+        cache = ResponseCache(Path(td) / "cache.sqlite")
+        for source in ("http", "cache"):
+            for fmt in args.formats.split(","):
+                for dec in decoders:
+                    jsondecode._loads, jsondecode._name = (json.loads, "json") if dec == "json" else (None, "")
+                    for depth in (int(x) for x in args.prefetch.split(",")):
+                        if source == "http":
+                            provider = BlockstreamProvider(base_url=srv.base_url, cache=cache)
+                            cache._db.execute("DELETE FROM responses")
+                        else:
+                            # not offline=True: that would turn prefetching off
+                            provider = BlockstreamProvider(base_url=srv.base_url, cache=cache)
+                        st = fetch_to_file(provider, "A0", Path(td) / f"out.{fmt}", limit=args.txs, prefetch=depth)
+                        print(f"{source:<6} {fmt:<6} {st.decoder:<7} {depth:>8} {st.total_seconds:>8.2f} "
+                              f"{st.txs / st.total_seconds:>8.0f} {st.fetch_seconds:>7.2f} "
+                              f"{st.normalize_seconds:>7.2f} {st.write_seconds:>7.2f} {st.wait_seconds:>7.2f}",
+                              flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# Address-graph construction: networkx build_graphs vs NumPy edge list.
+# Run from the repository root: python -m benchmarks.bench_graph
+from __future__ import annotations
+
+import argparse
+import random
+
+from src.edgelist import build_edge_list
+from src.graph_build import build_graphs, graph_stats
+from src.providers.blockstream import Tx, TxIO
+from src.txtable import TxTable
+from benchmarks.common import synthetic_txs, timed
+
+
+def with_consolidations(n_txs: int, n_big: int, width: int, seed: int = 11):
+    # Regular workload plus a few exchange-style txs with `width` inputs and outputs.
+    txs = synthetic_txs(n_txs)
+    rnd = random.Random(seed)
+    n_addrs = max(n_txs // 2, 10)
+    for k in range(n_big):
+        vin = [TxIO(addr=f"A{rnd.randrange(n_addrs)}", value_btc=round(rnd.random(), 8)) for _ in range(width)]
+        vout = [TxIO(addr=f"A{rnd.randrange(n_addrs)}", value_btc=round(rnd.random(), 8)) for _ in range(width)]
+        txs.append(Tx(txid=f"big{k}", time=1_800_000_000 + k, vin=vin, vout=vout, fee_btc=0.001))
+    return txs
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="build_graphs vs build_edge_list")
+    p.add_argument("--sizes", default="10000,50000")
+    p.add_argument("--big", type=int, default=5, help="number of wide txs added")
+    p.add_argument("--width", type=int, default=500, help="inputs/outputs per wide tx")
+    p.add_argument("--repeat", type=int, default=1)
+    args = p.parse_args()
+
+    print(f"{'txs':>8} {'edges':>9} {'networkx s':>11} {'edgelist s':>11} {'speedup':>8}")
+    for n in (int(x) for x in args.sizes.split(",")):
+        table = TxTable.from_txs(with_consolidations(n, args.big, args.width))
+        t_nx, g = timed(lambda: build_graphs(table), repeat=args.repeat)
+        t_el, el = timed(lambda: build_edge_list(table), repeat=args.repeat)
+        assert el.stats() == graph_stats(g)
+        print(f"{len(table):>8} {len(el.address):>9} {t_nx:>11.3f} {t_el:>11.3f} {t_nx / t_el:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Label stores: JSON dict (OsintLabelStore) vs SQLite (SqliteLabelStore).
+# Load/import time, peak Python memory and lookup_many throughput.
+# Run from the repository root: python -m benchmarks.bench_labels
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from src.osint import OsintLabelStore, SqliteLabelStore
+from benchmarks.common import traced_peak
+
+KINDS = ("exchange", "mixer", "service", "gambling", "other")
+
+
+def write_dump(td: Path, n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    rows = [(f"bc1q{rnd.getrandbits(160):040x}", rnd.choice(KINDS), f"entity{rnd.randrange(5000)}", "bench")
+            for _ in range(n)]
+    csv_path = td / f"labels{n}.csv"
+    with csv_path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["address", "kind", "name", "source"])
+        w.writerows(rows)
+    json_path = td / f"labels{n}.json"
+    json_path.write_text(json.dumps({a: {"kind": k, "name": nm, "source": s} for a, k, nm, s in rows}), encoding="utf-8")
+    return rows, csv_path, json_path
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="OSINT label store benchmark")
+    p.add_argument("--sizes", default="100000,1000000")
+    p.add_argument("--lookups", type=int, default=100_000)
+    args = p.parse_args()
+
+    print(f"{'labels':>8} {'store':>6} {'load s':>8} {'peak MB':>8} {'disk MB':>8} {'lookups/s':>10}")
+    with tempfile.TemporaryDirectory(prefix="bf_bench_") as td:
+        td = Path(td)
+        for n in (int(x) for x in args.sizes.split(",")):
+            rows, csv_path, json_path = write_dump(td, n)
+            rnd = random.Random(1)
+            # half labeled, half unknown
+            queries = [rnd.choice(rows)[0] if i % 2 else f"1unknown{i}" for i in range(args.lookups)]
+
+            t = time.perf_counter()
+            store = OsintLabelStore()
+            store.load_json(json_path)
+            load = time.perf_counter() - t
+            peak = traced_peak(lambda: OsintLabelStore().load_json(json_path))
+            t = time.perf_counter()
+            store.lookup_many(queries)
+            rate = len(queries) / (time.perf_counter() - t)
+            print(f"{n:>8} {'json':>6} {load:>8.2f} {peak / 1e6:>8.1f} {json_path.stat().st_size / 1e6:>8.1f} {rate:>10.0f}")
+            del store
+
+            def imp(path: Path) -> None:
+                with SqliteLabelStore(path) as db:
+                    db.import_file(csv_path)
+
+            db_path = td / f"labels{n}.sqlite"
+            t = time.perf_counter()
+            imp(db_path)
+            load = time.perf_counter() - t
+            peak = traced_peak(lambda: imp(td / f"labels{n}_peak.sqlite"))
+            with SqliteLabelStore(db_path) as db:
+                t = time.perf_counter()
+                db.lookup_many(queries)
+                rate = len(queries) / (time.perf_counter() - t)
+            print(f"{n:>8} {'sqlite':>6} {load:>8.2f} {peak / 1e6:>8.1f} {db_path.stat().st_size / 1e6:>8.1f} {rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# analyze --workers scaling: single-process pipeline vs analyze_parallel with
+# 1..N workers, checking that every run produces the same clusters, profiles
+# and graph stats.
+# Run from the repository root: python -m benchmarks.bench_parallel
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from dataclasses import asdict
+
+from src.clustering import build_clusters
+from src.edgelist import build_edge_list
+from src.parallel import analyze_parallel
+from src.profiling import build_address_profiles
+from src.txtable import TxTable
+from benchmarks.common import synthetic_txs
+
+
+def fingerprint(clusters, profiles, stats):
+    return (
+        [sorted(c) for c in clusters.clusters],
+        clusters.notes,
+        [(a, asdict(p)) for a, p in profiles.items()],
+        stats,
+    )
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Multiprocess analysis scaling benchmark")
+    p.add_argument("--txs", type=int, default=100_000)
+    p.add_argument("--addresses", type=int, default=0, help="Address pool size (default: txs / 2).")
+    p.add_argument("--workers", default=",".join(str(w) for w in (1, 2, 4, 8, 16, 32) if w <= (os.cpu_count() or 1)) or "1")
+    args = p.parse_args()
+
+    table = TxTable.from_txs(synthetic_txs(args.txs, n_addrs=args.addresses))
+    print(f"cpus={os.cpu_count()} txs={len(table)} addresses={len(table.addrs)}")
+
+    t = time.perf_counter()
+    clusters = build_clusters(table)
+    profiles = build_address_profiles(table)
+    stats = build_edge_list(table).stats()
+    base = time.perf_counter() - t
+    expect = fingerprint(clusters, profiles, stats)
+    print(f"{'workers':>7} {'seconds':>8} {'speedup':>8} {'same':>5}")
+    print(f"{'single':>7} {base:>8.2f} {1.0:>8.2f} {'-':>5}")
+    for w in (int(x) for x in args.workers.split(",")):
+        t = time.perf_counter()
+        res = analyze_parallel(table, w)
+        sec = time.perf_counter() - t
+        same = fingerprint(res.clusters, res.profiles, res.graph_stats) == expect
+        print(f"{w:>7} {sec:>8.2f} {base / sec:>8.2f} {'yes' if same else 'NO':>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# Scaling benchmark for build_address_profiles.
+# Run from the repository root: python -m benchmarks.bench_profiling
+from __future__ import annotations
+
+import argparse
+
+from src.profiling import build_address_profiles
+from benchmarks.common import synthetic_txs, timed
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="build_address_profiles scaling benchmark")
+    p.add_argument("--sizes", default="2000,8000,32000,128000")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    print(f"{'txs':>9} {'addrs':>9} {'seconds':>9} {'us/tx':>9}")
+    for n in (int(x) for x in args.sizes.split(",")):
+        txs = synthetic_txs(n)
+        sec, profiles = timed(lambda: build_address_profiles(txs), repeat=args.repeat)
+        print(f"{n:>9} {len(profiles):>9} {sec:>9.3f} {sec / n * 1e6:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# Bulk pubkey extraction against a local fake Esplora server with simulated latency.
+# Run from the repository root: python -m benchmarks.bench_pubkeys
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+from src.pubkeys import PubkeyExtractor
+from src.providers.blockstream import BlockstreamProvider, RateLimiter
+from benchmarks.fake_esplora import FakeEsplora, esplora_tx
+from benchmarks.common import synthetic_txs
+
+
+def raw_txs(n_txs: int, n_keys: int, seed: int = 7) -> List[Dict[str, Any]]:
+    # synthetic_txs with spending data: witness or scriptsig pubkeys drawn from
+    # a pool of n_keys, so keys are reused across txs.
+    rnd = random.Random(seed)
+    keys = [f"0{rnd.choice('23')}{rnd.getrandbits(256):064x}" for _ in range(n_keys)]
+    out = []
+    for tx in synthetic_txs(n_txs):
+        raw = esplora_tx(tx)
+        for vin in raw["vin"]:
+            pk = rnd.choice(keys)
+            if rnd.random() < 0.7:
+                vin["txinwitness"] = ["30" * 36, pk]
+            else:
+                vin["scriptsig_asm"] = f"OP_PUSHBYTES_72 {'30' * 36} OP_PUSHBYTES_33 {pk}"
+        out.append(raw)
+    return out
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="PubkeyExtractor benchmark against FakeEsplora")
+    p.add_argument("--txs", type=int, default=5000)
+    p.add_argument("--keys", type=int, default=5_000)
+    p.add_argument("--workers", default="8,32")
+    p.add_argument("--latency", type=float, default=0.02)
+    args = p.parse_args()
+
+    txs = raw_txs(args.txs, args.keys)
+    txids = [t["txid"] for t in txs]
+    print(f"{'workers':>7} {'seconds':>8} {'txs':>6} {'pubkeys':>8} {'reused':>7} {'tx/s':>7}")
+    for w in (int(x) for x in args.workers.split(",")):
+        with FakeEsplora(txs, latency=args.latency) as srv:
+            provider = BlockstreamProvider(base_url=srv.base_url, limiter=RateLimiter(), pool_size=w)
+            t = time.perf_counter()
+            idx = PubkeyExtractor(provider, workers=w).extract(txids)
+            sec = time.perf_counter() - t
+            print(f"{w:>7} {sec:>8.2f} {idx.txs:>6} {len(idx.inputs):>8} {len(idx.reused()):>7} {idx.txs / sec:>7.0f}")
+    print(f"sequential at {args.latency * 1000:.0f} ms/request: ~{args.txs * args.latency:.0f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Analysis report formats on synthetic data (src/synthetic.py): write time and
+# size of the indented JSON report vs the sharded *.bfr report, then the cost
+# of looking up one address in each (JSON: parse the whole file; .bfr: open,
+# bisect the index, inflate one chunk), as latency percentiles over random
+# addresses.
+# Run from the repository root:
+#   python -m benchmarks.bench_report --txs 100000 --queries 200
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.report_store import ReportReader
+from src.streaming import StreamingAnalysis
+from src.synthetic import SyntheticChain, SyntheticConfig
+from src.txtable import TxTable
+from benchmarks.common import timed
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="JSON vs sharded report: size, write time, lookup latency")
+    p.add_argument("--txs", type=int, default=100_000)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--seed", type=int, default=7)
+    args = p.parse_args()
+
+    table = TxTable.from_txs(SyntheticChain(SyntheticConfig(n_txs=args.txs, seed=args.seed)).txs())
+    analysis = StreamingAnalysis().add_tables([table])
+    print(f"txs={args.txs} addresses={len(analysis.profiles)}")
+    with tempfile.TemporaryDirectory(prefix="bf_report_") as td:
+        paths = {fmt: Path(td) / f"analysis.{fmt}" for fmt in ("json", "bfr")}
+        print(f"\n{'format':<6} {'write s':>8} {'MB':>8}")
+        for fmt, path in paths.items():
+            sec, _ = timed(lambda: analysis.write_report(path, "A0", 20), repeat=1)
+            print(f"{fmt:<6} {sec:>8.2f} {path.stat().st_size / 1e6:>8.1f}", flush=True)
+
+        rnd = random.Random(args.seed)
+        addrs = rnd.sample(list(analysis.profiles.tx_count), min(args.queries, len(analysis.profiles)))
+        print(f"\n{'lookup':<34} {'p50 ms':>8} {'p95 ms':>8}")
+
+        def row(name: str, ms: list) -> None:
+            print(f"{name:<34} {np.percentile(ms, 50):>8.2f} {np.percentile(ms, 95):>8.2f}", flush=True)
+
+        ms = []
+        for a in addrs[:5]:  # a full parse per lookup; a few are enough
+            t = time.perf_counter()
+            with paths["json"].open(encoding="utf-8") as f:
+                json.load(f)["address_profiles"][a]
+            ms.append((time.perf_counter() - t) * 1e3)
+        row("json (load + lookup)", ms)
+        for name, members in (("bfr profile", None), ("bfr query (+cluster)", 20)):
+            ms = []
+            for a in addrs:
+                t = time.perf_counter()
+                with ReportReader(paths["bfr"]) as r:
+                    r.profile(a) if members is None else r.query(a, members)
+                ms.append((time.perf_counter() - t) * 1e3)
+            row(f"{name} (open each)", ms)
+        with ReportReader(paths["bfr"]) as r:
+            ms = []
+            for a in addrs:
+                t = time.perf_counter()
+                r.profile(a)
+                ms.append((time.perf_counter() - t) * 1e3)
+        row("bfr profile (open once)", ms)
+
+
+if __name__ == "__main__":
+    main()
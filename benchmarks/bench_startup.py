@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# CLI startup cost: wall time of `python main.py <cmd> --help` per subcommand
+# (argument parsing only, so this is import + interpreter startup), a short
+# real command, and the same command sent to a warm `main.py serve` process.
+# Run from the repository root: python -m benchmarks.bench_startup --repeat 10
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+MAIN = str(Path(__file__).resolve().parent.parent / "main.py")
+PUBKEY = "0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798"
+SHORT = ["cdt-pubtoaddr", "--engine", "native", "--check", "0", PUBKEY]
+
+
+def subcommands() -> List[str]:
+    sys.path.insert(0, str(Path(MAIN).parent))
+    from main import build_parser
+
+    sub = next(a for a in build_parser()._actions if isinstance(a, argparse._SubParsersAction))
+    return list(sub.choices)
+
+
+def run_ms(argv: List[str], repeat: int) -> List[float]:
+    out = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        out.append((time.perf_counter() - t) * 1e3)
+    return out
+
+
+def serve_ms(argv: List[str], repeat: int) -> List[float]:
+    proc = subprocess.Popen([sys.executable, MAIN, "serve"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    out = []
+    try:
+        for i in range(repeat + 1):
+            t = time.perf_counter()
+            proc.stdin.write(json.dumps({"id": i, "argv": argv}) + "\n")
+            proc.stdin.flush()
+            resp = json.loads(proc.stdout.readline())
+            if resp["exit"] != 0:
+                raise SystemExit(f"serve request failed: {resp['stderr']}")
+            if i:  # the first request pays for the imports
+                out.append((time.perf_counter() - t) * 1e3)
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    return out
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="CLI startup time per subcommand")
+    p.add_argument("--repeat", type=int, default=10)
+    args = p.parse_args()
+
+    def row(name: str, ms: List[float]) -> None:
+        print(f"{name:<36} {statistics.median(ms):>8.1f} {min(ms):>8.1f}", flush=True)
+
+    print(f"{'command':<36} {'med ms':>8} {'min ms':>8}")
+    row("python -c pass", run_ms([sys.executable, "-c", "pass"], args.repeat))
+    row("import networkx,numpy,requests", run_ms([sys.executable, "-c", "import networkx, numpy, requests"], args.repeat))
+    row("--help", run_ms([sys.executable, MAIN, "--help"], args.repeat))
+    for cmd in subcommands():
+        row(f"{cmd} --help", run_ms([sys.executable, MAIN, cmd, "--help"], args.repeat))
+    row("cdt-pubtoaddr (process)", run_ms([sys.executable, MAIN, *SHORT], args.repeat))
+    row("cdt-pubtoaddr (serve request)", serve_ms(SHORT, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# End-to-end pipeline benchmark on synthetic data (src/synthetic.py): time and
+# peak traced memory per stage and dataset size, saved as JSON so runs can be
+# compared across commits.
+# Run from the repository root:
+#   python -m benchmarks.bench_suite --sizes 10000,100000,1000000
+#   python -m benchmarks.bench_suite --sizes 10000 --compare benchmarks/results/<old>.json
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.clustering import build_clusters
+from src.dataset import Dataset
+from src.edgelist import build_edge_list
+from src.graph_build import build_graphs
+from src.profiling import build_address_profiles
+from src.providers.blockstream import BlockstreamProvider
+from src.streaming import analyze_stream
+from src.synthetic import SyntheticChain, SyntheticConfig
+from src.txtable import TxTable
+from benchmarks.fake_esplora import esplora_tx
+from benchmarks.common import timed, traced_peak
+
+STAGES = [
+    "generate", "normalize_tx", "save_json", "load_json", "save_bftx", "load_bftx",
+    "build_graphs", "build_edge_list", "build_clusters", "build_address_profiles", "analyze_stream",
+]
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", *args], capture_output=True, text=True, timeout=10, cwd=Path(__file__).parent)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() if out.returncode == 0 else None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def _normalize_all(provider: BlockstreamProvider, raw: List[Dict[str, Any]]) -> list:
+    return [provider.normalize_tx(r) for r in raw]
+
+
+def stage_calls(
+    n: int, td: Path, cfg: SyntheticConfig, normalize_max: int,
+) -> List[Tuple[str, int, Callable[[], Callable[[], Any]]]]:
+    # (stage, items, setup). setup() builds the stage's inputs and returns the
+    # fn to measure; inputs are shared between stages but only built when a
+    # stage that needs them runs. Each fn is self-contained so it can be run
+    # again for the memory measurement.
+    built: Dict[str, Any] = {}
+
+    def once(key: str, make: Callable[[], Any]) -> Any:
+        if key not in built:
+            built[key] = make()
+        return built[key]
+
+    txs = lambda: once("txs", lambda: list(SyntheticChain(cfg).txs()))
+    ds = lambda: once("ds", lambda: Dataset(root_address="synthetic", txs=txs()))
+    table = lambda: once("table", lambda: TxTable.from_txs(txs()))
+    saved = lambda path: once(str(path), lambda: ds().save(path) or path)
+    raw = lambda: [esplora_tx(t) for t in txs()[:normalize_max]]
+    js, bf = td / f"synth{n}.json", td / f"synth{n}.bftx"
+    return [
+        ("generate", n, lambda: lambda: list(SyntheticChain(cfg).txs())),
+        ("normalize_tx", min(n, normalize_max), lambda: partial(_normalize_all, BlockstreamProvider(), raw())),
+        ("save_json", n, lambda: partial(ds().save, js)),
+        ("load_json", n, lambda: partial(Dataset.load, saved(js))),
+        ("save_bftx", n, lambda: partial(ds().save, bf)),
+        ("load_bftx", n, lambda: partial(Dataset.load, saved(bf))),
+        ("build_graphs", n, lambda: partial(build_graphs, table())),
+        ("build_edge_list", n, lambda: partial(build_edge_list, table())),
+        ("build_clusters", n, lambda: partial(build_clusters, table())),
+        ("build_address_profiles", n, lambda: partial(build_address_profiles, table())),
+        ("analyze_stream", n, lambda: partial(analyze_stream, saved(bf), td / "analysis.json")),
+    ]
+
+
+def compare(results: List[Dict[str, Any]], baseline: Path, threshold: float) -> int:
+    old = {(r["txs"], r["stage"]): r for r in json.loads(baseline.read_text(encoding="utf-8"))["results"]}
+    print(f"\nvs {baseline}")
+    print(f"{'txs':>8} {'stage':<24} {'old s':>8} {'new s':>8} {'ratio':>6} {'old MB':>8} {'new MB':>8}")
+    slower = 0
+    for r in results:
+        o = old.get((r["txs"], r["stage"]))
+        if o is None:
+            continue
+        ratio = r["seconds"] / o["seconds"] if o["seconds"] else float("inf")
+        mark = " SLOWER" if ratio > threshold else ""
+        slower += bool(mark)
+        mb = lambda x: f"{x['peak_mb']:>8.1f}" if x.get("peak_mb") is not None else f"{'-':>8}"
+        print(f"{r['txs']:>8} {r['stage']:<24} {o['seconds']:>8.3f} {r['seconds']:>8.3f} {ratio:>6.2f} "
+              f"{mb(o)} {mb(r)}{mark}")
+    return slower
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="End-to-end pipeline benchmark on synthetic data")
+    p.add_argument("--sizes", default="10000,100000,1000000")
+    p.add_argument("--stages", default=",".join(STAGES), help="Comma-separated subset of: " + ",".join(STAGES))
+    p.add_argument("--repeat", type=int, default=1)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--no-memory", action="store_true", help="Skip the (slower) traced peak-memory runs.")
+    p.add_argument("--networkx-max", type=int, default=100_000,
+                   help="Skip build_graphs above this many txs (networkx needs several GB at 1M).")
+    p.add_argument("--normalize-max", type=int, default=100_000,
+                   help="normalize_tx runs over at most this many raw txs.")
+    p.add_argument("--out", help=f"Results JSON (default: {RESULTS_DIR.name}/<commit>-<time>.json).")
+    p.add_argument("--compare", help="Earlier results JSON to compare against.")
+    p.add_argument("--threshold", type=float, default=1.10, help="Ratio flagged as a slowdown.")
+    args = p.parse_args()
+
+    wanted = [s for s in args.stages.split(",") if s]
+    unknown = set(wanted) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    env = environment()
+    results: List[Dict[str, Any]] = []
+    print(f"{'txs':>8} {'stage':<24} {'seconds':>8} {'us/item':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory(prefix="bf_suite_") as td:
+        for n in (int(x) for x in args.sizes.split(",")):
+            cfg = SyntheticConfig(n_txs=n, seed=args.seed)
+            for stage, items, setup in stage_calls(n, Path(td), cfg, args.normalize_max):
+                if stage not in wanted or (stage == "build_graphs" and n > args.networkx_max):
+                    continue
+                fn = setup()
+                sec, _ = timed(fn, repeat=args.repeat)
+                peak = None if args.no_memory else traced_peak(fn) / 1e6
+                results.append({"txs": n, "stage": stage, "items": items, "seconds": sec, "peak_mb": peak})
+                peak_s = f"{peak:>8.1f}" if peak is not None else f"{'-':>8}"
+                print(f"{n:>8} {stage:<24} {sec:>8.3f} {sec / max(items, 1) * 1e6:>8.2f} {peak_s}", flush=True)
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{(env['commit'] or 'nogit')[:10]}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    body = {"environment": env, "config": vars(args), "results": results}
+    out.write_text(json.dumps(body, indent=2), encoding="utf-8")
+    print(f"Saved results to {out}")
+    if args.compare:
+        slower = compare(results, Path(args.compare), args.threshold)
+        print(f"{slower} stage(s) slower than {args.threshold:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
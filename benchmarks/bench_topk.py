@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Counterparty tracking on hub-heavy workloads: exact Counter vs SpaceSaving.
+# Reports time, peak memory and top-10 agreement for the hub addresses.
+# Run from the repository root: python -m benchmarks.bench_topk
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import List
+
+from src.profiling import ProfileAggregator
+from src.providers.blockstream import Tx, TxIO
+from benchmarks.common import traced_peak
+
+
+def hub_txs(n_txs: int, n_hubs: int, seed: int = 7) -> List[Tx]:
+    # Exchange-like hot wallets: every tx pays out from one hub. Most payees are
+    # seen once; a Zipf-distributed minority of regular customers repeats.
+    rnd = random.Random(seed)
+    txs = []
+    for i in range(n_txs):
+        hub = f"HUB{i % n_hubs}"
+        outs = []
+        for _ in range(rnd.randint(1, 4)):
+            if rnd.random() < 0.3:
+                outs.append(TxIO(addr=f"C{int(rnd.paretovariate(1.2))}", value_btc=0.01))
+            else:
+                outs.append(TxIO(addr=f"U{i}_{len(outs)}", value_btc=0.01))
+        outs.append(TxIO(addr=hub, value_btc=1.0))
+        txs.append(Tx(txid=f"tx{i}", time=1_700_000_000 + i, vin=[TxIO(addr=hub, value_btc=1.1)], vout=outs, fee_btc=0.0001))
+    return txs
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Top-K counterparty sketch benchmark")
+    p.add_argument("--txs", type=int, default=200_000)
+    p.add_argument("--hubs", type=int, default=4)
+    p.add_argument("--capacity", default="64,256,1024")
+    args = p.parse_args()
+
+    txs = hub_txs(args.txs, args.hubs)
+    hubs = [f"HUB{i}" for i in range(args.hubs)]
+
+    def run(topk):
+        t = time.perf_counter()
+        agg = ProfileAggregator(topk=topk).add_txs(txs)
+        return agg, time.perf_counter() - t
+
+    exact, sec = run(None)
+    peak = traced_peak(lambda: ProfileAggregator().add_txs(txs))
+    want = {h: exact.cp[h].most_common(10) for h in hubs}
+    n = max(sum(exact.cp[h].values()) for h in hubs)
+    print(f"hubs={len(hubs)} counterparties per hub={[len(exact.cp[h]) for h in hubs]} increments per hub<={n}")
+    print(f"{'mode':>10} {'seconds':>8} {'peak MB':>8} {'hub slots':>9} {'top10 recall':>12} {'max rel err':>11} {'err bound':>9}")
+    print(f"{'exact':>10} {sec:>8.2f} {peak / 1e6:>8.1f} {max(len(exact.cp[h]) for h in hubs):>9} {1.0:>12.2f} {0.0:>11.3f} {0:>9}")
+    for cap in (int(x) for x in args.capacity.split(",")):
+        agg, sec = run(cap)
+        peak = traced_peak(lambda: ProfileAggregator(topk=cap).add_txs(txs))
+        recall, rel = [], 0.0
+        for h in hubs:
+            got = dict(agg.cp[h].most_common(10))
+            recall.append(sum(k in got for k, _ in want[h]) / len(want[h]))
+            rel = max([rel] + [abs(got[k] - c) / c for k, c in want[h] if k in got])
+        bound = max(agg.cp[h].error_bound() for h in hubs)
+        print(f"{'approx' + str(cap):>10} {sec:>8.2f} {peak / 1e6:>8.1f} {cap:>9} "
+              f"{min(recall):>12.2f} {rel:>11.3f} {bound:>9}")
+
+
+if __name__ == "__main__":
+    main()
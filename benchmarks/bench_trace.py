@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Fund-flow tracing latency on synthetic data (src/synthetic.py): FlowIndex
+# build/save/load time, then per-query latency percentiles for random source
+# addresses at several hop limits, against a networkx cutoff-BFS over the full
+# address graph (reachability only, no time or value pruning) where affordable.
+# Run from the repository root:
+#   python -m benchmarks.bench_trace --txs 100000 --hops 2,4,6 --queries 200
+from __future__ import annotations
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+
+from src.synthetic import SyntheticChain, SyntheticConfig
+from src.tracing import FlowIndex
+from src.txtable import TxTable
+from benchmarks.common import timed
+
+
+def latencies(fn: Callable[[str], object], sources: List[str]) -> List[float]:
+    out = []
+    for s in sources:
+        t = time.perf_counter()
+        fn(s)
+        out.append((time.perf_counter() - t) * 1e3)
+    return out
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="FlowIndex trace latency benchmark")
+    p.add_argument("--txs", type=int, default=100_000)
+    p.add_argument("--hops", default="2,4,6")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--min-value", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--networkx-max", type=int, default=100_000, help="Skip the networkx baseline above this many txs.")
+    args = p.parse_args()
+
+    table = TxTable.from_txs(SyntheticChain(SyntheticConfig(n_txs=args.txs, seed=args.seed)).txs())
+    sec, idx = timed(lambda: FlowIndex.build(table), repeat=1)
+    print(f"txs={args.txs} addresses={len(table.addrs.names)} flows={len(idx)}")
+    print(f"build {sec:.3f}s")
+    with tempfile.TemporaryDirectory(prefix="bf_trace_") as td:
+        path = Path(td) / "flows.npz"
+        sec, _ = timed(lambda: idx.save(path), repeat=1)
+        print(f"save  {sec:.3f}s ({path.stat().st_size / 1e6:.1f} MB)")
+        sec, idx = timed(lambda: FlowIndex.load(path), repeat=3)
+        print(f"load  {sec:.3f}s")
+
+    rnd = random.Random(args.seed)
+    senders = np.flatnonzero(np.diff(idx.indptr) > 0)
+    sources = [idx.names[int(i)] for i in rnd.sample(list(senders), min(args.queries, len(senders)))]
+    idx.trace(sources[:1])  # first call builds the search key
+
+    g = None
+    if args.txs <= args.networkx_max:
+        from src.edgelist import build_edge_list
+        g = build_edge_list(table).address.to_networkx()
+
+    print(f"\n{'hops':>4} {'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'reached':>8}")
+    for hops in (int(h) for h in args.hops.split(",")):
+        for mode in ("haircut", "poison"):
+            reached: List[int] = []
+
+            def q(s: str) -> None:
+                reached.append(len(idx.trace([s], max_hops=hops, mode=mode, min_value=args.min_value).addrs))
+
+            ms = latencies(q, sources)
+            print(f"{hops:>4} {mode:<8} {np.percentile(ms, 50):>8.2f} {np.percentile(ms, 95):>8.2f} "
+                  f"{max(ms):>8.2f} {int(np.median(reached)):>8}", flush=True)
+        if g is not None:
+            import networkx as nx
+
+            reached = []
+            ms = latencies(lambda s: reached.append(len(nx.single_source_shortest_path_length(g, s, cutoff=hops))),
+                           sources)
+            print(f"{hops:>4} {'networkx':<8} {np.percentile(ms, 50):>8.2f} {np.percentile(ms, 95):>8.2f} "
+                  f"{max(ms):>8.2f} {int(np.median(reached)):>8}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
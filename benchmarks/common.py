@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import random
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from src.providers.blockstream import Tx, TxIO
+
+
+def synthetic_txs(n_txs: int, n_addrs: int = 0, seed: int = 7) -> List[Tx]:
+    # Small random workload: 1-4 inputs, 1-3 outputs, addresses drawn from a pool
+    # that grows with the dataset so the address count scales together with txs.
+    rnd = random.Random(seed)
+    n_addrs = n_addrs or max(n_txs // 2, 10)
+    t0 = 1_700_000_000
+    txs: List[Tx] = []
+    for i in range(n_txs):
+        vin = [TxIO(addr=f"A{rnd.randrange(n_addrs)}", value_btc=round(rnd.random(), 8)) for _ in range(rnd.randint(1, 4))]
+        vout = [TxIO(addr=f"A{rnd.randrange(n_addrs)}", value_btc=round(rnd.random(), 8)) for _ in range(rnd.randint(1, 3))]
+        txs.append(Tx(txid=f"tx{i}", time=t0 + i * 97, vin=vin, vout=vout, fee_btc=0.0001))
+    return txs
+
+
+def timed(fn: Callable[[], object], repeat: int = 3) -> Tuple[float, object]:
+    best = float("inf")
+    res: object = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        res = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, res
+
+
+def traced_peak(fn: Callable[[], object]) -> int:
+    # Peak tracemalloc size in bytes reached while fn runs.
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.providers.blockstream import Tx
+
+
+def esplora_tx(tx: Tx) -> Dict[str, Any]:
+    # Inverse of BlockstreamProvider.normalize_tx for the fields it reads.
+    def sat(v: float) -> int:
+        return int(round(v * 100_000_000))
+
+    def addr(a: str) -> Optional[str]:
+        return None if a == "UNKNOWN" else a
+
+    return {
+        "txid": tx.txid,
+        "status": {"confirmed": True, "block_time": tx.time},
+        "fee": sat(tx.fee_btc),
+        "vin": [{"prevout": {"scriptpubkey_address": addr(io.addr), "value": sat(io.value_btc)}} for io in tx.vin],
+        "vout": [{"scriptpubkey_address": addr(io.addr), "value": sat(io.value_btc)} for io in tx.vout],
+    }
+
+
+class FakeEsplora:
+    # Local Esplora-compatible HTTP server for exercising providers and crawlers
+    # without network access. Serves /tx/:txid, /address/:a/txs and
+    # /address/:a/txs/chain/:last_txid (newest first, page_size per page).
+    #
+    # latency:        seconds slept per request (simulates a remote API)
+    # throttle_every: answer every Nth request with 429 (0 disables)
+    #
+    #   with FakeEsplora(txs) as srv:
+    #       provider = BlockstreamProvider(base_url=srv.base_url)
+
+    def __init__(
+        self,
+        txs: Iterable[Any],
+        page_size: int = 25,
+        latency: float = 0.0,
+        throttle_every: int = 0,
+        retry_after: float = 0.05,
+    ):
+        self.page_size = page_size
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.txs: Dict[str, Dict[str, Any]] = {}
+        by_addr: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for t in txs:
+            raw = t if isinstance(t, dict) else esplora_tx(t)
+            self.txs[raw["txid"]] = raw
+            addrs = {(i.get("prevout") or {}).get("scriptpubkey_address") for i in raw["vin"]}
+            addrs |= {o.get("scriptpubkey_address") for o in raw["vout"]}
+            for a in addrs - {None}:
+                by_addr[a].append(raw)
+        # unconfirmed (no block_time) first, then newest block first
+        self.by_addr = {a: sorted(v, key=lambda r: -r["status"].get("block_time", math.inf)) for a, v in by_addr.items()}
+        self.hits: Counter = Counter()
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        assert self._server is not None, "server not started"
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeEsplora":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                status, body, headers = fake.handle(self.path)
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        Handler.protocol_version = "HTTP/1.1"
+        # headers and body go out in separate writes; with Nagle on, the body
+        # waits for the client's delayed ACK (~40 ms per keep-alive request)
+        Handler.disable_nagle_algorithm = True
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeEsplora":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    def handle(self, path: str):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            throttle = self.throttle_every and self.requests % self.throttle_every == 0
+            if throttle:
+                self.throttled += 1
+            else:
+                self.hits[path] += 1
+        if throttle:
+            return 429, b"{}", {"Retry-After": str(self.retry_after)}
+
+        parts = [p for p in path.split("?")[0].split("/") if p]
+        if len(parts) == 2 and parts[0] == "tx" and parts[1] in self.txs:
+            return 200, json.dumps(self.txs[parts[1]]).encode(), {}
+        if len(parts) >= 3 and parts[0] == "address" and parts[2] == "txs":
+            hist = self.by_addr.get(parts[1], [])
+            start = 0
+            if len(parts) == 5 and parts[3] == "chain":
+                idx = next((i for i, r in enumerate(hist) if r["txid"] == parts[4]), None)
+                if idx is None:
+                    return 404, b"{}", {}
+                start = idx + 1
+            elif len(parts) != 3:
+                return 404, b"{}", {}
+            return 200, json.dumps(hist[start: start + self.page_size]).encode(), {}
+        return 404, b"{}", {}
@@ -2,69 +2,459 @@
 from __future__ import annotations
 
 import argparse
+import io
 import json
+import math
 import subprocess
+import sys
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Sequence
 
-from src.providers.blockstream import BlockstreamProvider
-from src.dataset import Dataset
-from src.graph_build import build_graphs
-from src.clustering import build_clusters
-from src.profiling import build_address_profiles, summarize_cluster
+# Subcommands import what they use inside the cmd_* functions: networkx, numpy
+# and requests alone take ~0.3 s to import, which dominates short commands
+# (cdt-pubtoaddr, labels-lookup, cluster-info, --help).
+if TYPE_CHECKING:
+    from src.enrichment import EnrichmentCache
+    from src.metrics import Metrics
+    from src.providers.blockstream import BlockstreamProvider
 
 
 # -----------------------------
 # Standard pipeline
 # -----------------------------
 
+def make_provider(args: argparse.Namespace, **kw) -> BlockstreamProvider:
+    from src.metrics import Metrics
+    from src.providers.blockstream import BlockstreamProvider
+    from src.providers.cache import ResponseCache
+
+    # --metrics-prom: print_cache_stats exports these with the HTTP counters; total_seconds starts here
+    args.provider_metrics = Metrics() if args.metrics_prom else None
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(Path(args.cache), max_bytes=args.cache_max_mb * 1024 * 1024)
+    return BlockstreamProvider(base_url=args.base_url, cache=cache, offline=args.offline, **kw)
+
+
+def print_cache_stats(provider: BlockstreamProvider, args: argparse.Namespace) -> None:
+    if provider.cache is not None:
+        st = provider.cache.stats()
+        print(f"Cache: hits={st['hits']} misses={st['misses']} entries={st['entries']} bytes={st['bytes']}")
+    if provider.retries or provider.throttled or provider.failures:
+        print(f"HTTP: requests={provider.requests} retries={provider.retries} "
+              f"throttled={provider.throttled} failures={provider.failures}")
+    if args.provider_metrics is not None:
+        args.provider_metrics.add_provider(provider)
+        export_metrics(args, args.provider_metrics, args.cmd)
+
+
 def cmd_fetch(args: argparse.Namespace) -> None:
-    provider = BlockstreamProvider(base_url=args.base_url)
-    txs = provider.fetch_address_txs(args.address, limit=args.limit)
-    ds = Dataset(root_address=args.address, txs=txs)
-    ds.save(Path(args.out))
-    print(f"Saved dataset to {args.out} (txs={len(txs)})")
+    from src.fetch_pipeline import fetch_to_file
+
+    provider = make_provider(args)
+    if args.update:
+        cmd_fetch_update(args, provider)
+        return
+    if not args.address:
+        raise SystemExit("fetch: an address is required unless --update is given")
+    out = Path(args.out or "dataset.json")
+    # Pages are prefetched while earlier ones are normalized and written out.
+    stats = fetch_to_file(provider, args.address, out, limit=200 if args.limit is None else args.limit, prefetch=args.prefetch)
+    print(f"Saved dataset to {out} (txs={stats.txs})")
+    print(stats.summary())
+    if args.provider_metrics is not None:
+        stats.record(args.provider_metrics)
+    print_cache_stats(provider, args)
+
+
+def cmd_fetch_update(args: argparse.Namespace, provider: BlockstreamProvider) -> None:
+    # Fetch only what is newer than the stored history, then merge by txid.
+    from src.dataset import Dataset
+    from src.providers.blockstream import PAGE_SIZE
+    from src.txtable import iter_rows
+
+    src = Path(args.update)
+    out = Path(args.out or args.update)
+    ds = Dataset.load(src)
+    address = args.address or ds.root_address
+    # Without --limit, paging goes on until it reaches the stored history: a
+    # cap hit before that would leave a gap no later update fills.
+    new_txs, complete = provider.fetch_new_address_txs(address, ds.tx_times(), limit=args.limit)
+    merged = ds.merged(new_txs)
+    merged.save(out)
+
+    # A full refetch would page through the same history (up to --limit).
+    stored = sum(1 for row in iter_rows(ds.txs) if any(a == address for a, _ in row.ins + row.outs))
+    total = len(new_txs) + stored
+    full = max(1, math.ceil((total if args.limit is None else min(args.limit, total)) / PAGE_SIZE))
+    added = len(merged.txs) - len(ds.txs)
+    print(f"Saved dataset to {out} (txs={len(merged.txs)}, new={added}, refreshed={len(new_txs) - added})")
+    if not complete:
+        print(f"Warning: stopped at --limit {args.limit} before reaching the stored history; txs between the "
+              f"{len(new_txs)} fetched and the stored ones may be missing. Rerun without --limit to fill the gap.")
+    print(f"Requests: {provider.requests} sent, ~{full} for a full refetch, ~{max(full - provider.requests, 0)} saved")
+    print_cache_stats(provider, args)
+
+
+def cmd_crawl(args: argparse.Namespace) -> None:
+    from src.crawler import AddressCrawler
+    from src.dataset import Dataset
+    from src.providers.blockstream import RateLimiter
+
+    provider = make_provider(args, limiter=RateLimiter(rate=args.rps, burst=args.workers), pool_size=args.workers)
+    crawler = AddressCrawler(
+        provider, workers=args.workers, per_address_limit=args.limit, max_addresses=args.max_addresses
+    )
+    res = crawler.crawl(args.addresses, max_depth=args.depth)
+    Dataset(root_address=args.addresses[0], txs=res.txs).save(Path(args.out))
+    for a, err in res.failed.items():
+        print(f"Failed to fetch {a}: {err}")
+    print(
+        f"Saved dataset to {args.out} (txs={len(res.txs)}, addresses={len(res.depth)}, "
+        f"duplicates={res.duplicates}, failed={len(res.failed)})"
+    )
+    print_cache_stats(provider, args)
+
+
+def open_labels(args: argparse.Namespace):
+    # (label store, enrichment cache) for analyze --labels, or (None, None).
+    from src.enrichment import EnrichmentCache
+    from src.osint import open_label_store
+
+    if not args.labels:
+        return None, None
+    store = open_label_store(Path(args.labels))
+    cache = None
+    if not args.no_label_cache:
+        cache = EnrichmentCache(Path(args.label_cache), store.fingerprint())
+    return store, cache
+
+
+def print_label_stats(cache: Optional[EnrichmentCache]) -> None:
+    if cache is not None:
+        print(f"Cluster label cache: hits={cache.hits} misses={cache.misses}")
+
+
+def open_metrics(args: argparse.Namespace) -> Optional[Metrics]:
+    from src.metrics import Metrics
+
+    if not (args.metrics or args.metrics_prom):
+        return None
+    return Metrics(memory=args.metrics_memory)
+
+
+def export_metrics(args: argparse.Namespace, metrics: Optional[Metrics], command: str) -> None:
+    if metrics is not None and args.metrics_prom:
+        metrics.write_prometheus(Path(args.metrics_prom), command)
+        print(f"Saved metrics to {args.metrics_prom}")
+
+
+def write_cluster_index(args: argparse.Namespace, clusters, profiles, enrichment, store=None, ia=None) -> None:
+    # ia: the IncrementalAnalysis of analyze --incremental, whose index is
+    # patched in place if it was written by the workspace's previous run
+    if args.cluster_index is None:
+        return
+    from src.cluster_index import ClusterIndex, default_index_path
+
+    path = Path(args.cluster_index) if args.cluster_index else default_index_path(Path(args.out))
+    labels = {cid: cl.to_json() for cid, cl in enrichment.labels.items()} if enrichment is not None else None
+    source = store.fingerprint() if store is not None else ""
+    updated = False
+    if ia is not None:
+        idx, updated = ClusterIndex.update(path, clusters, profiles, ia.touched, ia.base, ia.state, labels, source)
+    else:
+        idx = ClusterIndex.build(path, clusters, profiles, labels, label_source=source)
+    with idx:
+        st = idx.stats()
+    print(f"{'Updated' if updated else 'Saved'} cluster index {'at' if updated else 'to'} {path} "
+          f"(clusters={st['clusters']}, addresses={st['addresses']})")
 
 
 def cmd_analyze(args: argparse.Namespace) -> None:
-    ds = Dataset.load(Path(args.dataset))
-    graphs = build_graphs(ds.txs)
-    clusters = build_clusters(ds.txs)
-    profiles = build_address_profiles(ds.txs)
-
-    cluster_summaries = []
-    for i, c in enumerate(clusters.clusters[: args.max_clusters]):
-        cluster_summaries.append(
-            {"cluster_id": i, "addresses": sorted(c), "summary": summarize_cluster(c, profiles)}
-        )
+    if sum([args.stream, args.workers > 1, args.incremental, args.window is not None]) > 1:
+        raise SystemExit("analyze: --stream, --workers, --incremental and --window are exclusive")
+    if args.graph_backend == "networkx" and args.workers > 1:
+        raise SystemExit("analyze: --workers computes the graph stats from edge lists (--graph-backend edgelist)")
+    if args.graph_backend is not None and (args.stream or args.incremental or args.window is not None):
+        raise SystemExit("analyze: --graph-backend applies to the in-memory pipeline and --workers only")
+    if args.incremental and (args.from_time is not None or args.to_time is not None):
+        raise SystemExit("analyze: --from/--to do not apply to --incremental (the workspace covers the whole dataset)")
+    from src.metrics import stage
+    from src.heuristics import parse_heuristics
+
+    try:
+        heuristics = parse_heuristics(args.change_heuristics)
+    except ValueError as e:
+        raise SystemExit(f"analyze: {e}")
+    store, cache = open_labels(args)
+    topk = args.topk_capacity if args.counterparties == "approx" else None
+    metrics = open_metrics(args)
+    timing = metrics is not None
+    if args.incremental:
+        from src.workspace import analyze_incremental
+
+        try:
+            ia = analyze_incremental(Path(args.dataset), Path(args.workspace), Path(args.out),
+                                     max_clusters=args.max_clusters, label_store=store, label_cache=cache, topk=topk,
+                                     metrics=metrics, heuristics=heuristics, change_links=args.change_links)
+        except ValueError as e:
+            raise SystemExit(f"analyze: {e}")
+        print(f"Applied {ia.applied} new transactions (workspace {args.workspace}: {ia.tx_count} total)")
+        print(f"Saved analysis to {args.out}")
+        write_cluster_index(args, ia.clusters, ia.profiles, ia.enrichment, store, ia)
+        print_label_stats(cache)
+        export_metrics(args, metrics, "analyze")
+        return
+    if args.window is not None:
+        cmd_analyze_windows(args, heuristics, metrics)
+        return
+    if args.stream:
+        from src.streaming import analyze_stream
+
+        sa = analyze_stream(Path(args.dataset), Path(args.out), max_clusters=args.max_clusters,
+                            label_store=store, label_cache=cache, topk=topk, metrics=metrics,
+                            heuristics=heuristics, t_from=args.from_time, t_to=args.to_time,
+                            change_links=args.change_links)
+        print(f"Saved analysis to {args.out}")
+        write_cluster_index(args, sa.clusters, sa.profiles, sa.enrichment, store)
+        print_label_stats(cache)
+        export_metrics(args, metrics, "analyze")
+        return
 
-    out = {
-        "root_address": ds.root_address,
-        "tx_count": len(ds.txs),
-        "notes": clusters.notes,
-        "clusters": cluster_summaries,
-        "address_profiles": {
-            a: {
-                "tx_count_involving": p.tx_count_involving,
-                "first_seen": p.first_seen,
-                "last_seen": p.last_seen,
-                "total_in_btc": p.total_in_btc,
-                "total_out_btc": p.total_out_btc,
-                "fees_paid_btc": p.fees_paid_btc,
-                "top_counterparties": p.top_counterparties,
-                "flags": p.flags,
-            }
-            for a, p in profiles.items()
-        },
-        "graph_stats": {
-            "address_graph_nodes": graphs.address_graph.number_of_nodes(),
-            "address_graph_edges": graphs.address_graph.number_of_edges(),
-            "bipartite_nodes": graphs.bipartite_graph.number_of_nodes(),
-            "bipartite_edges": graphs.bipartite_graph.number_of_edges(),
-        },
-    }
-
-    Path(args.out).write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+    from src.clustering import build_clusters
+    from src.dataset import Dataset
+    from src.enrichment import enrich_clusters
+    from src.profiling import build_address_profiles, counterparty_note
+    from src.report import cluster_summaries, write_report
+    from src.txtable import TxTable, known_io_count
+
+    with stage(metrics, "load"):
+        ds = Dataset.load(Path(args.dataset))
+    if args.from_time is not None or args.to_time is not None:
+        from src.txtable import TimeIndex
+
+        with stage(metrics, "time_index"):
+            table = ds.txs if isinstance(ds.txs, TxTable) else TxTable.from_txs(ds.txs)
+            ds.txs = table.take(TimeIndex(table.time).select(args.from_time, args.to_time))
+    if args.workers > 1:
+        from src.parallel import analyze_parallel
+
+        with stage(metrics, "parallel"):
+            table = ds.txs if isinstance(ds.txs, TxTable) else TxTable.from_txs(ds.txs)
+            res = analyze_parallel(table, args.workers, topk=topk, heuristics=heuristics, timing=timing,
+                                   change_links=args.change_links)
+        if metrics is not None:
+            metrics.add_parts("parallel", res.seconds)
+        clusters, profiles, stats = res.clusters, res.profiles, res.graph_stats
+    else:
+        with stage(metrics, "graph"):
+            if args.graph_backend == "edgelist":
+                from src.edgelist import build_edge_list
+
+                stats = build_edge_list(ds.txs).stats()
+            else:
+                from src.graph_build import build_graphs, graph_stats
+
+                stats = graph_stats(build_graphs(ds.txs))
+        with stage(metrics, "clustering"):
+            clusters = build_clusters(ds.txs, heuristics=heuristics, timing=timing, change_links=args.change_links)
+        with stage(metrics, "profiling"):
+            profiles = build_address_profiles(ds.txs, topk=topk)
+    if topk is not None:
+        clusters.notes.append(counterparty_note(topk))
+    with stage(metrics, "enrichment"):
+        enrichment = enrich_clusters(clusters, store, cache, profiles) if store is not None else None
+    if metrics is not None:
+        metrics.record_analysis(len(ds.txs), known_io_count(ds.txs), clusters, len(profiles), stats)
+
+    with stage(metrics, "report"):
+        write_report(
+            Path(args.out),
+            root_address=ds.root_address,
+            tx_count=len(ds.txs),
+            clusters=clusters,
+            profiles=profiles.items(),
+            cluster_json=cluster_summaries(clusters, profiles, args.max_clusters, enrichment),
+            graph_stats=stats,
+            attribution=enrichment.summary() if enrichment is not None else None,
+            address_attribution=enrichment.address_attribution() if enrichment is not None else None,
+            metrics=metrics,
+        )
     print(f"Saved analysis to {args.out}")
+    write_cluster_index(args, clusters, profiles, enrichment, store)
+    if enrichment is not None:
+        summ = enrichment.summary()
+        print(f"Labels: clusters={summ['labeled_clusters']} conflicts={len(summ['conflicting_clusters'])} "
+              f"attributed_addresses={summ['attributed_addresses']}")
+    print_label_stats(cache)
+    export_metrics(args, metrics, "analyze")
+
+
+def cmd_analyze_windows(args: argparse.Namespace, heuristics: Sequence[str], metrics: Optional[Metrics]) -> None:
+    import os
+
+    from src.dataset import Dataset
+    from src.dataset_bin import temp_path
+    from src.metrics import stage
+    from src.txtable import TxTable
+    from src.report_store import is_report_store_path
+    from src.windows import iter_windows, write_windows
+
+    if is_report_store_path(Path(args.out)):
+        raise SystemExit("analyze: --window writes JSON lines, not a sharded report")
+    with stage(metrics, "load"):
+        ds = Dataset.load(Path(args.dataset))
+    table = ds.txs if isinstance(ds.txs, TxTable) else TxTable.from_txs(ds.txs)
+    windows = iter_windows(table, args.window, args.step, args.from_time, args.to_time, top=args.window_top,
+                           heuristics=heuristics, metrics=metrics, change_links=args.change_links)
+    # written under a temporary name, so a failed run leaves no partial file
+    out = Path(args.out)
+    tmp = temp_path(out)
+    try:
+        with tmp.open("w", encoding="utf-8") as f:
+            n = write_windows(f, windows)
+        os.replace(tmp, out)
+    except ValueError as e:
+        raise SystemExit(f"analyze: {e}")
+    finally:
+        tmp.unlink(missing_ok=True)
+    print(f"Saved {n} windows to {args.out}")
+    export_metrics(args, metrics, "analyze")
+
+
+def parse_duration(value: str) -> int:
+    # Seconds, or a number with an s/m/h/d/w suffix ("90m", "7d").
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+    num, mult = (value[:-1], units[value[-1]]) if value[-1:] in units else (value, 1)
+    if not num.isdigit() or int(num) <= 0:
+        raise argparse.ArgumentTypeError(f"not a positive duration: {value}")
+    return int(num) * mult
+
+
+def parse_time(value: str) -> int:
+    # Unix seconds, or an ISO date/datetime (UTC unless it carries an offset).
+    if value.lstrip("-").isdigit():
+        return int(value)
+    from datetime import datetime, timezone
+
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a unix time or ISO date: {value}")
+    return int((dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp())
+
+
+def cmd_trace(args: argparse.Namespace) -> None:
+    import time
+
+    from src.tracing import open_flow_index
+
+    idx = open_flow_index(Path(args.dataset), Path(args.index) if args.index else None, rebuild=args.rebuild_index)
+    t = time.perf_counter()
+    try:
+        res = idx.trace(args.addresses, max_hops=args.hops, mode=args.mode, after=args.after, before=args.before,
+                        min_value=args.min_value, amount=args.amount)
+    except (KeyError, ValueError) as e:
+        raise SystemExit(f"trace: {e.args[0]}")
+    ms = (time.perf_counter() - t) * 1e3
+    body = res.to_json(args.top)
+    if not args.out:
+        print(json.dumps(body, ensure_ascii=False, indent=2))
+        return
+    Path(args.out).write_text(json.dumps(body, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Saved trace to {args.out} (addresses={len(res.addrs)}, hops={res.hops}, "
+          f"flows={res.edges}, {ms:.1f} ms)")
+
+
+def cmd_cluster_info(args: argparse.Namespace) -> None:
+    from src.cluster_index import ClusterIndex, default_index_path
+
+    path = Path(args.index) if args.index else default_index_path(Path("analysis.json"))
+    if not path.exists():
+        raise SystemExit(f"cluster-info: no cluster index at {path} (run analyze --cluster-index)")
+    try:
+        idx = ClusterIndex(path)
+    except ValueError as e:
+        raise SystemExit(f"cluster-info: {e}")
+    with idx:
+        info = idx.info(args.address, members=args.members)
+    if info is None:
+        raise SystemExit(f"cluster-info: {args.address} is not in {path}")
+    print(json.dumps(info, ensure_ascii=False, indent=2))
+
+
+def cmd_report_query(args: argparse.Namespace) -> None:
+    from src.report_store import ReportReader
+
+    path = Path(args.report)
+    if not path.exists():
+        raise SystemExit(f"report-query: no report at {path} (run analyze --out {path.name})")
+    try:
+        reader = ReportReader(path)
+    except ValueError as e:
+        raise SystemExit(f"report-query: {e}")
+    with reader:
+        found = {a: reader.query(a, members=args.members) for a in args.addresses}
+    if len(args.addresses) == 1:
+        if found[args.addresses[0]] is None:
+            raise SystemExit(f"report-query: {args.addresses[0]} is not in {path}")
+        print(json.dumps(found[args.addresses[0]], ensure_ascii=False, indent=2))
+        return
+    print(json.dumps(found, ensure_ascii=False, indent=2))
+
+
+def cmd_labels_import(args: argparse.Namespace) -> None:
+    from src.osint import SqliteLabelStore
+
+    with SqliteLabelStore(Path(args.db)) as store:
+        for f in args.files:
+            n = store.import_file(Path(f))
+            print(f"Imported {n} labels from {f}")
+        print(f"Label store {args.db}: {len(store)} addresses, by kind: {store.counts()}")
+
+
+def cmd_labels_lookup(args: argparse.Namespace) -> None:
+    from src.osint import SqliteLabelStore
+
+    addrs = list(args.addresses)
+    if args.file:
+        addrs += [ln.strip() for ln in Path(args.file).read_text(encoding="utf-8").splitlines() if ln.strip()]
+    with SqliteLabelStore(Path(args.db)) as store:
+        found = store.with_prefix(args.prefix, limit=args.limit) if args.prefix else store.lookup_many(addrs)
+    for a, lab in found.items():
+        print(f"{a}\t{lab.kind}\t{lab.name}\t{lab.source}")
+    if not args.prefix:
+        print(f"{len(found)} of {len(set(addrs))} addresses labeled")
+
+
+def cmd_convert(args: argparse.Namespace) -> None:
+    from src.dataset import convert_dataset
+
+    n = convert_dataset(Path(args.src), Path(args.dst))
+    print(f"Converted {args.src} -> {args.dst} (txs={n})")
+
+
+def cmd_synth(args: argparse.Namespace) -> None:
+    from src.dataset import write_json_file
+    from src.dataset_bin import DatasetWriter, is_binary_path
+    from src.synthetic import SyntheticChain, SyntheticConfig
+
+    cfg = SyntheticConfig(
+        n_txs=args.txs, seed=args.seed, wallets=args.wallets, reuse=args.reuse,
+        fan_in_mean=args.fan_in_mean, fan_out_mean=args.fan_out_mean, fan_tail=args.fan_tail,
+        peel_share=args.peel_share, peel_length=args.peel_length,
+        hubs=args.hubs, hub_share=args.hub_share, hub_batch_mean=args.hub_batch_mean,
+    )
+    chain = SyntheticChain(cfg)
+    out = Path(args.out)
+    if is_binary_path(out):
+        with DatasetWriter(out, chain.root_address) as w:
+            for t in chain.txs():
+                w.append_tx(t)
+            n = w.count
+    else:
+        n = write_json_file(out, chain.root_address, chain.txs())
+    print(f"Saved synthetic dataset to {out} (txs={n}, addresses={chain.n_addrs}, root={chain.root_address})")
 
 
 # -----------------------------
@@ -87,100 +477,209 @@ def cmd_cdt_install(args: argparse.Namespace) -> None:
 
 
 def cmd_cdt_pubtoaddr(args: argparse.Namespace) -> None:
-    import json
-    import tempfile
-    from pathlib import Path
-    import subprocess
+    keys = [args.pubkey_hex] if args.pubkey_hex else []
+    if args.file:
+        keys += [ln.strip() for ln in Path(args.file).read_text(encoding="utf-8").splitlines() if ln.strip()]
+    if not keys:
+        raise SystemExit("cdt-pubtoaddr: give PUBKEY_HEX or --file")
+    from src.cryptodeeptools_bridge import CryptoDeepToolsBridge
+    from src.pubtoaddr import convert_many, is_pubkey, normalize_pubkey, pubkey_to_address
+
+    bridge = CryptoDeepToolsBridge(Path(args.repo_dir))
+    uniq = list(dict.fromkeys(keys))
+    if args.engine == "cdt":
+        bridge.paths()  # FileNotFoundError if the repo is not installed
+        valid = [k for k in uniq if is_pubkey(k)]
+        addrs = dict(zip(valid, bridge.pubkeys_hex_to_base58(valid)))
+    else:
+        addrs = convert_many(uniq, "p2pkh")
+        if args.check and addrs:
+            if (Path(args.repo_dir) / "03CheckBitcoinAddressBalance" / "pubtoaddr.py").exists():
+                bad = bridge.cross_check(list(addrs), sample=args.check)
+                print(f"Cross-check against CryptoDeepTools pubtoaddr.py: {min(args.check, len(addrs)) - len(bad)} ok, {len(bad)} mismatched")
+                for k, native, cdt in bad:
+                    print(f"  MISMATCH {k}: native={native} cdt={cdt}")
+                if bad:
+                    raise SystemExit(1)
+            else:
+                print("Cross-check skipped: CryptoDeepTools not installed (run cdt-install)")
+
+    if args.pubkey_hex and not args.file:
+        if args.pubkey_hex not in addrs:
+            raise ValueError(f"Invalid public key: {args.pubkey_hex}")
+        print(f"\nCryptoDeepTools pubtoaddr.py result:" if args.engine == "cdt" else "\npubtoaddr result:")
+        print(f"Public Key: {args.pubkey_hex}")
+        print(f"Bitcoin Address: {addrs[args.pubkey_hex]}")
+        if args.segwit and len(normalize_pubkey(args.pubkey_hex)) == 66:
+            print(f"P2WPKH Address: {pubkey_to_address(args.pubkey_hex, 'p2wpkh')}")
+        return
 
-    repo_dir = Path(args.repo_dir)
-    script = repo_dir / "03CheckBitcoinAddressBalance" / "pubtoaddr.py"
-    if not script.exists():
-        raise FileNotFoundError(f"pubtoaddr.py not found at {script}")
-
-    # Создаём временную рабочую директорию, куда положим pubkey.json
-    with tempfile.TemporaryDirectory() as td:
-        workdir = Path(td)
-
-        # Записываем pubkey в формате, который ожидает скрипт (просто строка с переносом)
-        (workdir / "pubkey.json").write_text(
-            args.pubkey_hex + "\n",
-            encoding="utf-8",
-        )
+    lines = []
+    for k in uniq:
+        if k not in addrs:
+            continue
+        row = [k, addrs[k]]
+        if args.segwit:
+            row.append(pubkey_to_address(k, "p2wpkh") if len(normalize_pubkey(k)) == 66 else "")
+        lines.append("\t".join(row))
+    text = "\n".join(lines) + "\n"
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+        print(f"Saved {len(lines)} addresses to {args.out} (skipped {len(uniq) - len(lines)} invalid keys)")
+    else:
+        print(text, end="")
 
-        # Запускаем CDT-скрипт так, чтобы он видел pubkey.json
-        # Используем абсолютный путь к скрипту
-        result = subprocess.run(
-            ["python", str(script.absolute())],
-            cwd=str(workdir),
-            capture_output=True,
-            text=True
-        )
 
-        # Читаем результат из addresses.json
-        addresses_file = workdir / "addresses.json"
-        if addresses_file.exists():
-            addresses = addresses_file.read_text(encoding="utf-8").strip()
-            print(f"\nCryptoDeepTools pubtoaddr.py result:")
-            print(f"Public Key: {args.pubkey_hex}")
-            print(f"Bitcoin Address: {addresses}")
-        else:
-            print(f"Error: addresses.json not created")
-            if result.stderr:
-                print(f"Error output: {result.stderr}")
+def cmd_extract_pubkey(args: argparse.Namespace) -> None:
+    """Extract public keys from transaction inputs via Blockstream API"""
+    from src.dataset import Dataset
+    from src.providers.blockstream import RateLimiter
+    from src.pubkeys import PubkeyExtractor, input_pubkey
+    from src.txtable import iter_rows
+
+    txids = list(args.txid)
+    if args.dataset:
+        txids += [row.txid for row in iter_rows(Dataset.load(Path(args.dataset)).txs)]
+    if args.txids_file:
+        txids += [ln.strip() for ln in Path(args.txids_file).read_text(encoding="utf-8").splitlines() if ln.strip()]
+    if not txids:
+        raise SystemExit("extract-pubkey: give TXID, --dataset or --txids-file")
+
+    provider = make_provider(args, limiter=RateLimiter(rate=args.rps, burst=args.workers), pool_size=args.workers)
+
+    if len(txids) == 1 and not args.out:
+        txid, vin_index = txids[0], args.vin_index
+        print(f"Fetching transaction {txid}...")
+        try:
+            tx = provider.get_tx(txid)
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch transaction: {e}")
+        if vin_index >= len(tx["vin"]):
+            raise ValueError(f"Input index {vin_index} out of range (tx has {len(tx['vin'])} inputs)")
+        found = input_pubkey(tx["vin"][vin_index])
+        if found is None:
+            raise RuntimeError(f"No public key found in input {vin_index} of transaction {txid}")
+        print(f"\nExtracted public key from {found[1]}:")
+        print(found[0])
+        return
 
+    idx = PubkeyExtractor(provider, workers=args.workers).extract(txids)
+    out = Path(args.out or "pubkeys.json")
+    idx.save(out)
+    for txid, err in idx.failed.items():
+        print(f"Failed to fetch {txid}: {err}")
+    print(
+        f"Saved pubkey index to {out} (txs={idx.txs}, inputs={idx.scanned}, "
+        f"pubkeys={len(idx.inputs)}, reused={len(idx.reused())}, failed={len(idx.failed)})"
+    )
+    print_cache_stats(provider, args)
 
-def cmd_extract_pubkey(args: argparse.Namespace) -> None:
-    """Extract public key from a transaction input via Blockstream API"""
-    import requests
 
-    txid = args.txid
-    vin_index = args.vin_index
+# -----------------------------
+# Serve mode
+# -----------------------------
 
-    print(f"Fetching transaction {txid}...")
-    url = f"https://blockstream.info/api/tx/{txid}"
+def run_command(parser: argparse.ArgumentParser, req: Dict[str, Any]) -> Dict[str, Any]:
+    # One request: {"argv": [...], "id": ..., "cwd": ...} -> {"id", "exit", "stdout", "stderr"}.
+    # Output is captured by redirecting sys.stdout/stderr, so requests run one at a time.
+    import contextlib
+    import os
+    import traceback
+
+    out, err = io.StringIO(), io.StringIO()
+    code = 0
+    cwd = os.getcwd()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+        try:
+            argv = req.get("argv")
+            if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+                raise SystemExit("serve: request needs \"argv\": [str, ...]")
+            if argv[:1] == ["serve"]:
+                raise SystemExit("serve: cannot nest serve")
+            if req.get("cwd"):
+                os.chdir(req["cwd"])
+            args = parser.parse_args(argv)
+            args.func(args)
+        except SystemExit as e:
+            if isinstance(e.code, int) or e.code is None:
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os.chdir(cwd)
+    return {"id": req.get("id"), "exit": code, "stdout": out.getvalue(), "stderr": err.getvalue()}
+
+
+def serve_lines(parser: argparse.ArgumentParser, rfile, wfile) -> None:
+    # JSON lines in, JSON lines out; a line that is not a JSON object gets exit 2.
+    for line in rfile:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            req = json.loads(line)
+            if not isinstance(req, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            resp: Dict[str, Any] = {"id": None, "exit": 2, "stdout": "", "stderr": f"serve: bad request: {e}\n"}
+        else:
+            resp = run_command(parser, req)
+        data = json.dumps(resp, ensure_ascii=False) + "\n"
+        wfile.write(data if isinstance(wfile, io.TextIOBase) else data.encode("utf-8"))
+        wfile.flush()
 
-    try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        tx = response.json()
-    except Exception as e:
-        raise RuntimeError(f"Failed to fetch transaction: {e}")
-
-    if vin_index >= len(tx["vin"]):
-        raise ValueError(f"Input index {vin_index} out of range (tx has {len(tx['vin'])} inputs)")
-
-    vin = tx["vin"][vin_index]
-
-    # Try to extract from witness data (SegWit)
-    witness = vin.get("txinwitness") or []
-    if witness:
-        # Public key is typically the last element in witness
-        pubkey = witness[-1]
-
-        # Validate it looks like a public key (starts with 02, 03, or 04)
-        if pubkey.startswith(('02', '03', '04')):
-            print(f"\nExtracted public key from witness:")
-            print(pubkey)
-            return
-
-    # Try legacy scriptsig
-    scriptsig_asm = vin.get("scriptsig_asm", "")
-    if scriptsig_asm:
-        parts = scriptsig_asm.split()
-        # Public key is typically the last element
-        for part in reversed(parts):
-            if part.startswith(('02', '03', '04')) and len(part) in [66, 130]:
-                print(f"\nExtracted public key from scriptsig:")
-                print(part)
-                return
-
-    raise RuntimeError(f"No public key found in input {vin_index} of transaction {txid}")
+
+def cmd_serve(args: argparse.Namespace) -> None:
+    # Keeps one warm process for many commands: modules imported by one request
+    # stay imported for the next.
+    parser = build_parser()
+    for mod in args.preload:
+        __import__(f"src.{mod}")
+    if not args.socket:
+        serve_lines(parser, sys.stdin, sys.stdout)
+        return
+
+    import os
+    import signal
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            serve_lines(parser, self.rfile, self.wfile)
+
+    path = Path(args.socket)
+    if path.exists():
+        path.unlink()
+    with socketserver.UnixStreamServer(str(path), Handler) as srv:
+        os.chmod(path, 0o600)
+        print(f"Serving on {path}", file=sys.stderr, flush=True)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # so the socket file is removed
+        try:
+            srv.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            path.unlink(missing_ok=True)
 
 
 # -----------------------------
 # CLI
 # -----------------------------
 
+def add_provider_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--base-url", default="https://blockstream.info/api")
+    p.add_argument("--cache", default=".bf_cache/esplora.sqlite", help="On-disk response cache.")
+    p.add_argument("--cache-max-mb", type=int, default=1024)
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--offline", action="store_true", help="Serve only from the response cache.")
+    p.add_argument("--metrics-prom", metavar="PATH", help="Export HTTP counters as a Prometheus textfile.")
+
+
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(
         prog="bf-prototype",
@@ -189,32 +688,177 @@ def build_parser() -> argparse.ArgumentParser:
     sub = p.add_subparsers(dest="cmd", required=True)
 
     f = sub.add_parser("fetch", help="Fetch address tx history via public API.")
-    f.add_argument("address")
-    f.add_argument("--limit", type=int, default=200)
-    f.add_argument("--base-url", default="https://blockstream.info/api")
-    f.add_argument("--out", default="dataset.json")
+    f.add_argument("address", nargs="?", help="Defaults to the dataset's root address with --update.")
+    f.add_argument("--limit", type=int, default=None,
+                   help="Max txs to fetch (default 200; with --update: none, page down to the stored history).")
+    f.add_argument("--update", metavar="DATASET",
+                   help="Fetch only txs newer than those already in DATASET and merge them in.")
+    f.add_argument("--prefetch", type=int, default=2, metavar="PAGES",
+                   help="History pages requested ahead while earlier ones are written (0 = sequential).")
+    add_provider_args(f)
+    f.add_argument("--out", default=None,
+                   help="Default: dataset.json, or the --update dataset. *.bftx writes the binary format while fetching.")
     f.set_defaults(func=cmd_fetch)
 
-    a = sub.add_parser("analyze", help="Analyze dataset JSON.")
+    cr = sub.add_parser("crawl", help="Fetch many addresses concurrently, expanding counterparties by hops.")
+    cr.add_argument("addresses", nargs="+")
+    cr.add_argument("--depth", type=int, default=0, help="Counterparty hops to expand (0 = only given addresses).")
+    cr.add_argument("--workers", type=int, default=8)
+    cr.add_argument("--rps", type=float, default=5.0, help="Shared request rate limit (<=0 disables).")
+    cr.add_argument("--limit", type=int, default=200, help="Max txs per address.")
+    cr.add_argument("--max-addresses", type=int, default=None)
+    add_provider_args(cr)
+    cr.add_argument("--out", default="dataset.json")
+    cr.set_defaults(func=cmd_crawl)
+
+    a = sub.add_parser("analyze", help="Analyze dataset (JSON or *.bftx).")
     a.add_argument("dataset")
     a.add_argument("--max-clusters", type=int, default=20)
-    a.add_argument("--out", default="analysis.json")
+    a.add_argument("--out", default="analysis.json",
+                   help="*.bfr writes the sharded report (compressed chunks plus an address index, "
+                        "see report-query); anything else the indented JSON report.")
+    a.add_argument("--graph-backend", choices=["networkx", "edgelist"],
+                   help="edgelist: vectorized NumPy edge list instead of networkx graphs (default: networkx; "
+                        "--workers always uses edge lists).")
+    a.add_argument("--stream", action="store_true",
+                   help="Single pass over the file with memory bounded by the address count.")
+    a.add_argument("--workers", type=int, default=1,
+                   help="Shard the analysis over N processes (same output as one process).")
+    a.add_argument("--from", dest="from_time", type=parse_time, metavar="TIME",
+                   help="Only transactions at or after TIME (unix seconds or ISO date, UTC).")
+    a.add_argument("--to", dest="to_time", type=parse_time, metavar="TIME",
+                   help="Only transactions before TIME.")
+    a.add_argument("--window", type=parse_duration, metavar="DURATION",
+                   help="Sliding-window mode: per-window cluster and profile deltas as JSON lines in --out "
+                        "(e.g. 7d; units s/m/h/d/w).")
+    a.add_argument("--step", type=parse_duration, metavar="DURATION",
+                   help="Window advance for --window (default: the window length; must divide it).")
+    a.add_argument("--window-top", type=int, default=10,
+                   help="Address changes listed per window.")
+    a.add_argument("--incremental", action="store_true",
+                   help="Keep the analysis state in --workspace and only process transactions it has not seen.")
+    a.add_argument("--workspace", default=".bf_workspace",
+                   help="Workspace directory for --incremental.")
+    a.add_argument("--counterparties", choices=["exact", "approx"], default="exact",
+                   help="approx: bounded Space-Saving sketch per address instead of a full counter.")
+    a.add_argument("--topk-capacity", type=int, default=1024,
+                   help="Sketch slots per address for --counterparties approx (error <= increments / capacity).")
+    a.add_argument("--change-heuristics", default="unique_new_output", metavar="NAMES",
+                   help="Comma-separated change heuristics evaluated in one pass: unique_new_output, round_value, "
+                        "script_type, fresh_address. A change link needs all firing heuristics to agree.")
+    a.add_argument("--change-links", choices=["attach", "merge"], default="attach",
+                   help="attach: a change address alone joins its spender's cluster; merge: its whole cluster "
+                        "is merged into the spender's (one wrong change guess then joins two clusters).")
+    a.add_argument("--labels", help="OSINT labels (JSON/CSV/JSONL, or a *.sqlite store from labels-import).")
+    a.add_argument("--label-cache", default=".bf_cache/cluster_labels.sqlite",
+                   help="Per-cluster enrichment cache keyed by cluster membership.")
+    a.add_argument("--no-label-cache", action="store_true")
+    a.add_argument("--cluster-index", nargs="?", const="", default=None, metavar="PATH",
+                   help="Also write the cluster summary index (default PATH: <out>.clusters.sqlite).")
+    a.add_argument("--metrics", action="store_true",
+                   help="Add a metrics section (stage timings, counters, peak RSS) to the analysis JSON.")
+    a.add_argument("--metrics-memory", action="store_true",
+                   help="With --metrics: also record tracemalloc peaks per stage (slows the run down).")
+    a.add_argument("--metrics-prom", metavar="PATH",
+                   help="Also export the metrics as a Prometheus textfile (implies --metrics).")
     a.set_defaults(func=cmd_analyze)
 
+    ci = sub.add_parser("cluster-info", help="Show the cluster of an address from a cluster index.")
+    ci.add_argument("address")
+    ci.add_argument("--index", help="Cluster index (default: analysis.clusters.sqlite).")
+    ci.add_argument("--members", type=int, default=20, help="Members to list.")
+    ci.set_defaults(func=cmd_cluster_info)
+
+    rq = sub.add_parser("report-query", help="Look up addresses in a sharded report (analyze --out *.bfr).")
+    rq.add_argument("addresses", nargs="+")
+    rq.add_argument("--report", default="analysis.bfr")
+    rq.add_argument("--members", type=int, default=20, help="Cluster members to list.")
+    rq.set_defaults(func=cmd_report_query)
+
+    tr = sub.add_parser("trace", help="Trace where funds from addresses went within N hops (haircut or poison).")
+    tr.add_argument("addresses", nargs="+")
+    tr.add_argument("--dataset", required=True)
+    tr.add_argument("--hops", type=int, default=3)
+    tr.add_argument("--mode", choices=["haircut", "poison"], default="haircut",
+                    help="haircut: spread the traced amount over later outflows by value; poison: taint them fully.")
+    tr.add_argument("--after", type=parse_time, help="Only flows at or after this time (unix seconds or ISO date).")
+    tr.add_argument("--before", type=parse_time, help="Only flows at or before this time.")
+    tr.add_argument("--min-value", type=float, default=0.0, help="Drop flows carrying less than this many BTC.")
+    tr.add_argument("--amount", type=float, help="haircut: BTC to trace (default: all outflows of the sources).")
+    tr.add_argument("--top", type=int, default=50, help="Addresses to list, by traced amount.")
+    tr.add_argument("--index", help="Flow index file (default: <dataset>.flows.npz, built on first use).")
+    tr.add_argument("--rebuild-index", action="store_true")
+    tr.add_argument("--out", help="Write the result JSON here instead of stdout.")
+    tr.set_defaults(func=cmd_trace)
+
+    cv = sub.add_parser("convert", help="Convert a dataset between JSON and binary (*.bftx).")
+    cv.add_argument("src")
+    cv.add_argument("dst")
+    cv.set_defaults(func=cmd_convert)
+
+    sy = sub.add_parser("synth", help="Generate a deterministic synthetic dataset (JSON or *.bftx).")
+    sy.add_argument("out")
+    sy.add_argument("--txs", type=int, default=10_000)
+    sy.add_argument("--seed", type=int, default=7)
+    sy.add_argument("--wallets", type=int, default=0, help="Wallet count (default txs / 4).")
+    sy.add_argument("--reuse", type=float, default=0.3, help="Chance a payee/change address is reused.")
+    sy.add_argument("--fan-in-mean", type=float, default=1.6)
+    sy.add_argument("--fan-out-mean", type=float, default=2.1)
+    sy.add_argument("--fan-tail", type=float, default=2.0, help="Pareto shape of fan-in/out tails (> 1).")
+    sy.add_argument("--peel-share", type=float, default=0.1, help="Share of peel-chain txs.")
+    sy.add_argument("--peel-length", type=int, default=50)
+    sy.add_argument("--hubs", type=int, default=3, help="Exchange hot wallets.")
+    sy.add_argument("--hub-share", type=float, default=0.15, help="Share of hub deposit/payout txs.")
+    sy.add_argument("--hub-batch-mean", type=float, default=40.0, help="Mean outputs of a hub payout.")
+    sy.set_defaults(func=cmd_synth)
+
+    li = sub.add_parser("labels-import", help="Bulk-load OSINT labels (CSV/JSONL/JSON) into an SQLite label store.")
+    li.add_argument("db")
+    li.add_argument("files", nargs="+")
+    li.set_defaults(func=cmd_labels_import)
+
+    ll = sub.add_parser("labels-lookup", help="Look up addresses in an SQLite label store.")
+    ll.add_argument("db")
+    ll.add_argument("addresses", nargs="*")
+    ll.add_argument("--file", help="File with one address per line.")
+    ll.add_argument("--prefix", help="List labeled addresses starting with this prefix.")
+    ll.add_argument("--limit", type=int, default=100)
+    ll.set_defaults(func=cmd_labels_lookup)
+
     c1 = sub.add_parser("cdt-install", help="Clone CryptoDeepTools repository.")
     c1.add_argument("--repo-dir", default="vendor/CryptoDeepTools")
     c1.set_defaults(func=cmd_cdt_install)
 
-    c2 = sub.add_parser("cdt-pubtoaddr", help="Run CryptoDeepTools pubtoaddr.py.")
-    c2.add_argument("pubkey_hex")
+    c2 = sub.add_parser("cdt-pubtoaddr", help="Convert public keys to addresses (CryptoDeepTools pubtoaddr.py or in-process).")
+    c2.add_argument("pubkey_hex", nargs="?")
+    c2.add_argument("--file", help="File with one public key (hex) per line; converted in one call.")
+    c2.add_argument("--engine", choices=["cdt", "native"], default="cdt",
+                    help="cdt: one pubtoaddr.py run per call; native: in-process hashlib/base58.")
+    c2.add_argument("--check", type=int, default=20,
+                    help="native: cross-check this many random keys against pubtoaddr.py (0 disables).")
+    c2.add_argument("--segwit", action="store_true", help="Also output P2WPKH (bc1...) for compressed keys.")
+    c2.add_argument("--out", help="Write 'pubkey<TAB>address' lines here instead of stdout.")
     c2.add_argument("--repo-dir", default="vendor/CryptoDeepTools")
     c2.set_defaults(func=cmd_cdt_pubtoaddr)
 
-    e = sub.add_parser("extract-pubkey", help="Extract pubkey from a real txid via Blockstream API.")
-    e.add_argument("txid")
-    e.add_argument("--vin-index", type=int, default=0)
+    e = sub.add_parser("extract-pubkey", help="Extract pubkeys from tx inputs via Blockstream API.")
+    e.add_argument("txid", nargs="*")
+    e.add_argument("--vin-index", type=int, default=0, help="Input to print when a single txid is given.")
+    e.add_argument("--dataset", help="Index every input of every tx in this dataset.")
+    e.add_argument("--txids-file", help="File with one txid per line.")
+    e.add_argument("--workers", type=int, default=8)
+    e.add_argument("--rps", type=float, default=0.0,
+                   help="Shared request rate limit (default 0: none; a 429 still pauses every worker).")
+    e.add_argument("--out", help="Write the pubkey -> [(txid, vin)] index here (default: pubkeys.json).")
+    add_provider_args(e)
     e.set_defaults(func=cmd_extract_pubkey)
 
+    sv = sub.add_parser("serve", help="Run commands sent as JSON lines over stdin or a Unix socket in one warm process.")
+    sv.add_argument("--socket", help="Unix socket path (default: read stdin, answer on stdout).")
+    sv.add_argument("--preload", nargs="*", default=[], metavar="MODULE",
+                    help="src modules to import up front, e.g. graph_build streaming providers.blockstream.")
+    sv.set_defaults(func=cmd_serve)
+
     return p
 
 
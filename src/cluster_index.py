@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+from .clustering import ClusteringResult
+from .dataset_bin import temp_path
+from .profiling import AddressProfile, ClusterAggregate
+
+INDEX_VERSION = "2"
+_BATCH = 500  # keys per IN (...) query, below SQLite's variable limit
+
+
+def _contribution(p: AddressProfile) -> Tuple[int, float, float, str, str]:
+    return (
+        p.tx_count_involving,
+        p.total_in_btc,
+        p.total_out_btc,
+        json.dumps(p.flags),
+        json.dumps(p.top_counterparties, ensure_ascii=False),
+    )
+
+
+_NO_PROFILE = (0, 0.0, 0.0, "[]", "[]")
+
+
+def _profile(address: str, row: Tuple[Any, ...]) -> AddressProfile:
+    # The part of an AddressProfile a ClusterAggregate reads.
+    tx_count, total_in, total_out, flags, top = row
+    return AddressProfile(
+        address=address, tx_count_involving=tx_count, first_seen=None, last_seen=None,
+        total_in_btc=total_in, total_out_btc=total_out, fees_paid_btc=0.0,
+        top_counterparties=[(b, c) for b, c in json.loads(top)], hourly_activity={}, flags=json.loads(flags),
+    )
+
+
+class ClusterIndex:
+    # Persistent cluster summaries (SQLite) written next to an analysis report.
+    #   addresses: address -> cluster key (NULL if never clustered) and the
+    #              address's contribution (tx count, BTC sums, flags, top
+    #              counterparties)
+    #   clusters:  one ClusterAggregate per cluster
+    #   meta:      format version, the analysis state the index reflects and
+    #              the label store it was enriched from
+    # A query is one primary-key lookup plus one cluster row, whatever the
+    # cluster size. Clusters are keyed by their union-find root address
+    # (ClusteringResult.roots), not by the report's cluster_id: list positions
+    # shift whenever any cluster merges, the root only when its own cluster
+    # does. That lets update() patch the index after analyze --incremental:
+    # only clusters holding an address of the new transactions (before or
+    # after the update) are recomputed, and clusters merged away are deleted.
+
+    def __init__(self, path: Path, wal: bool = True):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), isolation_level=None)
+        if wal:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        if not self._db.execute("SELECT 1 FROM sqlite_master").fetchone():
+            self._create()
+        version = self._meta().get("version", "1")
+        if version != INDEX_VERSION:
+            self._db.close()
+            raise ValueError(f"{path}: cluster index version {version}, expected {INDEX_VERSION}; "
+                             f"rebuild it with analyze --cluster-index")
+
+    def _create(self) -> None:
+        db = self._db
+        db.execute("CREATE TABLE meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+        db.execute(
+            "CREATE TABLE addresses ("
+            " address TEXT PRIMARY KEY, cluster TEXT, tx_count INTEGER NOT NULL,"
+            " in_btc REAL NOT NULL, out_btc REAL NOT NULL, flags TEXT NOT NULL, top TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        db.execute("CREATE INDEX addresses_cluster ON addresses(cluster)")
+        db.execute(
+            "CREATE TABLE clusters ("
+            " key TEXT PRIMARY KEY, size INTEGER NOT NULL, tx_count INTEGER NOT NULL,"
+            " in_btc REAL NOT NULL, out_btc REAL NOT NULL, flags TEXT NOT NULL,"
+            " counterparties TEXT NOT NULL, labels TEXT"
+            ") WITHOUT ROWID"
+        )
+        self._set_meta(version=INDEX_VERSION)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "ClusterIndex":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _meta(self) -> Dict[str, str]:
+        try:
+            return dict(self._db.execute("SELECT k, v FROM meta"))
+        except sqlite3.OperationalError:  # version 1 had no meta table
+            return {}
+
+    def _set_meta(self, **kv: object) -> None:
+        self._db.executemany("INSERT OR REPLACE INTO meta (k, v) VALUES (?, ?)", ((k, str(v)) for k, v in kv.items()))
+
+    def _in(self, q: str, keys: List[str]) -> Iterator[tuple]:
+        for lo in range(0, len(keys), _BATCH):
+            batch = keys[lo: lo + _BATCH]
+            yield from self._db.execute(q % ",".join("?" * len(batch)), batch)
+
+    @property
+    def state(self) -> str:
+        return self._meta().get("state", "")
+
+    # --- building -------------------------------------------------------------
+
+    @classmethod
+    def build(
+        cls,
+        path: Path,
+        clusters: ClusteringResult,
+        profiles: Mapping[str, AddressProfile],
+        labels: Optional[Dict[int, Dict[str, Any]]] = None,
+        state: str = "",
+        label_source: str = "",
+    ) -> "ClusterIndex":
+        # labels: cluster id -> ClusterLabel.to_json(), from an enrichment pass
+        # over label_source (a label store fingerprint). state: an opaque token
+        # of the analysis the index reflects, checked by update().
+        # Written under a temporary name (without WAL, so it is one file) and
+        # renamed over the old index, which stays intact if the build fails.
+        tmp = temp_path(path)
+        tmp.unlink(missing_ok=True)
+        idx = cls(tmp, wal=False)
+        try:
+            idx._fill(clusters, profiles, labels or {})
+            idx._set_meta(state=state, labels=label_source)
+        except BaseException:
+            idx.close()
+            tmp.unlink(missing_ok=True)
+            raise
+        idx.close()
+        for suffix in ("-wal", "-shm"):
+            Path(str(path) + suffix).unlink(missing_ok=True)
+        os.replace(tmp, path)
+        return cls(path)
+
+    @classmethod
+    def update(
+        cls,
+        path: Path,
+        clusters: ClusteringResult,
+        profiles: Mapping[str, AddressProfile],
+        touched: Iterable[str],
+        base: str,
+        state: str,
+        labels: Optional[Dict[int, Dict[str, Any]]] = None,
+        label_source: str = "",
+    ) -> Tuple["ClusterIndex", bool]:
+        # Brings an index built at analysis state `base` to `state`, where
+        # `touched` are the addresses of the transactions applied in between.
+        # Falls back to build() when there is no such index (missing, another
+        # state or format, other labels). Returns (index, updated in place).
+        idx = None
+        if path.exists():
+            try:
+                idx = cls(path)
+            except (ValueError, sqlite3.DatabaseError):
+                idx = None
+        if idx is not None and idx.state == base and idx._meta().get("labels", "") == label_source:
+            db = idx._db
+            db.execute("BEGIN")
+            try:
+                idx._patch(clusters, profiles, list(dict.fromkeys(touched)), labels or {})
+                idx._set_meta(state=state)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                idx.close()
+                raise
+            return idx, True
+        if idx is not None:
+            idx.close()
+        return cls.build(path, clusters, profiles, labels, state, label_source), False
+
+    def _fill(
+        self, clusters: ClusteringResult, profiles: Mapping[str, AddressProfile], labels: Dict[int, Dict[str, Any]],
+    ) -> None:
+        db = self._db
+        roots = clusters.roots
+        a2c = clusters.addr_to_cluster
+        db.execute("BEGIN")
+        db.executemany(
+            "INSERT INTO addresses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((a, roots[a2c[a]] if a in a2c else None, *_contribution(p)) for a, p in profiles.items()),
+        )
+        # clustered addresses without a profile still count towards the size
+        db.executemany(
+            "INSERT OR IGNORE INTO addresses VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((a, roots[cid], *_NO_PROFILE) for a, cid in a2c.items() if a not in profiles),
+        )
+        for cid, members in enumerate(clusters.clusters):
+            self._put(roots[cid], members, profiles, labels.get(cid))
+        db.execute("COMMIT")
+
+    def _patch(
+        self, clusters: ClusteringResult, profiles: Mapping[str, AddressProfile], touched: List[str],
+        labels: Dict[int, Dict[str, Any]],
+    ) -> None:
+        # A cluster changes only by a union, a change link or a profile update,
+        # each of which involves an address of the new transactions, so the
+        # affected clusters are those holding a touched address now or before.
+        # Closed over both directions (the old clusters of the new members,
+        # the new clusters of the old members) to be safe.
+        roots, a2c = clusters.roots, clusters.addr_to_cluster
+        key_cid = {k: cid for cid, k in enumerate(roots)}
+        addrs: Set[str] = set(touched)
+        old_keys: Set[str] = set()
+        cids: Set[int] = set()
+        todo = list(addrs)
+        while todo:
+            keys = {k for (k,) in self._in("SELECT cluster FROM addresses WHERE address IN (%s)", todo) if k}
+            keys -= old_keys
+            old_keys |= keys
+            found = [a for (a,) in self._in("SELECT address FROM addresses WHERE cluster IN (%s)", sorted(keys))]
+            new_cids = {a2c[a] for a in todo + found if a in a2c} | {key_cid[k] for k in keys if k in key_cid}
+            new_cids -= cids
+            cids |= new_cids
+            todo = [a for a in found if a not in addrs]
+            addrs.update(todo)
+            for cid in new_cids:
+                fresh = [a for a in clusters.clusters[cid] if a not in addrs]
+                addrs.update(fresh)
+                todo += fresh
+
+        db = self._db
+        db.executemany("DELETE FROM clusters WHERE key = ?", ((k,) for k in old_keys if k not in key_cid))
+        for cid in sorted(cids):
+            self._put(roots[cid], clusters.clusters[cid], profiles, labels.get(cid))
+        rows = []
+        for a in addrs:
+            p = profiles.get(a)
+            rows.append((a, roots[a2c[a]] if a in a2c else None, *(_contribution(p) if p else _NO_PROFILE)))
+        db.executemany("INSERT OR REPLACE INTO addresses VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _put(
+        self, key: str, members: Set[str], profiles: Mapping[str, AddressProfile], labels: Optional[Dict[str, Any]],
+    ) -> None:
+        agg = ClusterAggregate(size=len(members))
+        for a in members:
+            p = profiles.get(a)
+            if p:
+                agg.add(p)
+        self._db.execute(
+            "INSERT OR REPLACE INTO clusters VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key, agg.size, agg.tx_count, agg.in_btc, agg.out_btc,
+                json.dumps(sorted(agg.flags)), json.dumps(list(agg.counterparties.items()), ensure_ascii=False),
+                None if labels is None else json.dumps(labels, ensure_ascii=False),
+            ),
+        )
+
+    def _get(self, key: str) -> Tuple[ClusterAggregate, Optional[Dict[str, Any]]]:
+        row = self._db.execute(
+            "SELECT size, tx_count, in_btc, out_btc, flags, counterparties, labels FROM clusters WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        size, tx_count, in_btc, out_btc, flags, cps, labels = row
+        agg = ClusterAggregate(
+            size=size, tx_count=tx_count, in_btc=in_btc, out_btc=out_btc,
+            flags=set(json.loads(flags)), counterparties=Counter(dict(json.loads(cps))),
+        )
+        return agg, None if labels is None else json.loads(labels)
+
+    # --- queries --------------------------------------------------------------
+
+    def cluster_of(self, address: str) -> Optional[str]:
+        row = self._db.execute("SELECT cluster FROM addresses WHERE address = ?", (address,)).fetchone()
+        return None if row is None else row[0]
+
+    def summary(self, key: str) -> Dict[str, object]:
+        # Same dict as summarize_cluster over the cluster's members.
+        return self._get(key)[0].summary()
+
+    def members(self, key: str, limit: Optional[int] = None) -> List[str]:
+        q = "SELECT address FROM addresses WHERE cluster = ? ORDER BY address"
+        rows = self._db.execute(q + " LIMIT ?", (key, limit)) if limit is not None else self._db.execute(q, (key,))
+        return [a for (a,) in rows]
+
+    def info(self, address: str, members: int = 20) -> Optional[Dict[str, Any]]:
+        # None if the address is not in the index; unclustered addresses are
+        # reported as a cluster of one.
+        row = self._db.execute(
+            "SELECT cluster, tx_count, in_btc, out_btc, flags, top FROM addresses WHERE address = ?", (address,)
+        ).fetchone()
+        if row is None:
+            return None
+        key = row[0]
+        if key is None:
+            agg = ClusterAggregate(size=1)
+            agg.add(_profile(address, row[1:]))
+            return {"address": address, "cluster": None, "summary": agg.summary(), "labels": None,
+                    "members": [address]}
+        agg, labels = self._get(key)
+        return {"address": address, "cluster": key, "summary": agg.summary(), "labels": labels,
+                "members": self.members(key, members)}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "addresses": self._db.execute("SELECT COUNT(*) FROM addresses").fetchone()[0],
+            "clusters": self._db.execute("SELECT COUNT(*) FROM clusters").fetchone()[0],
+        }
+
+
+def default_index_path(report: Path) -> Path:
+    return report.with_suffix(".clusters.sqlite")
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, List, Set, Optional
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Set, Optional, Sequence, Tuple, Union
 
+from .heuristics import DEFAULT_HEURISTICS, HeuristicPipeline
 from .providers.blockstream import Tx
+from .txtable import TxRow, TxSource, TxTable, iter_rows, row_of
 
 
 @dataclass
@@ -11,88 +15,318 @@ class ClusteringResult:
     clusters: List[Set[str]]
     addr_to_cluster: Dict[str, int]
     notes: List[str]
+    uf: Optional["UnionFind"] = field(default=None, repr=False, compare=False)
+    heuristics: Optional[Dict[str, Any]] = field(default=None, repr=False, compare=False)  # HeuristicPipeline.stats()
+    # per cluster, the address of its union-find root: a key that stays with
+    # the cluster across incremental runs until it merges into another one
+    roots: Optional[List[str]] = field(default=None, repr=False, compare=False)
 
 
-def _union_find():
-    parent: Dict[str, str] = {}
+class UnionFind:
+    # Disjoint-set forest over interned integer ids.
+    # - find() is iterative with path halving, so long consolidation chains cannot
+    #   hit the recursion limit;
+    # - union() is by size, keeping trees shallow;
+    # - member lists are merged small-into-large on every union, so groups() is
+    #   always current and new transactions can be fed in at any time.
 
-    def find(x: str) -> str:
-        parent.setdefault(x, x)
-        if parent[x] != x:
-            parent[x] = find(parent[x])
-        return parent[x]
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.parent: List[int] = []
+        self.size: List[int] = []
+        self.members: Dict[int, List[int]] = {}
+        self.unions = 0
 
-    def union(a: str, b: str) -> None:
-        ra, rb = find(a), find(b)
-        if ra != rb:
-            parent[rb] = ra
+    @staticmethod
+    def restore(names: List[str], parent: List[int], size: List[int], unions: int = 0) -> "UnionFind":
+        # Rebuilds a forest saved as (names, parent, size). members keeps its
+        # roots in id order, as they are after incremental add()/union() calls.
+        uf = UnionFind()
+        uf.names = names
+        uf.ids = {a: i for i, a in enumerate(names)}
+        uf.parent = parent
+        uf.size = size
+        uf.unions = unions
+        uf.members = {i: [] for i, p in enumerate(parent) if p == i}
+        for i in range(len(names)):
+            uf.members[uf.find(i)].append(i)
+        return uf
 
-    def groups() -> List[Set[str]]:
-        out: Dict[str, Set[str]] = {}
-        for x in list(parent.keys()):
-            r = find(x)
-            out.setdefault(r, set()).add(x)
-        return list(out.values())
+    def __len__(self) -> int:
+        return len(self.names)
 
-    return union, groups
+    def __contains__(self, addr: str) -> bool:
+        return addr in self.ids
 
+    def add(self, addr: str) -> int:
+        i = self.ids.get(addr)
+        if i is None:
+            i = len(self.names)
+            self.ids[addr] = i
+            self.names.append(addr)
+            self.parent.append(i)
+            self.size.append(1)
+            self.members[i] = [i]
+        return i
 
-def cluster_multi_input(txs: List[Tx], min_inputs: int = 2) -> List[Set[str]]:
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union_ids(self, a: int, b: int) -> int:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        self.members[ra].extend(self.members.pop(rb))
+        self.unions += 1
+        return ra
+
+    def union(self, a: str, b: str) -> int:
+        return self.union_ids(self.add(a), self.add(b))
+
+    def union_all(self, addrs: List[str]) -> None:
+        base = self.add(addrs[0])
+        for a in addrs[1:]:
+            base = self.union_ids(base, self.add(a))
+
+    def root_of(self, addr: str) -> int:
+        return self.find(self.ids[addr])
+
+    def group_of(self, addr: str) -> Set[str]:
+        return {self.names[i] for i in self.members[self.root_of(addr)]}
+
+    def groups(self) -> List[Set[str]]:
+        # In order of each group's first address (ids are handed out in order
+        # of appearance), as the original dict-based union-find listed them;
+        # members itself is in order of the surviving roots.
+        names = self.names
+        return [{names[i] for i in m} for m in sorted(sorted(m) for m in self.members.values())]
+
+
+def add_multi_input(uf: UnionFind, row: TxRow, min_inputs: int = 2) -> bool:
     # Multi-input heuristic: inputs used together likely controlled by the same entity.
-    union, groups = _union_find()
-    for tx in txs:
-        ins = [io.addr for io in tx.vin if io.addr != "UNKNOWN"]
-        if len(ins) < min_inputs:
-            continue
-        base = ins[0]
-        for a in ins[1:]:
-            union(base, a)
-    return groups()
-
-
-def detect_change_address(tx: Tx) -> Optional[str]:
+    if len(row.ins) < min_inputs:
+        return False
+    uf.union_all([a for a, _ in row.ins])
+    return True
+
+
+def cluster_multi_input(txs: TxSource, min_inputs: int = 2, uf: Optional[UnionFind] = None) -> List[Set[str]]:
+    uf = uf if uf is not None else UnionFind()
+    for row in iter_rows(txs):
+        add_multi_input(uf, row, min_inputs=min_inputs)
+    return uf.groups()
+
+
+def row_links(row: TxRow, min_inputs: int = 2) -> Tuple[Optional[List[str]], Optional[Tuple[str, str]]]:
+    # What a row contributes to clustering: the inputs to union (multi-input
+    # heuristic) and a (spender, change) link, either of which may be None.
+    multi = [a for a, _ in row.ins] if len(row.ins) >= min_inputs else None
+    ch = detect_change_address(row)
+    return multi, ((row.ins[0][0], ch) if ch and row.ins else None)
+
+
+def detect_change_address(tx: Union[Tx, TxRow]) -> Optional[str]:
     # Conservative change heuristic:
     # - exactly one output address is not among inputs (common in simple spends)
-    in_addrs = {io.addr for io in tx.vin if io.addr != "UNKNOWN"}
-    outs = [io.addr for io in tx.vout if io.addr != "UNKNOWN"]
+    row = tx if isinstance(tx, TxRow) else row_of(tx)
+    in_addrs = {a for a, _ in row.ins}
+    outs = [a for a, _ in row.outs]
     if len(set(outs)) != len(outs):  # repeated outputs -> skip
         return None
     candidates = [a for a in outs if a not in in_addrs]
     return candidates[0] if len(candidates) == 1 else None
 
 
-def build_clusters(txs: List[Tx]) -> ClusteringResult:
-    notes: List[str] = []
-    clusters = cluster_multi_input(txs)
-    addr_to_cluster: Dict[str, int] = {}
-
-    for i, c in enumerate(clusters):
-        for a in c:
-            addr_to_cluster[a] = i
-
-    notes.append(f"Multi-input clusters computed: {len(clusters)}")
-
-    linked = 0
-    for tx in txs:
-        ch = detect_change_address(tx)
-        if not ch:
-            continue
-        ins = [io.addr for io in tx.vin if io.addr != "UNKNOWN"]
-        if not ins:
-            continue
-        root = ins[0]
-        if root in addr_to_cluster:
-            clusters[addr_to_cluster[root]].add(ch)
-            addr_to_cluster[ch] = addr_to_cluster[root]
+CHANGE_LINKS = ("attach", "merge")
+
+
+class Clusterer:
+    # Single-pass clustering state. Links per row come from a HeuristicPipeline
+    # (multi-input plus the selected change heuristics, all in the same pass).
+    # Multi-input unions are applied as rows arrive. Change links are recorded
+    # in tx order (two interned ids per link) and applied by result(), once the
+    # multi-input clusters are complete:
+    #   attach  a change link moves the change address alone into the cluster
+    #           its spender belongs to at that point of the tx order, provided
+    #           the spender is in a multi-input cluster or was attached by an
+    #           earlier link; a later link can move it again. Clusters are the
+    #           multi-input ones plus attached change addresses, as the original
+    #           build_clusters computed them.
+    #   merge   the change address's whole cluster is merged into the
+    #           spender's (a union-find closure, independent of tx order), so
+    #           one wrong change guess joins two clusters. Opt-in.
+
+    def __init__(
+        self, uf: Optional[UnionFind] = None, min_inputs: int = 2,
+        heuristics: Sequence[str] = DEFAULT_HEURISTICS, timing: bool = False, change_links: str = "attach",
+    ):
+        if change_links not in CHANGE_LINKS:
+            raise ValueError(f"unknown change link mode: {change_links} (known: {', '.join(CHANGE_LINKS)})")
+        self.uf = uf if uf is not None else UnionFind()
+        self.min_inputs = min_inputs
+        self.pipeline = HeuristicPipeline(heuristics, min_inputs, timing)
+        self.change_links = change_links
+        self.link_names: List[str] = []
+        self._link_ids: Dict[str, int] = {}
+        self.link_src = array("I")
+        self.link_dst = array("I")
+        self.linked = 0
+
+    def _link_id(self, addr: str) -> int:
+        i = self._link_ids.get(addr)
+        if i is None:
+            i = self._link_ids[addr] = len(self.link_names)
+            self.link_names.append(addr)
+        return i
+
+    def add_change(self, spender: str, change: str) -> None:
+        self.link_src.append(self._link_id(spender))
+        self.link_dst.append(self._link_id(change))
+
+    def add_row(self, row: TxRow) -> None:
+        multi, change = self.pipeline.links(row)
+        if multi:
+            self.uf.union_all(multi)
+        if change:
+            self.add_change(*change)
+
+    def add_table(self, table: TxTable, lo: int = 0, hi: Optional[int] = None) -> "Clusterer":
+        # add_row over txs lo:hi of a table, read from its columns
+        links = self.pipeline.links_of
+        union_all, add_change = self.uf.union_all, self.add_change
+        for i in range(lo, len(table) if hi is None else hi):
+            outs, values = table.outputs(i)
+            multi, change = links(table.inputs(i)[0], outs, values)
+            if multi:
+                union_all(multi)
+            if change:
+                add_change(*change)
+        return self
+
+    def add_links(self, multi: Iterable[List[str]], links: Iterable[Tuple[str, str]]) -> None:
+        # Applies row_links output collected elsewhere (e.g. per shard). Fed in
+        # original tx order, the result is exactly the one of add_row.
+        for addrs in multi:
+            self.uf.union_all(addrs)
+        for s, ch in links:
+            self.add_change(s, ch)
+
+    def iter_links(self) -> Iterator[Tuple[str, str]]:
+        # Recorded (spender, change) links not applied yet, in tx order.
+        names = self.link_names
+        for s, ch in zip(self.link_src, self.link_dst):
+            yield names[s], names[ch]
+
+    def clear_links(self) -> None:
+        self.link_names, self._link_ids = [], {}
+        self.link_src, self.link_dst = array("I"), array("I")
+
+    def add_txs(self, txs: TxSource) -> "Clusterer":
+        if isinstance(txs, TxTable):
+            return self.add_table(txs)
+        for row in iter_rows(txs):
+            self.add_row(row)
+        return self
+
+    def _attach(self) -> Dict[str, int]:
+        # change address -> union-find root of the cluster it ends up in
+        uf, names, ids = self.uf, self.link_names, self.uf.ids
+        moved: Dict[int, int] = {}
+        linked = 0
+        for s, ch in zip(self.link_src, self.link_dst):
+            r = moved.get(s)
+            if r is None:
+                i = ids.get(names[s])
+                if i is None:
+                    continue
+                r = uf.find(i)
+            moved[ch] = r
             linked += 1
+        self.linked = linked
+        return {names[ch]: r for ch, r in moved.items()}
+
+    def _merge(self) -> None:
+        uf = self.uf
+        pending: Dict[str, Counter] = {}
+        for s, ch in self.iter_links():
+            pending.setdefault(s, Counter())[ch] += 1
+        self.clear_links()
+        queue = [a for a in pending if a in uf]
+        while queue:
+            root = queue.pop()
+            for ch, n in pending.pop(root, Counter()).items():
+                uf.union(root, ch)
+                self.linked += n
+                if ch in pending:
+                    queue.append(ch)
+
+    def groups(self) -> List[Set[str]]:
+        # Clusters with the change links applied, in report order (see _groups).
+        return list(self._groups().values())
+
+    def _groups(self) -> Dict[int, Set[str]]:
+        # union-find root -> cluster, in the order the original build_clusters
+        # listed them, which is the order --max-clusters picks from:
+        #   attach  a cluster sits where the first multi-input cluster holding
+        #           one of its addresses appeared (clusters listed in order of
+        #           their first address), a cluster of attached change
+        #           addresses only after all of those, in link order;
+        #   merge   in order of each cluster's first address.
+        # Clusters of the same position (a change address moved out of a
+        # multi-input cluster) follow the order of their own first address.
+        # Members go into each set in id order too: a set's iteration order,
+        # and with it the float sums over a cluster, depends on insertion
+        # order, which differs between a forest built in one pass and one
+        # restored from a workspace.
+        uf = self.uf
+        names = uf.names
+        if self.change_links == "merge":
+            self._merge()
+            ordered = sorted(sorted(m) for m in uf.members.values())
+            return {uf.find(m[0]): {names[i] for i in m} for m in ordered}
+        members = {r: sorted(m) for r, m in uf.members.items()}
+        first = {r: m[0] for r, m in members.items()}
+        moved = self._attach()
+        groups = {r: {names[i] for i in m if names[i] not in moved} for r, m in members.items()}
+        at = {r: (0, first[r], first[r]) for r, g in groups.items() if g}
+        for n, (a, r) in enumerate(moved.items()):
+            i = uf.ids.get(a)
+            p = (0, first[uf.find(i)], first[r]) if i is not None else (1, n, first[r])
+            if r not in at or p < at[r]:
+                at[r] = p
+            groups[r].add(a)
+        return {r: groups[r] for r in sorted(at, key=at.get)}
 
-    notes.append(f"Change-address linked: {linked}")
+    def result(self) -> ClusteringResult:
+        notes = [f"Multi-input clusters computed: {len(self.uf.members)}"]
+        groups = self._groups()
+        clusters = list(groups.values())
+        notes.append(f"Change-address linked: {self.linked}")
+        if self.change_links != "attach":
+            notes.append(f"Change links: {self.change_links}")
+        pipe = self.pipeline
+        stats = pipe.stats()
+        if pipe.names != DEFAULT_HEURISTICS:
+            notes.append("Change heuristics: " + ", ".join(f"{n}={stats['hits'][n]}" for n in pipe.names)
+                         + f", conflicts={stats['hits']['conflicts']}")
+        addr_to_cluster = {a: i for i, c in enumerate(clusters) for a in c}
+        res = ClusteringResult(clusters=clusters, addr_to_cluster=addr_to_cluster, notes=notes, uf=self.uf)
+        res.heuristics = stats
+        res.roots = [self.uf.names[r] for r in groups]
+        return res
 
-    # normalize
-    norm: Dict[int, Set[str]] = {}
-    for a, i in addr_to_cluster.items():
-        norm.setdefault(i, set()).add(a)
-    clusters = list(norm.values())
-    addr_to_cluster = {a: i for i, c in enumerate(clusters) for a in c}
 
-    return ClusteringResult(clusters=clusters, addr_to_cluster=addr_to_cluster, notes=notes)
+def build_clusters(
+    txs: TxSource, uf: Optional[UnionFind] = None,
+    heuristics: Sequence[str] = DEFAULT_HEURISTICS, timing: bool = False, change_links: str = "attach",
+) -> ClusteringResult:
+    return Clusterer(uf, heuristics=heuristics, timing=timing, change_links=change_links).add_txs(txs).result()
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from .providers.blockstream import BlockstreamProvider, Tx
+
+
+@dataclass
+class CrawlResult:
+    txs: List[Tx]
+    depth: Dict[str, int]                 # fetched address -> hop depth
+    failed: Dict[str, str] = field(default_factory=dict)
+    duplicates: int = 0                   # txs returned again by another address
+
+
+class AddressCrawler:
+    # Breadth-first crawl of address histories. Every hop level is fetched
+    # concurrently on a thread pool sharing one provider (pooled session + shared
+    # RateLimiter), and transactions reached from several addresses are kept once.
+    # Results are merged in frontier order, so the output does not depend on
+    # thread scheduling.
+
+    def __init__(
+        self,
+        provider: BlockstreamProvider,
+        workers: int = 8,
+        per_address_limit: int = 250,
+        max_addresses: Optional[int] = None,
+    ):
+        self.provider = provider
+        self.workers = max(workers, 1)
+        self.per_address_limit = per_address_limit
+        self.max_addresses = max_addresses
+
+    def _fetch(self, address: str):
+        try:
+            return self.provider.fetch_address_txs(address, limit=self.per_address_limit)
+        except Exception as e:
+            return e
+
+    def crawl(self, frontier: Iterable[str], max_depth: int = 0) -> CrawlResult:
+        # max_depth=0 fetches only the frontier; each extra hop adds the
+        # counterparties found in the previous level.
+        res = CrawlResult(txs=[], depth={})
+        seen_txids: Set[str] = set()
+        level = list(dict.fromkeys(frontier))
+        if self.max_addresses is not None:
+            level = level[: self.max_addresses]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for d in range(max_depth + 1):
+                if not level:
+                    break
+                for a in level:
+                    res.depth[a] = d
+                found: Dict[str, None] = {}
+                for a, got in zip(level, pool.map(self._fetch, level)):
+                    if isinstance(got, Exception):
+                        res.failed[a] = str(got)
+                        continue
+                    for tx in got:
+                        if tx.txid in seen_txids:
+                            res.duplicates += 1
+                            continue
+                        seen_txids.add(tx.txid)
+                        res.txs.append(tx)
+                        for io in tx.vin + tx.vout:
+                            if io.addr != "UNKNOWN" and io.addr not in res.depth:
+                                found[io.addr] = None
+                level = list(found)
+                if self.max_addresses is not None:
+                    level = level[: max(self.max_addresses - len(res.depth), 0)]
+        return res
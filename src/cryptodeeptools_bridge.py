@@ -1,11 +1,14 @@
 from __future__ import annotations
 
-import os
+import random
 import subprocess
+import sys
 import tempfile
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import List, Sequence, Tuple
+
+from .pubtoaddr import normalize_pubkey, pubkey_to_address
 
 
 CRYPTODEEPTOOLS_GIT = "https://github.com/demining/CryptoDeepTools.git"
@@ -25,7 +28,9 @@ class CryptoDeepToolsBridge:
     We DO NOT execute or wrap modules intended for private-key recovery, wallet cracking,
     or exploitation. This bridge only supports:
       - installing (cloning) the repo for reproducibility
-      - using the public 'pubtoaddr.py' converter (PUBKEY HEX -> Base58 address)
+      - using the public 'pubtoaddr.py' converter (PUBKEY HEX -> Base58 address),
+        one process per batch of keys, and as a reference to cross-check the
+        in-process converter in src/pubtoaddr.py
 
     Reference: CryptoDeepTools repository contains a folder '03CheckBitcoinAddressBalance'
     with scripts 'pubtoaddr.py' and 'bitcoin-checker.py'. Use is limited to 'pubtoaddr.py'.
@@ -48,36 +53,54 @@ class CryptoDeepToolsBridge:
         # checker may exist, but we don't use it in this prototype
         return CryptoDeepToolsPaths(root=self.repo_dir, pubtoaddr=pubtoaddr, checker=checker)
 
-    def pubkey_hex_to_base58(self, pubkey_hex: str, python: str = "python3") -> str:
+    def pubkey_hex_to_base58(self, pubkey_hex: str, python: str = sys.executable) -> str:
         """
         Convert Bitcoin public key (hex) to Base58 address by invoking CryptoDeepTools/pubtoaddr.py.
+        """
+        return self.pubkeys_hex_to_base58([pubkey_hex], python=python)[0]
+
+    def pubkeys_hex_to_base58(self, pubkeys_hex: Sequence[str], python: str = sys.executable) -> List[str]:
+        """
+        Convert many public keys with a single pubtoaddr.py run.
 
         Implementation detail:
-        CryptoDeepTools/pubtoaddr.py reads file 'pubkey.json' and writes 'addresses.json'.
-        We run it inside a temporary directory to avoid polluting the project directory.
+        CryptoDeepTools/pubtoaddr.py reads file 'pubkey.json' (one key per line) and writes
+        'addresses.json' (one address per line). We run it inside a temporary directory to
+        avoid polluting the project directory.
         """
-        pubkey_hex = pubkey_hex.strip().lower().replace("0x", "")
-        if not all(c in "0123456789abcdef" for c in pubkey_hex) or len(pubkey_hex) < 66:
-            raise ValueError("pubkey_hex must be a hex-encoded public key (uncompressed ~130 hex or compressed ~66 hex)")
+        keys = [normalize_pubkey(k) for k in pubkeys_hex]
+        if not keys:
+            return []
 
         self.ensure_installed()
         p = self.paths()
 
         with tempfile.TemporaryDirectory(prefix="bf_cdt_") as td:
             td_path = Path(td)
-            (td_path / "pubkey.json").write_text(pubkey_hex + "\n", encoding="utf-8")
+            (td_path / "pubkey.json").write_text("\n".join(keys) + "\n", encoding="utf-8")
 
             # Run the script. It expects to work in its CWD.
             # We copy the script into tempdir to keep relative file IO simple.
             local_script = td_path / "pubtoaddr.py"
             local_script.write_text(p.pubtoaddr.read_text(encoding="utf-8"), encoding="utf-8")
 
-            subprocess.check_call([python, str(local_script)], cwd=str(td_path))
+            subprocess.run([python, str(local_script)], cwd=str(td_path), check=True, capture_output=True)
 
             out_file = td_path / "addresses.json"
             if not out_file.exists():
                 raise RuntimeError("CryptoDeepTools pubtoaddr.py did not produce addresses.json")
-            addr = out_file.read_text(encoding="utf-8").strip().splitlines()[0].strip()
-            if not addr:
-                raise RuntimeError("addresses.json is empty")
-            return addr
+            addrs = [a.strip() for a in out_file.read_text(encoding="utf-8").splitlines() if a.strip()]
+            if len(addrs) != len(keys):
+                raise RuntimeError(f"addresses.json has {len(addrs)} entries for {len(keys)} keys")
+            return addrs
+
+    def cross_check(self, pubkeys_hex: Sequence[str], sample: int = 20, seed: int = 0) -> List[Tuple[str, str, str]]:
+        """
+        Compare the in-process P2PKH derivation (src/pubtoaddr.py) with pubtoaddr.py on a
+        random sample of keys. Returns (key, native, cryptodeeptools) for every mismatch.
+        """
+        keys = list(dict.fromkeys(pubkeys_hex))
+        if len(keys) > sample:
+            keys = random.Random(seed).sample(keys, sample)
+        cdt = self.pubkeys_hex_to_base58(keys)
+        return [(k, pubkey_to_address(k), a) for k, a in zip(keys, cdt) if pubkey_to_address(k) != a]
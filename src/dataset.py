@@ -1,45 +1,259 @@
 from __future__ import annotations
 
 import json
+import os
+import re
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
 from pathlib import Path
 
-from .providers.blockstream import Tx, TxIO
+from .providers.blockstream import Tx
+from .txtable import AddressIndex, TxRow, TxTable, UNKNOWN, btc_to_sat
+from .dataset_bin import DatasetReader, DatasetWriter, is_binary_path, temp_path
+
+
+def _tx_json(t: Tx) -> Dict[str, Any]:
+    return {
+        "txid": t.txid,
+        "time": t.time,
+        "fee": t.fee_btc,
+        "vin": [{"addr": io.addr, "value": io.value_btc} for io in t.vin],
+        "vout": [{"addr": io.addr, "value": io.value_btc} for io in t.vout],
+    }
+
+
+def write_json_stream(f: TextIO, root_address: str, txs: Iterable[Tx]) -> int:
+    # Same layout as json.dumps(Dataset.to_json(), indent=2), written one tx at a time.
+    f.write("{\n  \"address\": " + json.dumps(root_address, ensure_ascii=False) + ",\n  \"transactions\": [")
+    n = 0
+    for t in txs:
+        body = json.dumps(_tx_json(t), ensure_ascii=False, indent=2).replace("\n", "\n    ")
+        f.write(("," if n else "") + "\n    " + body)
+        n += 1
+    f.write("\n  ]\n}" if n else "]\n}")
+    return n
+
+
+def write_json_file(path: Path, root_address: str, txs: Iterable[Tx]) -> int:
+    # write_json_stream into `path`, renamed into place only once complete
+    # (like DatasetWriter), so an error midway leaves no truncated file behind.
+    tmp = temp_path(path)
+    try:
+        with tmp.open("w", encoding="utf-8") as f:
+            n = write_json_stream(f, root_address, txs)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return n
 
 
 @dataclass
 class Dataset:
     root_address: str
-    txs: List[Tx]
+    txs: Union[List[Tx], TxTable]
 
     def to_json(self) -> Dict[str, Any]:
         return {
             "address": self.root_address,
-            "transactions": [
-                {
-                    "txid": t.txid,
-                    "time": t.time,
-                    "fee": t.fee_btc,
-                    "vin": [{"addr": io.addr, "value": io.value_btc} for io in t.vin],
-                    "vout": [{"addr": io.addr, "value": io.value_btc} for io in t.vout],
-                }
-                for t in self.txs
-            ],
+            "transactions": [_tx_json(t) for t in self.txs],
         }
 
     @staticmethod
     def from_json(obj: Dict[str, Any]) -> "Dataset":
-        txs: List[Tx] = []
+        # Loaded datasets are held columnar; Tx/TxIO views are built on access.
+        txs = TxTable()
         for t in obj.get("transactions", []):
-            vin = [TxIO(addr=x["addr"], value_btc=float(x["value"])) for x in t.get("vin", [])]
-            vout = [TxIO(addr=x["addr"], value_btc=float(x["value"])) for x in t.get("vout", [])]
-            txs.append(Tx(txid=t["txid"], time=int(t["time"]), vin=vin, vout=vout, fee_btc=float(t.get("fee", 0))))
+            txs.append(
+                t["txid"],
+                int(t["time"]),
+                btc_to_sat(float(t.get("fee", 0))),
+                ((x["addr"], btc_to_sat(float(x["value"]))) for x in t.get("vin", [])),
+                ((x["addr"], btc_to_sat(float(x["value"]))) for x in t.get("vout", [])),
+            )
         return Dataset(root_address=obj.get("address", "UNKNOWN"), txs=txs)
 
+    def txids(self) -> Set[str]:
+        if isinstance(self.txs, TxTable):
+            return set(self.txs.txids)
+        return {t.txid for t in self.txs}
+
+    def tx_times(self) -> Dict[str, int]:
+        if isinstance(self.txs, TxTable):
+            return dict(zip(self.txs.txids, self.txs.time))
+        return {t.txid: t.time for t in self.txs}
+
+    def merged(self, new_txs: List[Tx]) -> "Dataset":
+        # New txs first (provider order is newest first), then the stored ones;
+        # a stored tx with the same txid is replaced by its fresh copy.
+        new_ids = {t.txid for t in new_txs}
+        table = TxTable.from_txs(new_txs)
+        if isinstance(self.txs, TxTable):
+            for i, txid in enumerate(self.txs.txids):
+                if txid not in new_ids:
+                    table.append_from(self.txs, i)
+        else:
+            for t in self.txs:
+                if t.txid not in new_ids:
+                    table.append_tx(t)
+        return Dataset(root_address=self.root_address, txs=table)
+
     def save(self, path: Path) -> None:
-        path.write_text(json.dumps(self.to_json(), ensure_ascii=False, indent=2), encoding="utf-8")
+        # *.bftx -> chunked binary format (see dataset_bin), anything else -> JSON.
+        if is_binary_path(path):
+            with DatasetWriter(path, self.root_address) as w:
+                if isinstance(self.txs, TxTable):
+                    w.append_table(self.txs)
+                else:
+                    for t in self.txs:
+                        w.append_tx(t)
+            return
+        write_json_file(path, self.root_address, self.txs)
 
     @staticmethod
     def load(path: Path) -> "Dataset":
+        if is_binary_path(path):
+            with DatasetReader(path) as r:
+                return Dataset(root_address=r.root_address, txs=r.read_table())
         return Dataset.from_json(json.loads(path.read_text(encoding="utf-8")))
+
+
+def convert_dataset(src: Path, dst: Path) -> int:
+    # JSON <-> binary. Binary sources are streamed batch by batch.
+    if not is_binary_path(src):
+        ds = Dataset.load(src)
+        ds.save(dst)
+        return len(ds.txs)
+
+    with DatasetReader(src) as r:
+        if is_binary_path(dst):
+            with DatasetWriter(dst, r.root_address) as w:
+                for table in r.iter_tables():
+                    w.append_table(table)
+                return w.count
+        return write_json_file(dst, r.root_address, (t for table in r.iter_tables() for t in table))
+
+
+JSON_BATCH = 4096  # txs per table of DatasetStream.tables() over a JSON file, as a binary batch
+_ADDRESS_KEY = re.compile(r'"address"\s*:\s*("(?:[^"\\]|\\.)*")')
+_TXS_KEY = re.compile(r'"transactions"\s*:\s*\[')
+
+
+def _row_json(t: Dict[str, Any]) -> TxRow:
+    return TxRow(
+        t["txid"],
+        int(t["time"]),
+        btc_to_sat(float(t.get("fee", 0))),
+        [(x["addr"], btc_to_sat(float(x["value"]))) for x in t.get("vin", []) if x["addr"] != UNKNOWN],
+        [(x["addr"], btc_to_sat(float(x["value"]))) for x in t.get("vout", []) if x["addr"] != UNKNOWN],
+    )
+
+
+class DatasetStream:
+    # Single forward pass over a dataset file without materialising it.
+    # Binary files are read batch by batch; JSON files are decoded one
+    # transaction object at a time from a bounded text buffer.
+
+    def __init__(self, path: Path, chunk_size: int = 1 << 20):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.root_address: Optional[str] = None
+        self.tx_count = 0
+        self.skipped = 0                      # binary: txs of skipped batches
+        self.resume: Optional[Tuple[int, str]] = None  # binary: (end, digest) after rows()
+        self._checked: Optional[Tuple[int, Any]] = None  # (end, digest state) resumable() confirmed
+        if is_binary_path(path):
+            with DatasetReader(path) as r:
+                self.root_address = r.root_address
+
+    def resumable(self, end: int, digest: str) -> bool:
+        # True if the file still starts with the bytes a former rows() pass
+        # ended at (self.resume of that pass); binary files only. Hashes those
+        # bytes; a pass resumed at `end` then only hashes the rest for its
+        # own resume point.
+        if not is_binary_path(self.path):
+            return False
+        with DatasetReader(self.path) as r:
+            if r.end < end:
+                return False
+            h = r.digest(end)
+        if h.hexdigest() != digest:
+            return False
+        self._checked = (end, h)
+        return True
+
+    def rows(self, start: int = 0, skip: Optional[Callable[[List[str]], bool]] = None) -> Iterator[TxRow]:
+        # start/skip: see DatasetReader.iter_tables (binary files; a JSON file
+        # is always read whole).
+        if is_binary_path(self.path):
+            for table in self.tables(start, skip):
+                yield from table.rows()
+            return
+        for obj in self._json_txs():
+            self.tx_count += 1
+            yield _row_json(obj)
+
+    def tables(self, start: int = 0, skip: Optional[Callable[[List[str]], bool]] = None) -> Iterator[TxTable]:
+        # rows() as TxTables, for readers that work on columns: a binary
+        # file's stored batches, or JSON transactions in tables of JSON_BATCH
+        # sharing one address index.
+        if is_binary_path(self.path):
+            with DatasetReader(self.path) as r:
+                for table in r.iter_tables(start, skip):
+                    self.tx_count += len(table)
+                    yield table
+                self.skipped = r.skipped
+                if self._checked is not None and self._checked[0] == start:
+                    h = r.digest(r.end, self._checked[1].copy(), start)
+                else:
+                    h = r.digest(r.end)
+                self.resume = (r.end, h.hexdigest())
+            return
+        addrs = AddressIndex()
+        table = TxTable(addrs)
+        for obj in self._json_txs():
+            self.tx_count += 1
+            table.append(*_row_json(obj))
+            if len(table) >= JSON_BATCH:
+                yield table
+                table = TxTable(addrs)
+        if len(table):
+            yield table
+
+    def _json_txs(self) -> Iterator[Dict[str, Any]]:
+        dec = json.JSONDecoder()
+        with self.path.open("r", encoding="utf-8") as f:
+            buf = ""
+            while True:
+                m = _TXS_KEY.search(buf)
+                if m:
+                    break
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    self._root_from(buf)
+                    return
+                buf += chunk
+            self._root_from(buf[: m.start()])
+            buf, pos, eof = buf[m.end():], 0, False
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) and buf[pos] == "]":
+                    break
+                try:
+                    obj, pos = dec.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    chunk = f.read(self.chunk_size)
+                    eof = not chunk
+                    buf, pos = buf[pos:] + chunk, 0
+                    continue
+                yield obj
+            # "address" may also follow the transactions array
+            if self.root_address is None:
+                self._root_from(buf[pos:] + f.read())
+
+    def _root_from(self, text: str) -> None:
+        m = _ADDRESS_KEY.search(text)
+        if m and self.root_address is None:
+            self.root_address = json.loads(m.group(1))
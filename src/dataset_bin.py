@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from hashlib import blake2b
+from itertools import accumulate
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from .providers.blockstream import Tx
+from .txtable import AddressIndex, TxTable, btc_to_sat
+
+
+# Chunked binary dataset format (.bftx).
+#
+#   file   := MAGIC header batch*
+#   header := u32 len, utf-8 root address
+#   batch  := b"TXB1", u64 payload_len, payload
+#   payload:= u32 n_tx, u32 n_vin, u32 n_vout,
+#             strings(new addresses), strings(txids),
+#             i64 time[n_tx], i64 fee[n_tx],
+#             u32 vin_count[n_tx], i32 vin_addr[n_vin], i64 vin_value[n_vin],
+#             u32 vout_count[n_tx], i32 vout_addr[n_vout], i64 vout_value[n_vout]
+#   strings:= u32 count, u32 byte_len, "\n"-joined utf-8
+#
+# Address ids are global to the file: each batch only carries the addresses
+# first seen in it, appended to the intern table in order. That keeps writes
+# append-only (no back-patching), so a dataset can be written while the
+# provider is still paginating. All integers are little-endian.
+
+MAGIC = b"BFTX\x00\x01\n"
+BATCH_TAG = b"TXB1"
+BINARY_SUFFIX = ".bftx"
+
+_BATCH_HEAD = struct.Struct("<4sQ")
+_COUNTS = struct.Struct("<III")
+_U32 = struct.Struct("<I")
+_STRS = struct.Struct("<II")
+_SWAP = sys.byteorder != "little"
+
+
+def is_binary_path(path: Path) -> bool:
+    return path.suffix == BINARY_SUFFIX
+
+
+def temp_path(path: Path) -> Path:
+    # Sibling name for writing `path` before renaming it into place (same filesystem).
+    return path.with_name(path.name + f".{os.getpid()}.tmp")
+
+
+def _col_bytes(col: array) -> bytes:
+    if _SWAP:
+        col = array(col.typecode, col)
+        col.byteswap()
+    return col.tobytes()
+
+
+def _strings(items: Iterable[str]) -> bytes:
+    items = list(items)
+    blob = "\n".join(items).encode("utf-8")
+    return _STRS.pack(len(items), len(blob)) + blob
+
+
+class DatasetWriter:
+    # Streaming writer: buffers up to batch_size transactions in a TxTable and
+    # flushes them as one record batch. Use as a context manager. The file is
+    # written under a temporary name and renamed into place by close(); a
+    # block left with an exception discards it, so a failed write never leaves
+    # a truncated dataset that reads back as a valid one.
+
+    def __init__(self, path: Path, root_address: str, batch_size: int = 4096):
+        self.path = path
+        self.batch_size = batch_size
+        self.addrs = AddressIndex()
+        self.count = 0
+        self._written_addrs = 0
+        self._buf = TxTable(self.addrs)
+        self._tmp = temp_path(path)
+        self._f: BinaryIO = self._tmp.open("wb")
+        root = root_address.encode("utf-8")
+        self._f.write(MAGIC + _U32.pack(len(root)) + root)
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, exc_type: object, *exc: object) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def append(self, txid: str, time: int, fee_sat: int,
+               vin: Iterable[Tuple[str, int]], vout: Iterable[Tuple[str, int]]) -> None:
+        self._buf.append(txid, time, fee_sat, vin, vout)
+        self.count += 1
+        if len(self._buf) >= self.batch_size:
+            self.flush()
+
+    def append_tx(self, tx: Tx) -> None:
+        self.append(
+            tx.txid,
+            tx.time,
+            btc_to_sat(tx.fee_btc),
+            ((io.addr, btc_to_sat(io.value_btc)) for io in tx.vin),
+            ((io.addr, btc_to_sat(io.value_btc)) for io in tx.vout),
+        )
+
+    def append_table(self, table: TxTable) -> None:
+        for i in range(len(table)):
+            self._buf.append_from(table, i)
+            self.count += 1
+            if len(self._buf) >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        b = self._buf
+        if not len(b):
+            return
+        n = len(b)
+        new_addrs = self.addrs.names[self._written_addrs:]
+        vin_count = array("I", (b.vin_off[i + 1] - b.vin_off[i] for i in range(n)))
+        vout_count = array("I", (b.vout_off[i + 1] - b.vout_off[i] for i in range(n)))
+        payload = b"".join([
+            _COUNTS.pack(n, len(b.vin_addr), len(b.vout_addr)),
+            _strings(new_addrs),
+            _strings(b.txids),
+            _col_bytes(b.time),
+            _col_bytes(b.fee),
+            _col_bytes(vin_count),
+            _col_bytes(b.vin_addr),
+            _col_bytes(b.vin_value),
+            _col_bytes(vout_count),
+            _col_bytes(b.vout_addr),
+            _col_bytes(b.vout_value),
+        ])
+        self._f.write(_BATCH_HEAD.pack(BATCH_TAG, len(payload)))
+        self._f.write(payload)
+        self._f.flush()
+        self._written_addrs = len(self.addrs)
+        self._buf = TxTable(self.addrs)
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        self.flush()
+        self._f.close()
+        os.replace(self._tmp, self.path)
+
+    def discard(self) -> None:
+        if not self._f.closed:
+            self._f.close()
+            self._tmp.unlink(missing_ok=True)
+
+
+class DatasetReader:
+    # Memory-mapped reader. Batches are decoded straight from the mapping with
+    # array.frombytes (one copy per column, no per-IO Python objects).
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._f = path.open("rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a {BINARY_SUFFIX} dataset")
+        pos = len(MAGIC)
+        (n,) = _U32.unpack_from(self._mm, pos)
+        pos += _U32.size
+        self.root_address = self._mm[pos: pos + n].decode("utf-8")
+        self._data_start = pos + n
+
+    def __enter__(self) -> "DatasetReader":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if not self._mm.closed:
+            self._mm.close()
+        self._f.close()
+
+    def _col(self, typecode: str, pos: int, n: int) -> Tuple[array, int]:
+        col = array(typecode)
+        end = pos + n * col.itemsize
+        col.frombytes(self._mm[pos:end])
+        if _SWAP:
+            col.byteswap()
+        return col, end
+
+    def _strs(self, pos: int) -> Tuple[list, int]:
+        n, size = _STRS.unpack_from(self._mm, pos)
+        pos += _STRS.size
+        if not n:
+            return [], pos + size
+        return self._mm[pos: pos + size].decode("utf-8").split("\n"), pos + size
+
+    def _batch_strings(self, pos: int) -> Tuple[list, list, int]:
+        # (new addresses, txids, position of the columns) of the batch at pos
+        new_addrs, p = self._strs(pos + _COUNTS.size)
+        txids, p = self._strs(p)
+        return new_addrs, txids, p
+
+    def _read_batch(self, pos: int, into: TxTable, strings: Optional[Tuple[list, list, int]] = None) -> None:
+        n, n_vin, n_vout = _COUNTS.unpack_from(self._mm, pos)
+        new_addrs, txids, pos = strings or self._batch_strings(pos)
+        for a in new_addrs:
+            into.addrs.intern(a)
+        into.txids.extend(txids)
+        for col, tc, cnt in ((into.time, "q", n), (into.fee, "q", n)):
+            part, pos = self._col(tc, pos, cnt)
+            col.extend(part)
+        for off, addr_col, value_col, total in (
+            (into.vin_off, into.vin_addr, into.vin_value, n_vin),
+            (into.vout_off, into.vout_addr, into.vout_value, n_vout),
+        ):
+            counts, pos = self._col("I", pos, n)
+            off.extend(accumulate(counts, initial=off.pop()))
+            part, pos = self._col("i", pos, total)
+            addr_col.extend(part)
+            part, pos = self._col("q", pos, total)
+            value_col.extend(part)
+
+    def _batches(self) -> Iterator[int]:
+        pos = self._data_start
+        size = len(self._mm)
+        while pos < size:
+            tag, length = _BATCH_HEAD.unpack_from(self._mm, pos)
+            if tag != BATCH_TAG:
+                raise ValueError(f"{self.path}: corrupt batch header at offset {pos}")
+            pos += _BATCH_HEAD.size
+            yield pos
+            pos += length
+
+    def iter_tables(self, start: int = 0, skip: Optional[Callable[[List[str]], bool]] = None) -> Iterator[TxTable]:
+        # One TxTable per stored batch; all share the file's address index.
+        # start: byte offset to resume from (a former end); batches before it,
+        # and batches whose txid list skip() accepts, are not decoded: they
+        # only add their addresses to the index. self.skipped counts the
+        # latter's transactions.
+        addrs = AddressIndex()
+        self.skipped = 0
+        for pos in self._batches():
+            strings = self._batch_strings(pos)
+            if pos < start or (skip is not None and skip(strings[1])):
+                for a in strings[0]:
+                    addrs.intern(a)
+                if pos >= start:
+                    self.skipped += len(strings[1])
+                continue
+            t = TxTable(addrs)
+            self._read_batch(pos, t, strings)
+            yield t
+
+    @property
+    def end(self) -> int:
+        # Offset after the last batch. Writers only ever add batches, so a file
+        # that starts with the same bytes up to a former end holds the same
+        # transactions there (see digest).
+        return len(self._mm)
+
+    def digest(self, end: int, h: Optional["blake2b"] = None, start: int = 0, span: int = 1 << 20) -> "blake2b":
+        # blake2b over every byte before `end`, read `span` bytes at a time
+        # from the mapping. h: a digest of the bytes before `start` to
+        # continue (give it a copy to keep it), so that a pass that checked
+        # the old part of a grown file only hashes what was appended.
+        if h is None:
+            h, start = blake2b(digest_size=16), 0
+        with memoryview(self._mm) as view:
+            for lo in range(start, end, span):
+                h.update(view[lo: min(lo + span, end)])
+        return h
+
+    def read_table(self) -> TxTable:
+        t = TxTable()
+        for pos in self._batches():
+            self._read_batch(pos, t)
+        return t
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .txtable import SAT_PER_BTC, TxSource, TxTable
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+
+@dataclass
+class AddressEdges:
+    # Address flow graph as a COO edge list sorted by (src, dst), which doubles
+    # as CSR: edges of node i are indptr[i]:indptr[i + 1]. Same semantics as
+    # build_graphs' address_graph: value is the input-proportional share of each
+    # output in BTC, tx_count counts (input, output) pairs, last_time is the max
+    # tx time.
+    names: List[str]
+    src: np.ndarray        # int32 address id
+    dst: np.ndarray        # int32 address id
+    value: np.ndarray      # float64 BTC
+    tx_count: np.ndarray   # int64
+    last_time: np.ndarray  # int64
+
+    def __len__(self) -> int:
+        return len(self.src)
+
+    def nodes(self) -> np.ndarray:
+        return np.union1d(self.src, self.dst)
+
+    def indptr(self) -> np.ndarray:
+        return np.concatenate(([0], np.cumsum(np.bincount(self.src, minlength=len(self.names)))))
+
+    def to_networkx(self) -> nx.DiGraph:
+        import networkx as nx
+
+        g = nx.DiGraph()
+        names = self.names
+        g.add_edges_from(
+            (names[s], names[d], {"value": float(v), "tx_count": int(c), "last_time": int(t)})
+            for s, d, v, c, t in zip(
+                self.src.tolist(), self.dst.tolist(), self.value.tolist(),
+                self.tx_count.tolist(), self.last_time.tolist(),
+            )
+        )
+        return g
+
+
+@dataclass
+class EdgeListGraphs:
+    address: AddressEdges
+    bipartite_nodes: int
+    bipartite_edges: int
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "address_graph_nodes": int(len(self.address.nodes())),
+            "address_graph_edges": len(self.address),
+            "bipartite_nodes": self.bipartite_nodes,
+            "bipartite_edges": self.bipartite_edges,
+        }
+
+
+def _col(a) -> np.ndarray:
+    # Zero-copy view of an array.array column.
+    return np.frombuffer(a, dtype=np.int64 if a.typecode == "q" else np.int32)
+
+
+def _known_ios(off, addr, value, lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Known (tx, addr, value) entries of txs lo..hi; tx is relative to lo.
+    off = _col(off)[lo: hi + 1]
+    addr, value = _col(addr)[off[0]: off[-1]], _col(value)[off[0]: off[-1]]
+    tx = np.repeat(np.arange(len(off) - 1, dtype=np.int64), np.diff(off))
+    keep = addr >= 0
+    return tx[keep], addr[keep], value[keep]
+
+
+def _aggregate(keys: np.ndarray, w: np.ndarray, cnt: np.ndarray, t: np.ndarray):
+    uniq, inv = np.unique(keys, return_inverse=True)
+    value = np.bincount(inv, weights=w, minlength=len(uniq))
+    tx_count = np.bincount(inv, weights=cnt, minlength=len(uniq)).astype(np.int64)
+    last = np.full(len(uniq), np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(last, inv, t)
+    return uniq, value, tx_count, last
+
+
+class _TxIOs:
+    # Known inputs/outputs of txs start..stop as flat arrays (tx relative to
+    # start) with per-tx counts and offsets: what pair expansion works on.
+
+    def __init__(self, table: TxTable, start: int, stop: int):
+        self.n_tx = n_tx = stop - start
+        self.in_tx, self.in_addr, self.in_val = _known_ios(table.vin_off, table.vin_addr, table.vin_value, start, stop)
+        self.out_tx, self.out_addr, self.out_val = _known_ios(
+            table.vout_off, table.vout_addr, table.vout_value, start, stop
+        )
+        self.time = _col(table.time)[start:stop]
+        self.n_in = np.bincount(self.in_tx, minlength=n_tx)
+        self.n_out = np.bincount(self.out_tx, minlength=n_tx)
+        self.out_start = np.concatenate(([0], np.cumsum(self.n_out)))
+        self.in_start = np.concatenate(([0], np.cumsum(self.n_in)))
+        self.in_sum = np.bincount(self.in_tx, weights=self.in_val, minlength=n_tx)
+
+    def pair_chunks(self, max_pairs: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        # (src addr, dst addr, value BTC, tx) of every (known input, output)
+        # pair of txs with a positive input sum, in chunks of whole txs holding
+        # at most ~max_pairs pairs.
+        pairs_per_tx = np.where(self.in_sum > 0, self.n_in * self.n_out, 0)
+        cum = np.cumsum(pairs_per_tx)
+        lo = 0
+        while lo < self.n_tx:
+            base = cum[lo - 1] if lo else 0
+            hi = max(int(np.searchsorted(cum, base + max_pairs, side="right")), lo + 1)
+            hi = min(hi, self.n_tx)
+            sl = slice(self.in_start[lo], self.in_start[hi])
+            yield self._expand(self.in_tx[sl], self.in_addr[sl], self.in_val[sl])
+            lo = hi
+
+    def _expand(self, e_tx, e_addr, e_val):
+        # Expands known inputs against the outputs of their txs with np.repeat,
+        # weighted by in_value / tx_in_sum * out_value.
+        keep = self.in_sum[e_tx] > 0
+        e_tx, e_addr, e_val = e_tx[keep], e_addr[keep], e_val[keep]
+        reps = self.n_out[e_tx]
+        total = int(reps.sum())
+        src_entry = np.repeat(np.arange(len(e_tx)), reps)
+        # position of each pair within its input entry's run -> output index
+        run_start = np.repeat(np.cumsum(reps) - reps, reps)
+        dst_idx = self.out_start[e_tx[src_entry]] + (np.arange(total) - run_start)
+        p_tx = e_tx[src_entry]
+        w = e_val[src_entry] / self.in_sum[p_tx] * self.out_val[dst_idx] / SAT_PER_BTC
+        return e_addr[src_entry], self.out_addr[dst_idx], w, p_tx
+
+
+def build_edge_list(
+    txs: TxSource, max_pairs: int = 4_000_000, tx_range: Optional[Tuple[int, int]] = None
+) -> EdgeListGraphs:
+    # Vectorized over all transactions: input/output pairs are expanded with
+    # np.repeat (never a Python loop per pair), weighted by
+    # in_value / tx_in_sum * out_value and reduced per (src, dst) with np.unique +
+    # bincount. Expansion runs over tx chunks holding at most ~max_pairs pairs.
+    # tx_range=(lo, hi) restricts the graph to txs lo..hi of a TxTable.
+    table = txs if isinstance(txs, TxTable) else TxTable.from_txs(txs)
+    start, stop = tx_range if tx_range is not None else (0, len(table))
+    ios = _TxIOs(table, start, stop)
+
+    # bipartite graph: one node per tx and per address, one edge per distinct (addr, tx)
+    bi_keys = np.unique(np.concatenate((
+        ios.in_tx << 32 | ios.in_addr.astype(np.int64),
+        ios.out_tx << 32 | ios.out_addr.astype(np.int64),
+    )))
+    n_addrs = len(np.unique(np.concatenate((ios.in_addr, ios.out_addr))))
+
+    parts = []
+    for src, dst, w, p_tx in ios.pair_chunks(max_pairs):
+        if len(src):
+            # aggregate within the chunk to keep the concatenated arrays small
+            keys = src.astype(np.int64) << 32 | dst.astype(np.int64)
+            parts.append(_aggregate(keys, w, np.ones(len(keys)), ios.time[p_tx]))
+
+    if parts:
+        keys, w, cnt, t = (np.concatenate(x) for x in zip(*parts))
+        uniq, value, tx_count, last = _aggregate(keys, w, cnt, t)
+    else:
+        uniq = np.zeros(0, dtype=np.int64)
+        value = np.zeros(0)
+        tx_count = last = np.zeros(0, dtype=np.int64)
+
+    edges = AddressEdges(
+        names=table.addrs.names,
+        src=(uniq >> 32).astype(np.int32),
+        dst=(uniq & 0xFFFFFFFF).astype(np.int32),
+        value=value,
+        tx_count=tx_count,
+        last_time=last,
+    )
+    return EdgeListGraphs(address=edges, bipartite_nodes=ios.n_tx + n_addrs, bipartite_edges=len(bi_keys))
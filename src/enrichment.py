@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import hashlib
+import itertools
+import json
+import sqlite3
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .clustering import ClusteringResult
+from .osint import Label
+
+
+def membership_hash(cluster: Iterable[str]) -> str:
+    return hashlib.sha1("\n".join(sorted(cluster)).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ClusterLabel:
+    kinds: Dict[str, int]    # label kind -> members labeled with it
+    names: List[str]         # distinct entity names
+    sources: List[str]
+    labeled: int             # members with a direct label
+
+    @property
+    def conflict(self) -> bool:
+        return len(self.kinds) > 1
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "kinds": self.kinds,
+            "names": self.names,
+            "sources": self.sources,
+            "labeled_addresses": self.labeled,
+            "conflict": self.conflict,
+        }
+
+    @staticmethod
+    def from_json(obj: Dict[str, Any]) -> "ClusterLabel":
+        return ClusterLabel(
+            kinds=dict(obj["kinds"]), names=list(obj["names"]), sources=list(obj["sources"]),
+            labeled=int(obj["labeled_addresses"]),
+        )
+
+
+def cluster_label(labels: Iterable[Label]) -> Optional[ClusterLabel]:
+    kinds: Counter = Counter()
+    names: Set[str] = set()
+    sources: Set[str] = set()
+    n = 0
+    for lab in labels:
+        kinds[lab.kind] += 1
+        names.add(lab.name)
+        sources.add(lab.source)
+        n += 1
+    if not n:
+        return None
+    return ClusterLabel(
+        kinds=dict(sorted(kinds.items(), key=lambda kv: (-kv[1], kv[0]))),
+        names=sorted(names),
+        sources=sorted(sources),
+        labeled=n,
+    )
+
+
+def label_json(lab: Label) -> Dict[str, str]:
+    return {"kind": lab.kind, "name": lab.name, "source": lab.source}
+
+
+# A cached cluster: its aggregate and the direct labels of its members.
+CachedCluster = Tuple[ClusterLabel, Dict[str, Label]]
+
+
+class EnrichmentCache:
+    # Per-cluster enrichment results (SQLite), keyed by the cluster's membership
+    # hash: the ClusterLabel and the labels of its labeled members. Entries are
+    # tied to a label store fingerprint (and the entry format); opening the
+    # cache with a different one drops them. An unlabeled cluster is cached too
+    # (as null) so it is not looked up again.
+
+    _BATCH = 500
+    _FORMAT = "2"
+
+    def __init__(self, path: Path, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS clusters (h TEXT PRIMARY KEY, body TEXT) WITHOUT ROWID")
+        key = f"{self._FORMAT}:{fingerprint}"
+        row = self._db.execute("SELECT v FROM meta WHERE k = 'fingerprint'").fetchone()
+        if row is None or row[0] != key:
+            self._db.execute("DELETE FROM clusters")
+            self._db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('fingerprint', ?)", (key,))
+
+    def close(self) -> None:
+        self._db.close()
+
+    def get_many(self, hashes: List[str]) -> Dict[str, Optional[CachedCluster]]:
+        out: Dict[str, Optional[CachedCluster]] = {}
+        for lo in range(0, len(hashes), self._BATCH):
+            batch = hashes[lo: lo + self._BATCH]
+            q = "SELECT h, body FROM clusters WHERE h IN (%s)" % ",".join("?" * len(batch))
+            for h, body in self._db.execute(q, batch):
+                if body is None:
+                    out[h] = None
+                    continue
+                obj = json.loads(body)
+                members = {a: Label(kind=k, name=n, source=s) for a, (k, n, s) in obj["members"].items()}
+                out[h] = ClusterLabel.from_json(obj["label"]), members
+        self.hits += len(out)
+        self.misses += len(set(hashes)) - len(out)
+        return out
+
+    def put_many(self, items: Dict[str, Optional[CachedCluster]]) -> None:
+        def body(item: Optional[CachedCluster]) -> Optional[str]:
+            if item is None:
+                return None
+            cl, members = item
+            return json.dumps({
+                "label": cl.to_json(),
+                "members": {a: [lab.kind, lab.name, lab.source] for a, lab in members.items()},
+            }, ensure_ascii=False)
+
+        self._db.execute("BEGIN")
+        self._db.executemany(
+            "INSERT OR REPLACE INTO clusters (h, body) VALUES (?, ?)", ((h, body(it)) for h, it in items.items())
+        )
+        self._db.execute("COMMIT")
+
+
+@dataclass
+class ClusterEnrichment:
+    clusters: ClusteringResult
+    labels: Dict[int, ClusterLabel]                      # cluster id -> labels (labeled clusters only)
+    direct: Dict[str, Label] = field(default_factory=dict)  # directly labeled addresses, clustered or not
+
+    def cluster_of(self, address: str) -> Optional[ClusterLabel]:
+        # Labels propagated through addr_to_cluster: every member of a labeled
+        # cluster is attributed to it, labeled itself or not.
+        cid = self.clusters.addr_to_cluster.get(address)
+        return None if cid is None else self.labels.get(cid)
+
+    def conflicts(self) -> List[int]:
+        return sorted(cid for cid, cl in self.labels.items() if cl.conflict)
+
+    def address_attribution(self) -> Dict[str, Dict[str, Any]]:
+        # Every member of a labeled cluster and every directly labeled address,
+        # sorted: {"cluster_id": id or None, "label": its own label or None}.
+        # The cluster's labels are in summary()["clusters"].
+        clusters = self.clusters.clusters
+        cluster_of = self.clusters.addr_to_cluster
+        out: Dict[str, Dict[str, Any]] = {}
+        for a in sorted({a for cid in self.labels for a in clusters[cid]}.union(self.direct)):
+            lab = self.direct.get(a)
+            out[a] = {"cluster_id": cluster_of.get(a), "label": None if lab is None else label_json(lab)}
+        return out
+
+    def summary(self) -> Dict[str, Any]:
+        # "clusters" holds the labels of every labeled cluster, so each id in
+        # conflicting_clusters (and each cluster_id in address_attribution)
+        # resolves there, whether or not the cluster is among the listed ones.
+        clusters = self.clusters.clusters
+        members = sum(len(clusters[cid]) for cid in self.labels)
+        return {
+            "labeled_clusters": len(self.labels),
+            "conflicting_clusters": self.conflicts(),
+            "labeled_addresses": len(self.direct),
+            "attributed_addresses": members + sum(1 for a in self.direct if self.cluster_of(a) is None),
+            "clusters": {str(cid): self.labels[cid].to_json() for cid in sorted(self.labels)},
+        }
+
+
+def enrich_clusters(
+    clusters: ClusteringResult, store, cache: Optional[EnrichmentCache] = None,
+    addresses: Iterable[str] = (),
+) -> ClusterEnrichment:
+    # One batched store.lookup_many over the members of every cluster that is
+    # not already cached, plus the addresses (the report's, typically) outside
+    # any cluster that are not cached either. Such an address is cached as a
+    # cluster of its own, under the membership hash of just that address.
+    # Cached entries contribute their aggregate and their members' labels.
+    cluster_of = clusters.addr_to_cluster
+    singles = [a for a in dict.fromkeys(addresses) if a not in cluster_of]
+    hashes = [membership_hash(c) for c in clusters.clusters]
+    single_hashes = [membership_hash((a,)) for a in singles]
+    cached = cache.get_many(hashes + single_hashes) if cache is not None else {}
+    todo = [cid for cid, h in enumerate(hashes) if h not in cached]
+    todo_singles = [a for a, h in zip(singles, single_hashes) if h not in cached]
+
+    direct = store.lookup_many(
+        itertools.chain((a for cid in todo for a in clusters.clusters[cid]), todo_singles)
+    )
+    fresh: Dict[str, Optional[CachedCluster]] = {}
+    labels: Dict[int, ClusterLabel] = {}
+    for cid in todo:
+        # sorted members keep the result independent of set iteration order
+        members = {a: direct[a] for a in sorted(clusters.clusters[cid]) if a in direct}
+        cl = cluster_label(members.values())
+        fresh[hashes[cid]] = None if cl is None else (cl, members)
+        if cl is not None:
+            labels[cid] = cl
+    for a in todo_singles:
+        lab = direct.get(a)
+        fresh[membership_hash((a,))] = None if lab is None else (cluster_label([lab]), {a: lab})
+    for cid, h in enumerate(hashes):
+        item = cached.get(h)
+        if item is not None:
+            labels[cid] = item[0]
+            direct.update(item[1])
+    for h in single_hashes:
+        item = cached.get(h)
+        if item is not None:
+            direct.update(item[1])
+    if cache is not None and fresh:
+        cache.put_many(fresh)
+    return ClusterEnrichment(clusters=clusters, labels=labels, direct=direct)
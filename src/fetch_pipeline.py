@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from .dataset import write_json_file
+from .dataset_bin import DatasetWriter, is_binary_path
+from .metrics import Metrics
+from .providers.blockstream import BlockstreamProvider, Tx
+from .providers.jsondecode import decoder_name
+
+
+# Pipelined address fetch. A producer thread pages through the address history
+# (HTTP, JSON decoding, response cache) and hands pages over a bounded queue;
+# the calling thread normalizes each page and appends it to the output file
+# while the next pages are already being requested. At most `prefetch` pages
+# wait in the queue, so memory stays at a few pages whatever the history size.
+# prefetch=0 runs the same stages one after another in the calling thread.
+# History pages form a chain (each request names the last txid of the page
+# before), so requests themselves cannot overlap: what prefetching hides is
+# the normalization and writing time behind the network wait.
+#
+# Stage times: fetch (producer busy), normalize, write, and wait (the writer
+# idle on an empty queue: the network is the bottleneck when it dominates).
+
+_DONE = object()
+
+
+@dataclass
+class FetchStats:
+    pages: int = 0
+    txs: int = 0
+    fetch_seconds: float = 0.0
+    normalize_seconds: float = 0.0
+    write_seconds: float = 0.0
+    wait_seconds: float = 0.0
+    total_seconds: float = 0.0
+    decoder: str = ""
+
+    def summary(self) -> str:
+        def rate(sec: float) -> str:
+            return f"{self.txs / sec:.0f} tx/s" if sec > 0 else "-"
+
+        return (f"Pipeline ({self.decoder}): pages={self.pages} txs={self.txs} in {self.total_seconds:.2f}s; "
+                f"fetch {self.fetch_seconds:.2f}s ({rate(self.fetch_seconds)}), "
+                f"normalize {self.normalize_seconds:.2f}s ({rate(self.normalize_seconds)}), "
+                f"write {self.write_seconds:.2f}s ({rate(self.write_seconds)}), "
+                f"waiting on fetch {self.wait_seconds:.2f}s")
+
+    def record(self, metrics: Metrics) -> None:
+        for name, sec in (("fetch", self.fetch_seconds), ("normalize", self.normalize_seconds),
+                          ("write", self.write_seconds), ("fetch_wait", self.wait_seconds)):
+            metrics.stages[name] = {"seconds": sec}
+        metrics.count("pages", self.pages)
+        metrics.count("txs", self.txs)
+
+
+def prefetch_pages(
+    provider: BlockstreamProvider, address: str, limit: int, depth: int, stats: FetchStats,
+) -> Iterator[List[Dict[str, Any]]]:
+    # Pages of the address history, requested up to `depth` pages ahead of the consumer.
+    pages = provider.iter_address_pages(address, limit)
+    if depth <= 0:
+        while True:
+            t = time.perf_counter()
+            page = next(pages, None)
+            stats.fetch_seconds += time.perf_counter() - t
+            if page is None:
+                return
+            yield page
+
+    q: "queue.Queue[Any]" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce() -> None:
+        try:
+            while not stop.is_set():
+                t = time.perf_counter()
+                page = next(pages, None)
+                stats.fetch_seconds += time.perf_counter() - t
+                if page is None:
+                    break
+                q.put(page)
+        except BaseException as e:  # re-raised in the consumer
+            q.put(e)
+            return
+        q.put(_DONE)
+
+    worker = threading.Thread(target=produce, name="fetch-prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            t = time.perf_counter()
+            item = q.get()
+            stats.wait_seconds += time.perf_counter() - t
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # consumer stopped early (error, close): unblock and retire the producer
+        stop.set()
+        while worker.is_alive():
+            try:
+                q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        worker.join()
+
+
+def fetch_to_file(
+    provider: BlockstreamProvider, address: str, out: Path, limit: int = 250, prefetch: int = 2,
+) -> FetchStats:
+    # Writes the address history to `out` (*.bftx: binary, else JSON) as it
+    # arrives, under a temporary name renamed into place when complete.
+    if provider.offline:
+        prefetch = 0  # pages come from the local cache: no network wait to overlap
+    stats = FetchStats(decoder=decoder_name())
+    t0 = time.perf_counter()
+
+    def txs() -> Iterator[Tx]:
+        normalize = provider.normalize_tx
+        for page in prefetch_pages(provider, address, limit, prefetch, stats):
+            t = time.perf_counter()
+            batch = [normalize(raw) for raw in page]
+            stats.normalize_seconds += time.perf_counter() - t
+            stats.pages += 1
+            stats.txs += len(batch)
+            yield from batch
+
+    if is_binary_path(out):
+        with DatasetWriter(out, address) as w:
+            for tx in txs():
+                w.append_tx(tx)
+    else:
+        write_json_file(out, address, txs())
+    stats.total_seconds = time.perf_counter() - t0
+    # whatever the consumer did besides waiting and normalizing was writing
+    stats.write_seconds = max(stats.total_seconds - stats.wait_seconds - stats.normalize_seconds
+                              - (stats.fetch_seconds if prefetch <= 0 else 0.0), 0.0)
+    return stats
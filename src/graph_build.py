@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List
-import networkx as nx
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Set
 
-from .providers.blockstream import Tx
+from .txtable import AddressIndex, TxRow, TxSource, TxTable, iter_rows, sat_to_btc
+
+if TYPE_CHECKING:
+    import networkx as nx
 
 
 @dataclass
@@ -13,41 +15,101 @@ class GraphArtifacts:
     bipartite_graph: nx.Graph
 
 
-def build_graphs(txs: List[Tx]) -> GraphArtifacts:
+def build_graphs(txs: TxSource) -> GraphArtifacts:
     # 1) address_graph: directed weighted graph address -> address by value
     # 2) bipartite_graph: undirected graph with nodes ('a', addr) and ('t', txid)
+    import networkx as nx  # slow import, only needed here
+
     g_addr = nx.DiGraph()
     g_bi = nx.Graph()
 
-    for tx in txs:
-        tx_node = ("t", tx.txid)
-        g_bi.add_node(tx_node, kind="tx", time=tx.time)
+    for row in iter_rows(txs):
+        tx_node = ("t", row.txid)
+        g_bi.add_node(tx_node, kind="tx", time=row.time)
 
-        vin_addrs = [(io.addr, io.value_btc) for io in tx.vin if io.addr != "UNKNOWN"]
-        vout_addrs = [(io.addr, io.value_btc) for io in tx.vout if io.addr != "UNKNOWN"]
-
-        for a, v in vin_addrs:
+        for a, v in row.ins:
             an = ("a", a)
             g_bi.add_node(an, kind="addr")
-            g_bi.add_edge(an, tx_node, role="vin", value=v)
+            g_bi.add_edge(an, tx_node, role="vin", value=sat_to_btc(v))
 
-        for a, v in vout_addrs:
+        for a, v in row.outs:
             an = ("a", a)
             g_bi.add_node(an, kind="addr")
-            g_bi.add_edge(tx_node, an, role="vout", value=v)
+            g_bi.add_edge(tx_node, an, role="vout", value=sat_to_btc(v))
 
-        in_sum = sum(v for _, v in vin_addrs) or 0.0
+        in_sum = sum(v for _, v in row.ins)
         if in_sum <= 0:
             continue
 
-        for in_addr, in_val in vin_addrs:
-            for out_addr, out_val in vout_addrs:
-                w = (in_val / in_sum) * out_val
+        for in_addr, in_val in row.ins:
+            for out_addr, out_val in row.outs:
+                w = (in_val / in_sum) * sat_to_btc(out_val)
                 if g_addr.has_edge(in_addr, out_addr):
                     g_addr[in_addr][out_addr]["value"] += w
                     g_addr[in_addr][out_addr]["tx_count"] += 1
                 else:
-                    g_addr.add_edge(in_addr, out_addr, value=w, tx_count=1, last_time=tx.time)
-                g_addr[in_addr][out_addr]["last_time"] = max(g_addr[in_addr][out_addr]["last_time"], tx.time)
+                    g_addr.add_edge(in_addr, out_addr, value=w, tx_count=1, last_time=row.time)
+                g_addr[in_addr][out_addr]["last_time"] = max(g_addr[in_addr][out_addr]["last_time"], row.time)
 
     return GraphArtifacts(address_graph=g_addr, bipartite_graph=g_bi)
+
+
+def graph_stats(graphs: GraphArtifacts) -> Dict[str, int]:
+    return {
+        "address_graph_nodes": graphs.address_graph.number_of_nodes(),
+        "address_graph_edges": graphs.address_graph.number_of_edges(),
+        "bipartite_nodes": graphs.bipartite_graph.number_of_nodes(),
+        "bipartite_edges": graphs.bipartite_graph.number_of_edges(),
+    }
+
+
+class GraphStatsAggregator:
+    # Node/edge counts of the graphs build_graphs would produce, without building
+    # them. Keeps only the address set and the (in, out) address-pair set, packed
+    # as ints over interned ids. Assumes txids are unique within the stream.
+
+    def __init__(self) -> None:
+        self.addrs = AddressIndex()
+        self.addr_nodes: Set[int] = set()
+        self.edges: Set[int] = set()
+        self.tx_nodes = 0
+        self.bi_edges = 0
+
+    def add_row(self, row: TxRow) -> None:
+        self._add([a for a, _ in row.ins], [v for _, v in row.ins], [a for a, _ in row.outs])
+
+    def add_table(self, table: TxTable, lo: int = 0, hi: Optional[int] = None) -> "GraphStatsAggregator":
+        # add_row over txs lo:hi of a table, read from its columns
+        add, inputs, outputs = self._add, table.inputs, table.outputs
+        for i in range(lo, len(table) if hi is None else hi):
+            add(*inputs(i), outputs(i)[0])
+        return self
+
+    def _add(self, in_addrs: List[str], in_sat: Sequence[int], out_addrs: List[str]) -> None:
+        intern = self.addrs.intern
+        ins = [intern(a) for a in in_addrs]
+        outs = [intern(a) for a in out_addrs]
+        self.tx_nodes += 1
+        self.bi_edges += len(set(ins) | set(outs))
+        if sum(in_sat) <= 0:
+            return
+        for a in ins:
+            for b in outs:
+                self.edges.add(a << 32 | b)
+                self.addr_nodes.add(a)
+                self.addr_nodes.add(b)
+
+    def add_txs(self, txs: TxSource) -> "GraphStatsAggregator":
+        if isinstance(txs, TxTable):
+            return self.add_table(txs)
+        for row in iter_rows(txs):
+            self.add_row(row)
+        return self
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "address_graph_nodes": len(self.addr_nodes),
+            "address_graph_edges": len(self.edges),
+            "bipartite_nodes": len(self.addrs) + self.tx_nodes,
+            "bipartite_edges": self.bi_edges,
+        }
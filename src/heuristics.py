@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .txtable import TxRow
+
+
+# Change-detection heuristics, evaluated together in one pass per tx. Every
+# heuristic sees the same prepared view of the row (input address set, output
+# addresses and values), so enabling more of them adds a few integer/set
+# operations per output instead of another pass over the data.
+#
+#   unique_new_output  exactly one output address is not among the inputs
+#                      (the original detect_change_address rule)
+#   round_value        all outputs but one carry round amounts (multiples of
+#                      ROUND_SAT); the odd one out is the change
+#   script_type        all inputs share one script type and exactly one output
+#                      has it
+#   fresh_address      exactly one output address appears for the first time
+#                      in this tx, all other outputs were seen before
+#
+# A tx gets a change link when every heuristic that fires names the same
+# output; disagreeing heuristics cancel the link (counted as a conflict).
+# Txs with a repeated output address are skipped by all of them.
+
+ROUND_SAT = 100_000  # 0.001 BTC
+
+
+class RowView:
+    __slots__ = ("in_addrs", "outs", "values", "new_outs")
+
+    def __init__(self, ins: List[str], outs: List[str], values: Sequence[int]):
+        self.in_addrs = in_addrs = set(ins)
+        self.outs = outs  # output addresses
+        self.values = values  # output satoshis
+        self.new_outs = [a for a in outs if a not in in_addrs]  # outputs that are not inputs
+
+
+Heuristic = Callable[[RowView, "HeuristicPipeline"], Optional[str]]
+
+
+def unique_new_output(view: RowView, pipe: "HeuristicPipeline") -> Optional[str]:
+    return view.new_outs[0] if len(view.new_outs) == 1 else None
+
+
+def round_value(view: RowView, pipe: "HeuristicPipeline") -> Optional[str]:
+    if len(view.outs) < 2:
+        return None
+    odd = [a for a, v in zip(view.outs, view.values) if v % ROUND_SAT]
+    if len(odd) != 1 or odd[0] in view.in_addrs:
+        return None
+    return odd[0]
+
+
+def script_type(addr: str) -> Optional[str]:
+    # Output script type from the address encoding (mainnet and testnet).
+    c = addr[:1]
+    if c in ("1", "m", "n"):
+        return "p2pkh"
+    if c in ("3", "2"):
+        return "p2sh"
+    prefix = addr[:4].lower()
+    if prefix in ("bc1q", "tb1q"):
+        return "p2wpkh" if len(addr) == 42 else "p2wsh" if len(addr) == 62 else None
+    if prefix in ("bc1p", "tb1p"):
+        return "p2tr"
+    return None
+
+
+def script_type_match(view: RowView, pipe: "HeuristicPipeline") -> Optional[str]:
+    if len(view.outs) < 2 or not view.in_addrs:
+        return None
+    types = pipe.script_types
+    in_types = {types(a) for a in view.in_addrs}
+    if len(in_types) != 1 or None in in_types:
+        return None
+    t = in_types.pop()
+    match = [a for a in view.outs if types(a) == t]
+    if len(match) != 1 or match[0] in view.in_addrs:
+        return None
+    return match[0]
+
+
+def fresh_address(view: RowView, pipe: "HeuristicPipeline") -> Optional[str]:
+    if len(view.outs) < 2:
+        return None
+    seen = pipe.seen
+    fresh = [a for a in view.outs if a not in seen]
+    if len(fresh) != 1 or fresh[0] in view.in_addrs:
+        return None
+    return fresh[0]
+
+
+HEURISTICS: Dict[str, Heuristic] = {
+    "unique_new_output": unique_new_output,
+    "round_value": round_value,
+    "script_type": script_type_match,
+    "fresh_address": fresh_address,
+}
+DEFAULT_HEURISTICS: Tuple[str, ...] = ("unique_new_output",)
+
+
+def parse_heuristics(spec: str) -> Tuple[str, ...]:
+    names = tuple(dict.fromkeys(s.strip() for s in spec.split(",") if s.strip()))
+    unknown = [n for n in names if n not in HEURISTICS]
+    if unknown:
+        raise ValueError(f"unknown change heuristics: {', '.join(unknown)} (known: {', '.join(HEURISTICS)})")
+    return names
+
+
+class HeuristicPipeline:
+    # Per-row links for clustering: inputs to union (multi-input / co-spend)
+    # and one (first input, change output) link. Counts hits per heuristic;
+    # with timing=True also the seconds spent in each (two clock reads per
+    # heuristic and row, so it is off unless metrics are collected).
+    # fresh_address needs the addresses of all earlier txs: the pipeline keeps
+    # them in `seen`, and callers starting mid-stream pre-fill it (seed()).
+
+    def __init__(self, names: Sequence[str] = DEFAULT_HEURISTICS, min_inputs: int = 2, timing: bool = False):
+        self.names = tuple(names)
+        self.fns = [(n, HEURISTICS[n]) for n in self.names]
+        self.min_inputs = min_inputs
+        self.timing = timing
+        self.hits: Counter = Counter()
+        self.seconds: Counter = Counter()
+        self.track_seen = "fresh_address" in self.names
+        self.seen: Set[str] = set()
+        self._types: Dict[str, Optional[str]] = {}
+
+    def script_types(self, addr: str) -> Optional[str]:
+        # memoized per address: hub addresses show up in many txs
+        t = self._types.get(addr, "")
+        if t == "":
+            t = self._types[addr] = script_type(addr)
+        return t
+
+    def seed(self, addrs: Iterable[str]) -> None:
+        if self.track_seen:
+            self.seen.update(addrs)
+
+    def links(self, row: TxRow) -> Tuple[Optional[List[str]], Optional[Tuple[str, str]]]:
+        return self.links_of([a for a, _ in row.ins], [a for a, _ in row.outs], [v for _, v in row.outs])
+
+    def links_of(
+        self, ins: List[str], outs: List[str], values: Sequence[int],
+    ) -> Tuple[Optional[List[str]], Optional[Tuple[str, str]]]:
+        # links() over a tx given as columns: known input and output addresses
+        # and the output satoshis (TxTable.inputs/outputs)
+        multi = None
+        if len(ins) >= self.min_inputs:
+            multi = ins
+            self.hits["multi_input"] += 1
+        change = self.change(ins, outs, values) if ins else None
+        if self.track_seen:
+            self.seen.update(ins)
+            self.seen.update(outs)
+        return multi, ((ins[0], change) if change else None)
+
+    def change(self, ins: List[str], outs: List[str], values: Sequence[int]) -> Optional[str]:
+        if len(set(outs)) != len(outs):  # repeated outputs -> skip
+            return None
+        view = RowView(ins, outs, values)
+        hits = self.hits
+        found: Optional[str] = None
+        conflict = False
+        timing = self.timing
+        for name, fn in self.fns:
+            if timing:
+                t = time.perf_counter()
+                ch = fn(view, self)
+                self.seconds[name] += time.perf_counter() - t
+            else:
+                ch = fn(view, self)
+            if ch is None:
+                continue
+            hits[name] += 1
+            if found is None:
+                found = ch
+            elif ch != found:
+                conflict = True
+        if conflict:
+            hits["conflicts"] += 1
+            return None
+        return found
+
+    def merge(self, hits: Dict[str, int], seconds: Dict[str, float]) -> None:
+        self.hits.update(hits)
+        self.seconds.update(seconds)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        # {"hits": {...}, "seconds": {...}}; seconds only with timing
+        out: Dict[str, Dict[str, float]] = {"hits": {n: self.hits[n] for n in ("multi_input", *self.names, "conflicts")}}
+        if self.timing:
+            out["seconds"] = {n: round(self.seconds[n], 6) for n in self.names}
+        return out
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import os
+import re
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, Optional
+
+from .dataset_bin import temp_path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+
+class Metrics:
+    # Stage timers and counters for one command run.
+    #   stage(name)  wall time of a block; with memory=True also the peak
+    #                tracemalloc size reached inside it (tracing slows Python
+    #                code down noticeably, so it is opt-in)
+    #   count(name)  integer counters (txs, IOs, unions, HTTP requests, ...)
+    # Stages may nest; a stage still running when to_json() is called is
+    # reported with its time so far. Each stage resets the tracemalloc peak,
+    # so the peak the enclosing stage (or the run, _peaks[0]) had reached is
+    # kept in _peaks and combined with the one read when it ends.
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Counter = Counter()
+        self._running: Dict[str, float] = {}
+        self._peaks: List[int] = [0]
+        self._t0 = time.perf_counter()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.memory:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            self._peaks.append(0)
+            tracemalloc.reset_peak()
+        t = self._running[name] = time.perf_counter()
+        try:
+            yield
+        finally:
+            del self._running[name]
+            st = self.stages.setdefault(name, {"seconds": 0.0})
+            st["seconds"] += time.perf_counter() - t
+            if self.memory:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                self._peaks[-1] = max(self._peaks[-1], peak)
+                st["peak_traced_bytes"] = max(st.get("peak_traced_bytes", 0), peak)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def add_parts(self, parent: str, seconds: Dict[str, float]) -> None:
+        # Time of the parts of stage `parent` whose work is interleaved row by
+        # row (so they cannot be stages of their own), as "<parent>_<part>".
+        for part, sec in seconds.items():
+            self.stages.setdefault(f"{parent}_{part}", {"seconds": 0.0})["seconds"] += sec
+
+    def record_analysis(self, txs: int, ios: int, clusters: Any, addresses: int, graph_stats: Dict[str, int]) -> None:
+        # txs/ios: transactions and known-address inputs + outputs processed
+        self.count("txs", txs)
+        self.count("ios", ios)
+        self.count("addresses", addresses)
+        self.count("clusters", len(clusters.clusters))
+        if clusters.uf is not None:
+            self.count("union_operations", clusters.uf.unions)
+        self.count("address_graph_edges", graph_stats["address_graph_edges"])
+        self.count("bipartite_edges", graph_stats["bipartite_edges"])
+        # per-heuristic hits, and time spent in each change heuristic (part of
+        # the stage that fed the rows to the clusterer)
+        h = clusters.heuristics or {}
+        for name, n in h.get("hits", {}).items():
+            self.count(f"heuristic_{name}", n)
+        for name, sec in h.get("seconds", {}).items():
+            self.stages[f"heuristic_{name}"] = {"seconds": sec}
+
+    def add_provider(self, provider: Any) -> None:
+        # HTTP counters of a BlockstreamProvider (and its response cache)
+        self.count("http_requests", provider.requests)
+        self.count("http_retries", provider.retries)
+        self.count("http_throttled", provider.throttled)
+        self.count("http_failures", provider.failures)
+        if provider.cache is not None:
+            self.count("cache_hits", provider.cache.hits)
+            self.count("cache_misses", provider.cache.misses)
+
+    def to_json(self) -> Dict[str, Any]:
+        now = time.perf_counter()
+        stages = {k: {kk: round(v, 6) if isinstance(v, float) else v for kk, v in st.items()}
+                  for k, st in self.stages.items()}
+        for name, t in self._running.items():
+            stages.setdefault(name, {"seconds": 0.0})["seconds"] = round(now - t, 6)
+        out: Dict[str, Any] = {
+            "total_seconds": round(now - self._t0, 6),
+            "stages": stages,
+            "counters": dict(self.counters),
+        }
+        rss = max_rss_bytes()
+        if rss is not None:
+            out["max_rss_bytes"] = rss
+        if self.memory:
+            out["peak_traced_bytes"] = max(self._peaks + [tracemalloc.get_traced_memory()[1]])
+        return out
+
+    def write_prometheus(self, path: Path, command: str, prefix: str = "bf_") -> None:
+        # Text exposition format for node_exporter's textfile collector,
+        # written to a temp file and renamed so the collector never reads a
+        # partial file.
+        m = self.to_json()
+        lab = f'command="{command}"'
+        lines = []
+        if m["stages"]:
+            lines += [
+                f"# HELP {prefix}stage_seconds Wall time of an analysis stage.",
+                f"# TYPE {prefix}stage_seconds gauge",
+            ]
+        lines += [f'{prefix}stage_seconds{{{lab},stage="{k}"}} {st["seconds"]}' for k, st in m["stages"].items()]
+        if self.memory and m["stages"]:
+            lines += [
+                f"# HELP {prefix}stage_peak_traced_bytes Peak tracemalloc size inside a stage.",
+                f"# TYPE {prefix}stage_peak_traced_bytes gauge",
+            ]
+            lines += [f'{prefix}stage_peak_traced_bytes{{{lab},stage="{k}"}} {st["peak_traced_bytes"]}'
+                      for k, st in m["stages"].items() if "peak_traced_bytes" in st]
+        for k, v in sorted(m["counters"].items()):
+            name = prefix + re.sub(r"[^a-zA-Z0-9_]", "_", k)
+            lines += [f"# TYPE {name} gauge", f"{name}{{{lab}}} {v}"]
+        for k in ("total_seconds", "max_rss_bytes"):
+            if k in m:
+                lines += [f"# TYPE {prefix}{k} gauge", f"{prefix}{k}{{{lab}}} {m[k]}"]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = temp_path(path)
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def max_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if os.uname().sysname == "Darwin" else rss * 1024  # kB on Linux
+
+
+def stage(metrics: Optional[Metrics], name: str) -> ContextManager[None]:
+    # metrics.stage(name), or a no-op when metrics are off.
+    return metrics.stage(name) if metrics is not None else nullcontext()
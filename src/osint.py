@@ -1,9 +1,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, Optional, Set
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
+import csv
+import hashlib
 import json
+import sqlite3
+import uuid
 
 
 @dataclass
@@ -25,6 +29,18 @@ class OsintLabelStore:
     def add(self, address: str, kind: str, name: str, source: str) -> None:
         self.labels[address] = Label(kind=kind, name=name, source=source)
 
+    def lookup_many(self, addresses: Iterable[str]) -> Dict[str, Label]:
+        labels = self.labels
+        return {a: labels[a] for a in addresses if a in labels}
+
+    def fingerprint(self) -> str:
+        # Changes whenever the label contents change.
+        h = hashlib.sha1()
+        for a in sorted(self.labels):
+            lab = self.labels[a]
+            h.update(f"{a}\t{lab.kind}\t{lab.name}\t{lab.source}\n".encode("utf-8"))
+        return "json:" + h.hexdigest()
+
     def load_json(self, path: Path) -> None:
         obj = json.loads(path.read_text(encoding="utf-8"))
         for addr, it in obj.items():
@@ -37,10 +53,184 @@ class OsintLabelStore:
         )
 
 
-def enrich_addresses(addresses: Set[str], store: OsintLabelStore) -> Dict[str, dict]:
+# --- bulk label files ----------------------------------------------------------
+# CSV:   header with address,kind,name[,source]
+# JSONL: one {"address", "kind", "name"[, "source"]} object per line
+# JSON:  {address: {"kind", "name"[, "source"]}} (the OsintLabelStore format)
+# A missing source defaults to the file path.
+
+def iter_label_file(path: Path) -> Iterator[Tuple[str, str, str, str]]:
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        with path.open(newline="", encoding="utf-8") as f:
+            for r in csv.DictReader(f):
+                yield r["address"], r["kind"], r["name"], r.get("source") or str(path)
+    elif suffix in (".jsonl", ".ndjson"):
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    it = json.loads(line)
+                    yield it["address"], it["kind"], it["name"], it.get("source", str(path))
+    else:
+        obj = json.loads(path.read_text(encoding="utf-8"))
+        for addr, it in obj.items():
+            yield addr, it["kind"], it["name"], it.get("source", str(path))
+
+
+class SqliteLabelStore:
+    # On-disk label store for dumps too large for OsintLabelStore's dict.
+    # Addresses are the primary key of a WITHOUT ROWID table (a sorted B-tree,
+    # so prefix scans are range scans); kind/name/source are interned into a
+    # strings table and stored as integer ids. Only the looked-up labels and the
+    # interned strings they reference are held in memory.
+
+    _BATCH = 500  # addresses per IN (...) query, below SQLite's variable limit
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS strings (id INTEGER PRIMARY KEY, s TEXT NOT NULL UNIQUE)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS labels ("
+            " address TEXT PRIMARY KEY, kind INTEGER NOT NULL, name INTEGER NOT NULL, source INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+        self._strings: Dict[int, str] = {}
+        self._ids: Dict[str, int] = {}
+        # Label objects are shared between addresses with the same (kind, name, source)
+        self._labels: Dict[Tuple[int, int, int], Label] = {}
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "SqliteLabelStore":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+
+    def _intern(self, s: str) -> int:
+        i = self._ids.get(s)
+        if i is None:
+            self._db.execute("INSERT OR IGNORE INTO strings (s) VALUES (?)", (s,))
+            i = self._db.execute("SELECT id FROM strings WHERE s = ?", (s,)).fetchone()[0]
+            self._ids[s] = i
+            self._strings[i] = s
+        return i
+
+    def _string(self, i: int) -> str:
+        s = self._strings.get(i)
+        if s is None:
+            s = self._strings[i] = self._db.execute("SELECT s FROM strings WHERE id = ?", (i,)).fetchone()[0]
+        return s
+
+    def _label(self, k: int, n: int, s: int) -> Label:
+        lab = self._labels.get((k, n, s))
+        if lab is None:
+            lab = self._labels[(k, n, s)] = Label(kind=self._string(k), name=self._string(n), source=self._string(s))
+        return lab
+
+    def add(self, address: str, kind: str, name: str, source: str) -> None:
+        self.add_many([(address, kind, name, source)])
+
+    def add_many(self, rows: Iterable[Tuple[str, str, str, str]]) -> int:
+        # One transaction for the whole import; later rows replace earlier ones
+        # for the same address, as in OsintLabelStore.add.
+        intern = self._intern
+        n = 0
+
+        def encoded():
+            nonlocal n
+            for addr, kind, name, source in rows:
+                n += 1
+                yield addr, intern(kind), intern(name), intern(source)
+
+        self._db.execute("BEGIN")
+        try:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO labels (address, kind, name, source) VALUES (?, ?, ?, ?)", encoded()
+            )
+            self._db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('version', ?)", (uuid.uuid4().hex,))
+            self._db.execute("COMMIT")
+        except BaseException:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            # strings interned by the rolled-back inserts are gone, and SQLite
+            # hands their ids to the next new strings: drop the cached ids
+            self._ids.clear()
+            self._strings.clear()
+            self._labels.clear()
+            raise
+        return n
+
+    def import_file(self, path: Path) -> int:
+        return self.add_many(iter_label_file(path))
+
+    def get(self, address: str) -> Optional[Label]:
+        row = self._db.execute("SELECT kind, name, source FROM labels WHERE address = ?", (address,)).fetchone()
+        return None if row is None else self._label(*row)
+
+    def lookup_many(self, addresses: Iterable[str]) -> Dict[str, Label]:
+        # Batched IN (...) lookups on the primary key; unlabeled addresses are absent.
+        out: Dict[str, Label] = {}
+        batch: List[str] = []
+        for a in addresses:
+            batch.append(a)
+            if len(batch) == self._BATCH:
+                self._lookup_batch(batch, out)
+                batch = []
+        if batch:
+            self._lookup_batch(batch, out)
+        return out
+
+    def _lookup_batch(self, batch: List[str], out: Dict[str, Label]) -> None:
+        q = "SELECT address, kind, name, source FROM labels WHERE address IN (%s)" % ",".join("?" * len(batch))
+        for addr, k, n, s in self._db.execute(q, batch):
+            out[addr] = self._label(k, n, s)
+
+    def with_prefix(self, prefix: str, limit: int = 100) -> Dict[str, Label]:
+        rows = self._db.execute(
+            "SELECT address, kind, name, source FROM labels WHERE address >= ? AND address < ? ORDER BY address LIMIT ?",
+            (prefix, prefix + "\U0010ffff", limit),
+        )
+        return {addr: self._label(k, n, s) for addr, k, n, s in rows}
+
+    def fingerprint(self) -> str:
+        # A new version token is written by every import.
+        row = self._db.execute("SELECT v FROM meta WHERE k = 'version'").fetchone()
+        return f"sqlite:{self.path.resolve()}:{row[0] if row else ''}"
+
+    def counts(self) -> Dict[str, int]:
+        # labels per kind
+        rows = self._db.execute(
+            "SELECT s.s, COUNT(*) FROM labels l JOIN strings s ON s.id = l.kind GROUP BY l.kind ORDER BY 2 DESC"
+        )
+        return dict(rows.fetchall())
+
+
+def is_label_db(path: Path) -> bool:
+    return path.suffix.lower() in (".sqlite", ".db")
+
+
+def open_label_store(path: Path):
+    # *.sqlite / *.db -> SqliteLabelStore, anything else is loaded into an OsintLabelStore.
+    if is_label_db(path):
+        return SqliteLabelStore(path)
+    store = OsintLabelStore()
+    for addr, kind, name, source in iter_label_file(path):
+        store.add(addr, kind, name, source)
+    return store
+
+
+def enrich_addresses(addresses: Iterable[str], store) -> Dict[str, dict]:
+    # store: OsintLabelStore or SqliteLabelStore
     out: Dict[str, dict] = {}
-    for a in addresses:
-        lab = store.get(a)
-        if lab:
-            out[a] = {"kind": lab.kind, "name": lab.name, "source": lab.source}
+    for a, lab in store.lookup_many(addresses).items():
+        out[a] = {"kind": lab.kind, "name": lab.name, "source": lab.source}
     return out
@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .clustering import Clusterer, ClusteringResult
+from .edgelist import _col, build_edge_list
+from .heuristics import DEFAULT_HEURISTICS, HeuristicPipeline
+from .profiling import AddressProfile, ProfileAggregator, address_profile
+from .txtable import TxTable
+
+
+# Multiprocess analysis. Shard w of n:
+#   profiles   partial aggregates of every address over the w-th contiguous tx
+#              range, as flat arrays over address ids (ProfilePart). The parent
+#              merges them with NumPy: sums and first/last per address, and per
+#              (address, counterparty) and (address, hour) pair the summed count
+#              and the first position in range order, which is where one pass
+#              would have inserted the key. Top counterparties (ties in
+#              insertion order) and hour buckets come out as in one pass. Fee
+#              shares are float, so the parent adds them itself one by one in
+#              tx order (fee_sums). With --counterparties approx the SpaceSaving
+#              sketches do not merge exactly: each worker reads all rows and
+#              aggregates the addresses with id % n == w instead.
+#   clustering HeuristicPipeline links of txs in the w-th contiguous tx range;
+#              the parent replays them in tx order, reproducing the union-find
+#              exactly (fresh_address gets the addresses of earlier ranges)
+#   graph      address-pair keys and address ids of the same tx range; counts
+#              come from the union of the shards' key sets
+# The table reaches workers through the pool initializer: inherited for free
+# with fork, pickled once per worker with spawn.
+# Each part is timed in the workers (seconds summed over the shards, so CPU
+# time rather than wall time) and again while the parent merges it
+# (ParallelAnalysis.seconds: "profiling", "merge_profiling", ...).
+
+
+@dataclass
+class ProfilePart:
+    # ProfileAggregator state over one tx range, by address id. Pairs are in
+    # insertion order (per address, addresses in first-appearance order).
+    addr: np.ndarray                  # address ids
+    tx_count: np.ndarray
+    in_sat: np.ndarray
+    out_sat: np.ndarray
+    first: np.ndarray
+    last: np.ndarray
+    cp: np.ndarray                    # (address, counterparty, count) rows
+    hours: np.ndarray                 # (address, epoch hour, txs) rows
+
+
+def profile_part(table: TxTable, lo: int, hi: int) -> ProfilePart:
+    agg = ProfileAggregator().add_table(table, lo, hi)
+    ids = table.addrs.ids
+    addrs = list(agg.tx_count)
+
+    def pairs(counters: Dict[str, Counter], key) -> np.ndarray:
+        flat = [x for a in addrs for k, c in counters[a].items() for x in (ids[a], key(k), c)]
+        return np.array(flat, dtype=np.int64).reshape(-1, 3)
+
+    def col(values) -> np.ndarray:
+        return np.fromiter(values, dtype=np.int64, count=len(addrs))
+
+    return ProfilePart(
+        addr=col(ids[a] for a in addrs),
+        tx_count=col(agg.tx_count[a] for a in addrs),
+        in_sat=col(agg.in_sum[a] for a in addrs),
+        out_sat=col(agg.out_sum[a] for a in addrs),
+        first=col(agg.first[a] for a in addrs),
+        last=col(agg.last[a] for a in addrs),
+        cp=pairs(agg.cp, ids.__getitem__),
+        hours=pairs(agg.hours, int),
+    )
+
+
+@dataclass
+class ShardResult:
+    part: Optional[ProfilePart]       # exact counterparties: this tx range's aggregates
+    profiles: List[tuple]             # approx: AddressProfile fields of the owned addresses
+                                      # (tuples pickle much faster)
+    multi: List[List[str]]            # inputs of multi-input txs, in tx order
+    links: List[Tuple[str, str]]      # (spender, change) links, in tx order
+    edge_keys: np.ndarray             # src << 32 | dst over global address ids
+    addr_ids: np.ndarray              # known address ids seen in the tx range
+    bipartite_edges: int
+    heuristic_hits: Dict[str, int]
+    heuristic_seconds: Dict[str, float]
+    seconds: Dict[str, float]         # profiling / clustering / graph
+
+
+_TABLE: Optional[TxTable] = None
+
+
+def _init_worker(table: TxTable) -> None:
+    global _TABLE
+    _TABLE = table
+
+
+def tx_ranges(n_tx: int, n: int) -> List[Tuple[int, int]]:
+    step = -(-n_tx // n) if n_tx else 0
+    return [(min(i * step, n_tx), min((i + 1) * step, n_tx)) for i in range(n)]
+
+
+def analyze_shard(
+    table: TxTable, w: int, n: int, topk: Optional[int] = None, min_inputs: int = 2,
+    heuristics: Sequence[str] = DEFAULT_HEURISTICS, timing: bool = False,
+) -> ShardResult:
+    lo, hi = tx_ranges(len(table), n)[w]
+    t0 = time.perf_counter()
+    part, profiles = None, []
+    if topk is None:
+        part = profile_part(table, lo, hi)
+    else:
+        prof = ProfileAggregator(owned=set(table.addrs.names[w::n]), topk=topk).add_txs(table)
+        profiles = [tuple(vars(p).values()) for _, p in prof.items()]
+
+    t1 = time.perf_counter()
+    pipe = HeuristicPipeline(heuristics, min_inputs, timing)
+    if pipe.track_seen and lo:
+        before = np.concatenate((_col(table.vin_addr)[: _col(table.vin_off)[lo]],
+                                 _col(table.vout_addr)[: _col(table.vout_off)[lo]]))
+        names = table.addrs.names
+        pipe.seed(names[i] for i in np.unique(before[before >= 0]).tolist())
+    multi: List[List[str]] = []
+    links: List[Tuple[str, str]] = []
+    for i in range(lo, hi):
+        outs, values = table.outputs(i)
+        m, change = pipe.links_of(table.inputs(i)[0], outs, values)
+        if m:
+            multi.append(m)
+        if change:
+            links.append(change)
+
+    t2 = time.perf_counter()
+    g = build_edge_list(table, tx_range=(lo, hi))
+    ids = []
+    for off, addr in ((table.vin_off, table.vin_addr), (table.vout_off, table.vout_addr)):
+        col = _col(addr)[_col(off)[lo]: _col(off)[hi]]
+        ids.append(col[col >= 0])
+    addr_ids = np.unique(np.concatenate(ids))
+    t3 = time.perf_counter()
+    return ShardResult(
+        part=part,
+        profiles=profiles,
+        multi=multi,
+        links=links,
+        edge_keys=g.address.src.astype(np.int64) << 32 | g.address.dst.astype(np.int64),
+        addr_ids=addr_ids,
+        bipartite_edges=g.bipartite_edges,
+        heuristic_hits=dict(pipe.hits),
+        heuristic_seconds=dict(pipe.seconds),
+        seconds={"profiling": t1 - t0, "clustering": t2 - t1, "graph": t3 - t2},
+    )
+
+
+def _run_shard(task: Tuple[int, int, Optional[int], int, Sequence[str], bool]) -> ShardResult:
+    assert _TABLE is not None
+    return analyze_shard(_TABLE, *task)
+
+
+def profile_order(table: TxTable) -> List[str]:
+    # Addresses in first-appearance order over (known inputs, then known outputs)
+    # of each tx -- the order ProfileAggregator reports them in.
+    vin_off, vout_off = _col(table.vin_off), _col(table.vout_off)
+    vin_addr, vout_addr = _col(table.vin_addr), _col(table.vout_addr)
+    n_tx = len(table)
+    vin_tx = np.repeat(np.arange(n_tx), np.diff(vin_off))
+    vout_tx = np.repeat(np.arange(n_tx), np.diff(vout_off))
+    seq = np.empty(len(vin_addr) + len(vout_addr), dtype=np.int64)
+    seq[np.arange(len(vin_addr)) + vout_off[vin_tx]] = vin_addr
+    seq[np.arange(len(vout_addr)) + vin_off[vout_tx + 1]] = vout_addr
+    seq = seq[seq >= 0]
+    uniq, first = np.unique(seq, return_index=True)
+    names = table.addrs.names
+    return [names[i] for i in uniq[np.argsort(first)].tolist()]
+
+
+def fee_sums(table: TxTable) -> np.ndarray:
+    # Per address id: the fee shares (fee / known inputs) of its inputs, added
+    # one by one in tx and input order like ProfileAggregator does, so the float
+    # sums are bit-identical.
+    vin_off, vin_addr = _col(table.vin_off), _col(table.vin_addr)
+    vin_tx = np.repeat(np.arange(len(table)), np.diff(vin_off))
+    known = vin_addr >= 0
+    n_known = np.bincount(vin_tx[known], minlength=len(table))
+    share = _col(table.fee) / np.maximum(n_known, 1)
+    out = np.zeros(len(table.addrs.names))
+    np.add.at(out, vin_addr[known], share[vin_tx[known]])
+    return out
+
+
+def _merge_pairs(
+    rows: np.ndarray, top: Optional[int], names: Optional[np.ndarray] = None,
+) -> Dict[int, List[Tuple[Any, int]]]:
+    # (address, key, count) rows of all shards in range order -> per address
+    # the summed (key, count) pairs in first-insertion order, or with `top` the
+    # `top` largest counts, ties in first-insertion order (Counter.most_common).
+    # names: keys are address ids, reported as names[key].
+    owner, key = rows[:, 0], rows[:, 1]
+    uniq, first, inv = np.unique(owner << 32 | key, return_index=True, return_inverse=True)
+    counts = np.zeros(len(uniq), dtype=np.int64)
+    np.add.at(counts, inv.ravel(), rows[:, 2])
+    owners, keys = uniq >> 32, uniq & 0xFFFFFFFF
+    order = np.lexsort((first, owners) if top is None else (first, -counts, owners))
+    owners, keys, counts = owners[order], keys[order], counts[order]
+    if top is not None:
+        start = np.searchsorted(owners, owners, side="left")
+        keep = np.arange(len(owners)) - start < top
+        owners, keys, counts = owners[keep], keys[keep], counts[keep]
+    bounds = (np.flatnonzero(np.diff(owners)) + 1).tolist()
+    pairs = list(zip((keys if names is None else names[keys]).tolist(), counts.tolist()))
+    owners = owners.tolist()
+    return {owners[lo]: pairs[lo:hi] for lo, hi in zip([0] + bounds, bounds + [len(pairs)]) if lo < hi}
+
+
+def merge_profiles(table: TxTable, parts: List[ProfilePart]) -> Dict[str, AddressProfile]:
+    n = len(table.addrs)
+    tx_count, in_sat, out_sat = (np.zeros(n, dtype=np.int64) for _ in range(3))
+    first = np.full(n, np.iinfo(np.int64).max)
+    last = np.full(n, np.iinfo(np.int64).min)
+    for p in parts:
+        np.add.at(tx_count, p.addr, p.tx_count)
+        np.add.at(in_sat, p.addr, p.in_sat)
+        np.add.at(out_sat, p.addr, p.out_sat)
+        np.minimum.at(first, p.addr, p.first)
+        np.maximum.at(last, p.addr, p.last)
+    fees = fee_sums(table)
+    names, ids = table.addrs.names, table.addrs.ids
+    cp = _merge_pairs(np.concatenate([p.cp for p in parts]), 10, np.array(names, dtype=object))
+    hours = _merge_pairs(np.concatenate([p.hours for p in parts]), None)
+
+    tx_count, in_sat, out_sat = tx_count.tolist(), in_sat.tolist(), out_sat.tolist()
+    first, last, fees = first.tolist(), last.tolist(), fees.tolist()
+    labels: Dict[int, str] = {}
+    profiles: Dict[str, AddressProfile] = {}
+    for a in profile_order(table):
+        i = ids[a]
+        profiles[a] = address_profile(
+            a, tx_count[i], in_sat[i], out_sat[i], fees[i], first[i], last[i],
+            cp.get(i, []), hours[i], labels,
+        )
+    return profiles
+
+
+@dataclass
+class ParallelAnalysis:
+    clusters: ClusteringResult
+    profiles: Dict[str, AddressProfile]
+    graph_stats: Dict[str, int]
+    seconds: Dict[str, float]
+
+
+def merge_shards(
+    table: TxTable, shards: List[ShardResult], heuristics: Sequence[str] = DEFAULT_HEURISTICS, timing: bool = False,
+    change_links: str = "attach", topk: Optional[int] = None,
+) -> ParallelAnalysis:
+    seconds: Counter = Counter()
+    for sh in shards:
+        seconds.update(sh.seconds)
+    t0 = time.perf_counter()
+    clusterer = Clusterer(heuristics=heuristics, timing=timing, change_links=change_links)
+    for sh in shards:
+        clusterer.add_links(sh.multi, sh.links)
+        clusterer.pipeline.merge(sh.heuristic_hits, sh.heuristic_seconds)
+    clusters = clusterer.result()
+
+    t1 = time.perf_counter()
+    if topk is None:
+        profiles = merge_profiles(table, [sh.part for sh in shards])
+    else:
+        merged: Dict[str, AddressProfile] = {}
+        for sh in shards:
+            for fields in sh.profiles:
+                merged[fields[0]] = AddressProfile(*fields)
+        profiles = {a: merged[a] for a in profile_order(table)}
+
+    t2 = time.perf_counter()
+    keys = np.unique(np.concatenate([sh.edge_keys for sh in shards]))
+    nodes = np.union1d(keys >> 32, keys & 0xFFFFFFFF)
+    addr_ids = np.unique(np.concatenate([sh.addr_ids for sh in shards]))
+    stats = {
+        "address_graph_nodes": int(len(nodes)),
+        "address_graph_edges": int(len(keys)),
+        "bipartite_nodes": len(table) + int(len(addr_ids)),
+        "bipartite_edges": sum(sh.bipartite_edges for sh in shards),
+    }
+    t3 = time.perf_counter()
+    seconds.update(merge_clustering=t1 - t0, merge_profiling=t2 - t1, merge_graph=t3 - t2)
+    return ParallelAnalysis(clusters=clusters, profiles=profiles, graph_stats=stats, seconds=dict(seconds))
+
+
+def analyze_parallel(
+    table: TxTable, workers: int, topk: Optional[int] = None,
+    heuristics: Sequence[str] = DEFAULT_HEURISTICS, timing: bool = False, change_links: str = "attach",
+) -> ParallelAnalysis:
+    # Same clusters, profiles and graph stats as the single-process pipeline.
+    workers = max(workers, 1)
+    methods = mp.get_all_start_methods()
+    ctx = mp.get_context("fork" if "fork" in methods else None)
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(table,)) as pool:
+        tasks = [(w, workers, topk, 2, tuple(heuristics), timing) for w in range(workers)]
+        shards = pool.map(_run_shard, tasks, chunksize=1)
+    return merge_shards(table, shards, heuristics, timing, change_links, topk)
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, List, Set, Tuple, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Mapping, NamedTuple, Sequence, Set, Tuple, Optional
 from collections import Counter, defaultdict
 from datetime import datetime, timezone
+from functools import partial
 
 from .providers.blockstream import Tx
+from .topk import counterparty_counter
+from .txtable import TxRow, TxSource, TxTable, iter_rows, row_of, sat_to_btc
 
 
 @dataclass
@@ -20,95 +23,268 @@ class AddressProfile:
     top_counterparties: List[Tuple[str, int]]
     hourly_activity: Dict[str, int]
     flags: List[str]
+    # approx counterparties only: per top_counterparties entry, how much its
+    # count may overestimate (count - error <= true count <= count)
+    counterparty_errors: Optional[List[int]] = None
+
+
+HOUR = 3600
+
+
+class AddressState(NamedTuple):
+    tx_count: int
+    in_sat: int
+    out_sat: int
+    fees: float                              # satoshis, float (fee shares)
+    first: Optional[int]
+    last: Optional[int]
+    counterparties: List[Tuple[str, int]]    # in insertion order
+    errors: Dict[str, int]                   # SpaceSaving overestimates
+    hours: List[Tuple[int, int]]             # epoch hour start -> txs
 
 
 def _hour_bucket(ts: int) -> str:
-    dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+    dt = datetime.fromtimestamp(ts - ts % HOUR, tz=timezone.utc)
     return dt.strftime("%Y-%m-%d %H:00Z")
 
 
-def build_address_profiles(txs: List[Tx]) -> Dict[str, AddressProfile]:
-    involved = defaultdict(list)  # addr -> txids
-    in_sum = Counter()
-    out_sum = Counter()
-    fees = Counter()
-    first: Dict[str, int] = {}
-    last: Dict[str, int] = {}
-    cp = defaultdict(Counter)
+def address_profile(
+    a: str, n: int, in_sat: int, out_sat: int, fees: float, first: Optional[int], last: Optional[int],
+    top: List[Tuple[str, int]], hours: Iterable[Tuple[int, int]], labels: Optional[Dict[int, str]] = None,
+    errors: Optional[Dict[str, int]] = None,
+) -> AddressProfile:
+    # labels: epoch hour -> formatted bucket, shared between calls
+    # errors: SpaceSaving overestimates of an approx counter (None: exact)
+    flags: List[str] = []
+    if n >= 50:
+        flags.append("high_tx_count")
+    total_in, total_out = sat_to_btc(in_sat), sat_to_btc(out_sat)
+    if total_in > 10 and total_out > 10:
+        flags.append("high_volume")
+    if first and last and (last - first) < 24 * 3600 and n >= 10:
+        flags.append("burst_activity")
+
+    if labels is None:
+        labels = {}
+    hourly: Dict[str, int] = {}
+    for h, c in hours:
+        key = labels.get(h)
+        if key is None:
+            key = labels[h] = _hour_bucket(h)
+        hourly[key] = c
+
+    return AddressProfile(
+        address=a,
+        tx_count_involving=n,
+        first_seen=first,
+        last_seen=last,
+        total_in_btc=total_in,
+        total_out_btc=total_out,
+        fees_paid_btc=sat_to_btc(fees),
+        top_counterparties=top,
+        hourly_activity=hourly,
+        flags=flags,
+        counterparty_errors=None if errors is None else [errors.get(b, 0) for b, _ in top],
+    )
+
+
+def counterparty_note(topk: int) -> str:
+    # For the report notes of an --counterparties approx run.
+    return (f"Counterparties: approx (SpaceSaving, {topk} per address); top_counterparties counts "
+            f"may overestimate by counterparty_errors")
+
+
+class ProfileAggregator:
+    # Single-pass profile engine: every per-address aggregate is updated while the
+    # transaction is at hand, so the cost is O(total IOs + counterparty pairs).
+    # Hour buckets are kept as integer epoch-hour starts and only formatted once
+    # per distinct bucket when profiles are materialised. Value sums are kept in
+    # integer satoshis so they do not drift.
 
-    for tx in txs:
-        ins = [(io.addr, io.value_btc) for io in tx.vin if io.addr != "UNKNOWN"]
-        outs = [(io.addr, io.value_btc) for io in tx.vout if io.addr != "UNKNOWN"]
-        addrs = {a for a, _ in ins} | {a for a, _ in outs}
+    def __init__(self, owned: Optional[Set[str]] = None, topk: Optional[int] = None) -> None:
+        # owned: aggregate only these addresses (counterparties still come from
+        # the whole tx). Each address sees exactly the updates it would see
+        # without the filter, so profiling can be split across processes by address.
+        # topk: keep counterparties in a SpaceSaving sketch of this many slots per
+        # address instead of an exact Counter (None = exact).
+        self.owned = owned
+        self.topk = topk
+        self.tx_count: Counter = Counter()
+        self.in_sum: Counter = Counter()
+        self.out_sum: Counter = Counter()
+        self.fees: Counter = Counter()
+        self.first: Dict[str, int] = {}
+        self.last: Dict[str, int] = {}
+        self.cp: Dict[str, Counter] = defaultdict(partial(counterparty_counter, topk))
+        self.hours: Dict[str, Counter] = defaultdict(Counter)
+
+    def add_row(self, row: TxRow) -> None:
+        self._add(row.time, row.fee_sat, [a for a, _ in row.ins], [v for _, v in row.ins],
+                  [a for a, _ in row.outs], [v for _, v in row.outs])
+
+    def add_table(self, table: TxTable, lo: int = 0, hi: Optional[int] = None) -> "ProfileAggregator":
+        # add_row over txs lo:hi of a table, read from its columns
+        add, inputs, outputs, time, fee = self._add, table.inputs, table.outputs, table.time, table.fee
+        for i in range(lo, len(table) if hi is None else hi):
+            add(time[i], fee[i], *inputs(i), *outputs(i))
+        return self
+
+    def _add(
+        self, t: int, fee_sat: int, ins: List[str], in_sat: Sequence[int], outs: List[str], out_sat: Sequence[int],
+    ) -> None:
+        # one tx: known input and output addresses with their satoshis
+        hour = t - t % HOUR
+
+        addrs = dict.fromkeys(ins + outs)
+        own_ins: Iterable[Tuple[str, int]] = zip(ins, in_sat)
+        own_outs: Iterable[Tuple[str, int]] = zip(outs, out_sat)
+        if self.owned is not None:
+            owned = self.owned
+            addrs = [a for a in addrs if a in owned]
+            own_ins = [x for x in own_ins if x[0] in owned]
+            own_outs = [x for x in own_outs if x[0] in owned]
 
         for a in addrs:
-            involved[a].append(tx.txid)
-            first[a] = min(first.get(a, tx.time), tx.time) if a in first else tx.time
-            last[a] = max(last.get(a, tx.time), tx.time) if a in last else tx.time
-
-        for a, v in ins:
-            out_sum[a] += v
-            fees[a] += tx.fee_btc / max(len(ins), 1)
-            for b, _ in outs:
+            self.tx_count[a] += 1
+            if a in self.first:
+                if t < self.first[a]:
+                    self.first[a] = t
+                if t > self.last[a]:
+                    self.last[a] = t
+            else:
+                self.first[a] = t
+                self.last[a] = t
+            self.hours[a][hour] += 1
+
+        fee_share = fee_sat / max(len(ins), 1)
+        for a, v in own_ins:
+            self.out_sum[a] += v
+            self.fees[a] += fee_share
+            cpa = self.cp[a]
+            for b in outs:
                 if b != a:
-                    cp[a][b] += 1
+                    cpa[b] += 1
 
-        for a, v in outs:
-            in_sum[a] += v
-            for b, _ in ins:
+        for a, v in own_outs:
+            self.in_sum[a] += v
+            cpa = self.cp[a]
+            for b in ins:
                 if b != a:
-                    cp[a][b] += 1
-
-    profiles: Dict[str, AddressProfile] = {}
-    for a, txids in involved.items():
-        flags: List[str] = []
-        if len(txids) >= 50:
-            flags.append("high_tx_count")
-        if float(in_sum[a]) > 10 and float(out_sum[a]) > 10:
-            flags.append("high_volume")
-        if first.get(a) and last.get(a) and (last[a] - first[a]) < 24 * 3600 and len(txids) >= 10:
-            flags.append("burst_activity")
-
-        buckets = Counter()
-        for tx in txs:
-            if any(io.addr == a for io in tx.vin) or any(io.addr == a for io in tx.vout):
-                buckets[_hour_bucket(tx.time)] += 1
-
-        profiles[a] = AddressProfile(
-            address=a,
-            tx_count_involving=len(txids),
-            first_seen=first.get(a),
-            last_seen=last.get(a),
-            total_in_btc=float(in_sum[a]),
-            total_out_btc=float(out_sum[a]),
-            fees_paid_btc=float(fees[a]),
-            top_counterparties=cp[a].most_common(10),
-            hourly_activity=dict(buckets),
-            flags=flags,
+                    cpa[b] += 1
+
+    def add_tx(self, tx: Tx) -> None:
+        self.add_row(row_of(tx))
+
+    def add_txs(self, txs: TxSource) -> "ProfileAggregator":
+        if isinstance(txs, TxTable):
+            return self.add_table(txs)
+        for row in iter_rows(txs):
+            self.add_row(row)
+        return self
+
+    def profile(self, a: str, labels: Optional[Dict[int, str]] = None) -> AddressProfile:
+        cp = self.cp[a]
+        return address_profile(
+            a, self.tx_count[a], self.in_sum[a], self.out_sum[a], self.fees[a], self.first.get(a),
+            self.last.get(a), cp.most_common(10), self.hours[a].items(), labels,
+            None if self.topk is None else cp.errors,
         )
 
-    return profiles
+    # Per-address state, so aggregation can be suspended and resumed (see
+    # workspace.py). restore() followed by the same add_row calls gives exactly
+    # the profile an uninterrupted run would, counterparty tie order included.
+
+    def state(self, a: str) -> AddressState:
+        cp = self.cp[a]
+        return AddressState(
+            self.tx_count[a], self.in_sum[a], self.out_sum[a], self.fees[a], self.first.get(a),
+            self.last.get(a), list(cp.items()), dict(getattr(cp, "errors", {})), list(self.hours[a].items()),
+        )
 
+    def restore(self, a: str, st: AddressState) -> None:
+        self.tx_count[a] = st.tx_count
+        self.in_sum[a] = st.in_sat
+        self.out_sum[a] = st.out_sat
+        self.fees[a] = st.fees
+        if st.first is not None:
+            self.first[a] = st.first
+            self.last[a] = st.last
+        self.cp[a] = counterparty_counter(self.topk, st.counterparties, st.errors)
+        self.hours[a] = Counter(dict(st.hours))
 
-def summarize_cluster(cluster: Set[str], profiles: Dict[str, AddressProfile]) -> Dict[str, object]:
-    tx_count = sum(profiles[a].tx_count_involving for a in cluster if a in profiles)
-    total_in = sum(profiles[a].total_in_btc for a in cluster if a in profiles)
-    total_out = sum(profiles[a].total_out_btc for a in cluster if a in profiles)
-    flags = sorted({f for a in cluster for f in (profiles[a].flags if a in profiles else [])})
+    def profiles(self) -> Dict[str, AddressProfile]:
+        return dict(self.items())
 
-    top_cp = Counter()
+    # Read-only mapping interface: profiles are materialised on access, so the
+    # aggregator can be handed to summarize_cluster or a report writer directly.
+
+    def __contains__(self, a: object) -> bool:
+        return a in self.tx_count
+
+    def __getitem__(self, a: str) -> AddressProfile:
+        if a not in self.tx_count:
+            raise KeyError(a)
+        return self.profile(a)
+
+    def __len__(self) -> int:
+        return len(self.tx_count)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.tx_count)
+
+    def get(self, a: str, default: Optional[AddressProfile] = None) -> Optional[AddressProfile]:
+        return self.profile(a) if a in self.tx_count else default
+
+    def items(self) -> Iterator[Tuple[str, AddressProfile]]:
+        labels: Dict[int, str] = {}
+        for a in self.tx_count:
+            yield a, self.profile(a, labels)
+
+
+def build_address_profiles(txs: TxSource, topk: Optional[int] = None) -> Dict[str, AddressProfile]:
+    return ProfileAggregator(topk=topk).add_txs(txs).profiles()
+
+
+@dataclass
+class ClusterAggregate:
+    # Cluster totals as summarize_cluster reports them: sums over the members
+    # in the order they are added (BTC as float, as the profiles hold it), the
+    # union of their flags and the sum of their top counterparty lists in
+    # first-seen order, which is the order Counter.most_common breaks ties in.
+    size: int = 0
+    tx_count: int = 0
+    in_btc: float = 0.0
+    out_btc: float = 0.0
+    flags: Set[str] = field(default_factory=set)
+    counterparties: Counter = field(default_factory=Counter)
+
+    def add(self, prof: AddressProfile) -> None:
+        self.tx_count += prof.tx_count_involving
+        self.in_btc += prof.total_in_btc
+        self.out_btc += prof.total_out_btc
+        self.flags.update(prof.flags)
+        for b, c in prof.top_counterparties:
+            self.counterparties[b] += c
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "size": self.size,
+            "tx_count_involving": int(self.tx_count),
+            "total_in_btc": float(self.in_btc),
+            "total_out_btc": float(self.out_btc),
+            "flags": sorted(self.flags),
+            "top_counterparties": self.counterparties.most_common(10),
+        }
+
+
+def cluster_aggregate(cluster: Set[str], profiles: Mapping[str, AddressProfile]) -> ClusterAggregate:
+    agg = ClusterAggregate(size=len(cluster))
     for a in cluster:
         prof = profiles.get(a)
-        if not prof:
-            continue
-        for b, c in prof.top_counterparties:
-            top_cp[b] += c
-
-    return {
-        "size": len(cluster),
-        "tx_count_involving": int(tx_count),
-        "total_in_btc": float(total_in),
-        "total_out_btc": float(total_out),
-        "flags": flags,
-        "top_counterparties": top_cp.most_common(10),
-    }
+        if prof:
+            agg.add(prof)
+    return agg
+
+
+def summarize_cluster(cluster: Set[str], profiles: Mapping[str, AddressProfile]) -> Dict[str, object]:
+    return cluster_aggregate(cluster, profiles).summary()
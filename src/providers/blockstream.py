@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import threading
 import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Iterable
-import requests
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Iterable, Iterator, Tuple
+from urllib.parse import urlencode
+
+from .cache import CacheMiss, ResponseCache
+from .jsondecode import loads
 
 
 @dataclass(frozen=True)
@@ -21,46 +25,162 @@ class Tx:
     fee_btc: float
 
 
+PAGE_SIZE = 25  # confirmed txs per Esplora history page
+
+
+class RateLimiter:
+    # Token bucket shared by every thread using a provider.
+    # rate <= 0 disables the bucket; backoff() still applies. A 429 seen by any
+    # worker calls backoff(), which blocks all workers until the pause ends.
+
+    def __init__(self, rate: float = 0.0, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def backoff(self, seconds: float) -> None:
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+if TYPE_CHECKING:
+    import requests
+
+
+def make_session(pool_size: int = 10) -> requests.Session:
+    # Keep-alive connection pool sized for the number of concurrent workers.
+    # requests is imported here: Tx/TxIO from this module are used everywhere,
+    # and most commands never open a connection.
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def _retry_after(r: requests.Response) -> Optional[float]:
+    try:
+        return float(r.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
 class BlockstreamProvider:
     # Data provider based on Blockstream's public Esplora API (https://blockstream.info/api).
-    # The API is rate-limited; a simple exponential backoff is implemented.
+    # The API is rate-limited; a simple exponential backoff is implemented. The
+    # provider is safe to share between threads: requests go through one pooled
+    # session and one RateLimiter, so 429 backoff applies to all workers.
+    # With a ResponseCache, responses are served from disk when fresh; offline=True
+    # serves only from the cache (expired entries included) and raises CacheMiss.
 
-    def __init__(self, base_url: str = "https://blockstream.info/api", session: Optional[requests.Session] = None):
+    def __init__(
+        self,
+        base_url: str = "https://blockstream.info/api",
+        session: Optional[requests.Session] = None,
+        limiter: Optional[RateLimiter] = None,
+        pool_size: int = 10,
+        cache: Optional[ResponseCache] = None,
+        offline: bool = False,
+    ):
         self.base_url = base_url.rstrip("/")
-        self.s = session or requests.Session()
+        self.s = session or make_session(pool_size)
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache
+        self.offline = offline
+        self.requests = 0  # HTTP requests actually sent (cache hits excluded)
+        self.retries = 0   # requests repeated after a 429 or an error
+        self.throttled = 0  # 429 responses
+        self.failures = 0  # _get calls that gave up
+        self._count_lock = threading.Lock()
+        if offline and cache is None:
+            raise ValueError("offline mode requires a response cache")
 
     def _get(self, path: str, params: Optional[Dict[str, Any]] = None, retries: int = 5) -> Any:
-        url = f"{self.base_url}/{path.lstrip('/')}"
+        path = path.lstrip("/")
+        key = f"{path}?{urlencode(sorted(params.items()))}" if params else path
+        if self.cache is not None:
+            data = self.cache.get(key, allow_stale=self.offline)
+            if data is not None:
+                return data
+            if self.offline:
+                raise CacheMiss(f"Not in cache (offline): {key}")
+        data = self._fetch(path, params, retries)
+        if self.cache is not None:
+            self.cache.put(key, data)
+        return data
+
+    def _fetch(self, path: str, params: Optional[Dict[str, Any]], retries: int) -> Any:
+        url = f"{self.base_url}/{path}"
         delay = 0.7
         last_err: Optional[Exception] = None
-        for _ in range(retries):
+        for attempt in range(retries):
+            self.limiter.acquire()
+            with self._count_lock:
+                self.requests += 1
+                self.retries += attempt > 0
             try:
                 r = self.s.get(url, params=params, timeout=30)
                 if r.status_code == 429:
-                    time.sleep(delay)
+                    with self._count_lock:
+                        self.throttled += 1
+                    self.limiter.backoff(_retry_after(r) or delay)
                     delay = min(delay * 1.8, 10)
                     continue
                 r.raise_for_status()
-                return r.json()
+                return loads(r.content)
             except Exception as e:
                 last_err = e
                 time.sleep(delay)
                 delay = min(delay * 1.8, 10)
+        with self._count_lock:
+            self.failures += 1
         raise RuntimeError(f"Blockstream request failed: {url}") from last_err
 
-    def iter_address_txs(self, address: str, limit: int = 250) -> Iterable[Dict[str, Any]]:
+    def get_tx(self, txid: str) -> Dict[str, Any]:
+        return self._get(f"tx/{txid}")
+
+    def iter_address_pages(self, address: str, limit: Optional[int] = 250) -> Iterator[List[Dict[str, Any]]]:
         # Pagination: /address/:address/txs and /address/:address/txs/chain/:last_seen_txid
+        # The last page is cut at `limit` txs (None: the whole history), and no page past it is requested.
         seen = 0
         batch = self._get(f"address/{address}/txs")
         while batch:
-            for tx in batch:
-                yield tx
-                seen += 1
-                if seen >= limit:
-                    return
+            if limit is not None and seen + len(batch) >= limit:
+                yield batch[:limit - seen]
+                return
+            yield batch
+            seen += len(batch)
             last = batch[-1]["txid"]
             batch = self._get(f"address/{address}/txs/chain/{last}")
 
+    def iter_address_txs(self, address: str, limit: Optional[int] = 250) -> Iterable[Dict[str, Any]]:
+        for batch in self.iter_address_pages(address, limit):
+            yield from batch
+
     @staticmethod
     def _sat_to_btc(sats: int) -> float:
         return sats / 100_000_000
@@ -88,3 +208,26 @@ class BlockstreamProvider:
         for raw in self.iter_address_txs(address, limit=limit):
             txs.append(self.normalize_tx(raw))
         return txs
+
+    def fetch_new_address_txs(
+        self, address: str, known: Dict[str, int], limit: Optional[int] = None,
+    ) -> Tuple[List[Tx], bool]:
+        # known: stored txid -> stored time. History is served newest first
+        # (mempool, then blocks by height), so everything after the first tx
+        # that is stored, confirmed and stored as confirmed is stored as well;
+        # paging stops there. A tx stored while unconfirmed carries the time it
+        # was fetched instead of its block time: it is refetched, still
+        # unconfirmed or not, and paging goes on (having confirmed after it was
+        # stored, its block is newer than every tx stored as confirmed).
+        # Returns the new and refreshed txs, and whether paging reached the
+        # stored history (or the end of the history) rather than `limit`.
+        txs: List[Tx] = []
+        n = 0
+        for raw in self.iter_address_txs(address, limit=limit):
+            n += 1
+            status = raw.get("status", {})
+            stored = known.get(raw["txid"])
+            if stored is not None and status.get("confirmed", True) and status.get("block_time") == stored:
+                return txs, True
+            txs.append(self.normalize_tx(raw))
+        return txs, limit is None or n < limit
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .jsondecode import loads
+
+
+class CacheMiss(RuntimeError):
+    pass
+
+
+_TX = re.compile(r"^tx/[0-9A-Za-z]+$")
+_ADDR_TIP = re.compile(r"^address/[^/]+/txs$")
+_ADDR_CHAIN = re.compile(r"^address/[^/]+/txs/chain/[^/]+$")
+
+
+def _confirmed(tx: Any) -> bool:
+    return isinstance(tx, dict) and bool((tx.get("status") or {}).get("confirmed"))
+
+
+class ResponseCache:
+    # Persistent Esplora response cache (SQLite, zlib-compressed JSON bodies),
+    # keyed by endpoint path.
+    #
+    # Expiry policy:
+    #   tx/:txid                      confirmed -> never expires, else short_ttl
+    #   address/:a/txs/chain/:txid    all txs confirmed -> never expires, else short_ttl
+    #   address/:a/txs (tip page)     short_ttl (new txs land on top)
+    #   anything else                 short_ttl
+    #
+    # Total stored body size is capped at max_bytes; least recently used entries
+    # are evicted first. Safe to share between threads.
+
+    def __init__(self, path: Path, max_bytes: int = 1 << 30, short_ttl: float = 60.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.short_ttl = short_ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL,"
+            " expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def ttl_for(self, key: str, data: Any) -> Optional[float]:
+        # None means the entry never expires.
+        if _TX.match(key):
+            return None if _confirmed(data) else self.short_ttl
+        if _ADDR_CHAIN.match(key) and isinstance(data, list) and all(_confirmed(t) for t in data):
+            return None
+        return self.short_ttl
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            body, expires_at = row
+            if expires_at is not None and expires_at < now and not allow_stale:
+                self.stale += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return loads(zlib.decompress(body))
+
+    def put(self, key: str, data: Any) -> None:
+        body = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+        ttl = self.ttl_for(key, data)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, body, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, body, len(body), None if ttl is None else now + ttl, now),
+            )
+            self._size += len(body) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+
+    def _evict(self, target: int) -> None:
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        drop = []
+        for key, size in rows:
+            if self._size <= target:
+                break
+            drop.append((key,))
+            self._size -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", drop)
+        self.evicted += len(drop)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evicted": self.evicted,
+            "entries": entries,
+            "bytes": self._size,
+        }
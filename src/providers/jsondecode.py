@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Optional, Union
+
+# JSON decoding of API responses and cached bodies: orjson when it is
+# installed (several times faster on Esplora history pages), the stdlib json
+# module otherwise. Resolved on first use, so importing the providers stays
+# cheap for commands that never decode a response.
+
+_loads: Optional[Callable[[Union[bytes, str]], Any]] = None
+_name = ""
+
+
+def _resolve() -> Callable[[Union[bytes, str]], Any]:
+    global _loads, _name
+    try:
+        import orjson
+
+        _loads, _name = orjson.loads, "orjson"
+    except ImportError:
+        _loads, _name = json.loads, "json"
+    return _loads
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return (_loads or _resolve())(data)
+
+
+def decoder_name() -> str:
+    if _loads is None:
+        _resolve()
+    return _name
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .providers.blockstream import BlockstreamProvider
+from .pubtoaddr import is_pubkey
+
+
+# Public keys revealed by spending inputs:
+#   P2WPKH / P2SH-P2WPKH  witness = [signature, pubkey]
+#   P2PKH                 scriptsig_asm = "<sig> <pubkey>"
+# Inputs without one (coinbase, taproot key path, bare multisig, ...) are skipped.
+
+def input_pubkey(vin: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    # (pubkey_hex, "witness" | "scriptsig") or None.
+    if vin.get("is_coinbase"):
+        return None
+    witness = vin.get("txinwitness") or []
+    # the public key is the last witness element
+    if witness and is_pubkey(witness[-1]):
+        return witness[-1].lower(), "witness"
+    for part in reversed((vin.get("scriptsig_asm") or "").split()):
+        if is_pubkey(part):
+            return part.lower(), "scriptsig"
+    return None
+
+
+def tx_pubkeys(tx: Dict[str, Any]) -> List[Tuple[int, str, str]]:
+    # (vin_index, pubkey_hex, source) for every input of a raw Esplora tx.
+    out = []
+    for i, vin in enumerate(tx.get("vin", [])):
+        found = input_pubkey(vin)
+        if found is not None:
+            out.append((i, found[0], found[1]))
+    return out
+
+
+@dataclass
+class PubkeyIndex:
+    # pubkey -> spending inputs (txid, vin), in the order they were seen.
+    inputs: Dict[str, List[Tuple[str, int]]] = field(default_factory=dict)
+    txs: int = 0
+    scanned: int = 0      # inputs looked at
+    failed: Dict[str, str] = field(default_factory=dict)
+
+    def add_tx(self, tx: Dict[str, Any]) -> None:
+        self.txs += 1
+        self.scanned += len(tx.get("vin", []))
+        for i, pk, _ in tx_pubkeys(tx):
+            self.inputs.setdefault(pk, []).append((tx["txid"], i))
+
+    def reused(self) -> Dict[str, List[Tuple[str, int]]]:
+        # Keys that sign in more than one transaction.
+        return {pk: refs for pk, refs in self.inputs.items() if len({t for t, _ in refs}) > 1}
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "txs": self.txs,
+            "inputs_scanned": self.scanned,
+            "pubkeys": {pk: [[t, i] for t, i in refs] for pk, refs in self.inputs.items()},
+            "failed": self.failed,
+        }
+
+    def save(self, path: Path) -> None:
+        path.write_text(json.dumps(self.to_json(), indent=2), encoding="utf-8")
+
+    @staticmethod
+    def load(path: Path) -> "PubkeyIndex":
+        obj = json.loads(path.read_text(encoding="utf-8"))
+        return PubkeyIndex(
+            inputs={pk: [(t, int(i)) for t, i in refs] for pk, refs in obj.get("pubkeys", {}).items()},
+            txs=int(obj.get("txs", 0)),
+            scanned=int(obj.get("inputs_scanned", 0)),
+            failed=dict(obj.get("failed", {})),
+        )
+
+
+class PubkeyExtractor:
+    # Fetches raw transactions concurrently on a thread pool sharing one provider
+    # (pooled session, shared RateLimiter, ResponseCache), then indexes the input
+    # pubkeys. Datasets keep only addresses and values, so the raw txs are always
+    # refetched; confirmed ones are served by the cache on later runs. Results
+    # are merged in input order (first occurrence of each txid), so the index
+    # does not depend on thread scheduling.
+
+    def __init__(self, provider: BlockstreamProvider, workers: int = 8):
+        self.provider = provider
+        self.workers = max(workers, 1)
+
+    def _fetch(self, txid: str):
+        try:
+            return self.provider.get_tx(txid)
+        except Exception as e:
+            return e
+
+    def extract(self, txids: Iterable[str]) -> PubkeyIndex:
+        idx = PubkeyIndex()
+        todo = list(dict.fromkeys(txids))
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for txid, got in zip(todo, pool.map(self._fetch, todo)):
+                if isinstance(got, Exception):
+                    idx.failed[txid] = str(got)
+                else:
+                    idx.add_tx(got)
+        return idx
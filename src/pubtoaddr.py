@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import hashlib
+import struct
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+import base58
+
+
+# In-process public key -> address derivation (same result as
+# CryptoDeepTools/03CheckBitcoinAddressBalance/pubtoaddr.py for P2PKH).
+#   P2PKH : Base58Check(0x00 || HASH160(pubkey))
+#   P2WPKH: bech32("bc", 0, HASH160(pubkey)), compressed keys only (BIP173)
+
+KINDS = ("p2pkh", "p2wpkh")
+
+
+def normalize_pubkey(pubkey_hex: str) -> str:
+    h = pubkey_hex.strip().lower().replace("0x", "")
+    ok = all(c in "0123456789abcdef" for c in h) and (
+        (len(h) == 66 and h[:2] in ("02", "03")) or (len(h) == 130 and h[:2] == "04")
+    )
+    if not ok:
+        raise ValueError(
+            "pubkey_hex must be a hex-encoded public key (uncompressed 130 hex or compressed 66 hex)"
+        )
+    return h
+
+
+def is_pubkey(pubkey_hex: str) -> bool:
+    try:
+        normalize_pubkey(pubkey_hex)
+    except ValueError:
+        return False
+    return True
+
+
+# --- RIPEMD-160 -------------------------------------------------------------
+# hashlib exposes ripemd160 only when the linked OpenSSL provides it (OpenSSL 3
+# builds often do not), so a pure-Python fallback is kept.
+
+_R_L = [
+    0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15,
+    7, 4, 13, 1, 10, 6, 15, 3, 12, 0, 9, 5, 2, 14, 11, 8,
+    3, 10, 14, 4, 9, 15, 8, 1, 2, 7, 0, 6, 13, 11, 5, 12,
+    1, 9, 11, 10, 0, 8, 12, 4, 13, 3, 7, 15, 14, 5, 6, 2,
+    4, 0, 5, 9, 7, 12, 2, 10, 14, 1, 3, 8, 11, 6, 15, 13,
+]
+_R_R = [
+    5, 14, 7, 0, 9, 2, 11, 4, 13, 6, 15, 8, 1, 10, 3, 12,
+    6, 11, 3, 7, 0, 13, 5, 10, 14, 15, 8, 12, 4, 9, 1, 2,
+    15, 5, 1, 3, 7, 14, 6, 9, 11, 8, 12, 2, 10, 0, 4, 13,
+    8, 6, 4, 1, 3, 11, 15, 0, 5, 12, 2, 13, 9, 7, 10, 14,
+    12, 15, 10, 4, 1, 5, 8, 7, 6, 2, 13, 14, 0, 3, 9, 11,
+]
+_S_L = [
+    11, 14, 15, 12, 5, 8, 7, 9, 11, 13, 14, 15, 6, 7, 9, 8,
+    7, 6, 8, 13, 11, 9, 7, 15, 7, 12, 15, 9, 11, 7, 13, 12,
+    11, 13, 6, 7, 14, 9, 13, 15, 14, 8, 13, 6, 5, 12, 7, 5,
+    11, 12, 14, 15, 14, 15, 9, 8, 9, 14, 5, 6, 8, 6, 5, 12,
+    9, 15, 5, 11, 6, 8, 13, 12, 5, 12, 13, 14, 11, 8, 5, 6,
+]
+_S_R = [
+    8, 9, 9, 11, 13, 15, 15, 5, 7, 7, 8, 11, 14, 14, 12, 6,
+    9, 13, 15, 7, 12, 8, 9, 11, 7, 7, 12, 7, 6, 15, 13, 11,
+    9, 7, 15, 11, 8, 6, 6, 14, 12, 13, 5, 14, 13, 13, 7, 5,
+    15, 5, 8, 11, 14, 14, 6, 14, 6, 9, 12, 9, 12, 5, 15, 8,
+    8, 5, 12, 9, 12, 5, 14, 6, 8, 13, 6, 5, 15, 13, 11, 11,
+]
+_K_L = [0x00000000, 0x5A827999, 0x6ED9EBA1, 0x8F1BBCDC, 0xA953FD4E]
+_K_R = [0x50A28BE6, 0x5C4DD124, 0x6D703EF3, 0x7A6D76E9, 0x00000000]
+_M32 = 0xFFFFFFFF
+
+
+def _rol(x: int, n: int) -> int:
+    return ((x << n) | (x >> (32 - n))) & _M32
+
+
+def _f(j: int, x: int, y: int, z: int) -> int:
+    if j < 16:
+        return x ^ y ^ z
+    if j < 32:
+        return (x & y) | (~x & z)
+    if j < 48:
+        return (x | ~y & _M32) ^ z
+    if j < 64:
+        return (x & z) | (y & ~z)
+    return x ^ (y | ~z & _M32)
+
+
+def _ripemd160_py(data: bytes) -> bytes:
+    h = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0]
+    msg = data + b"\x80" + b"\x00" * ((55 - len(data)) % 64) + struct.pack("<Q", len(data) * 8)
+    for off in range(0, len(msg), 64):
+        x = struct.unpack("<16I", msg[off: off + 64])
+        al, bl, cl, dl, el = h
+        ar, br, cr, dr, er = h
+        for j in range(80):
+            t = (_rol((al + _f(j, bl, cl, dl) + x[_R_L[j]] + _K_L[j >> 4]) & _M32, _S_L[j]) + el) & _M32
+            al, el, dl, cl, bl = el, dl, _rol(cl, 10), bl, t
+            t = (_rol((ar + _f(79 - j, br, cr, dr) + x[_R_R[j]] + _K_R[j >> 4]) & _M32, _S_R[j]) + er) & _M32
+            ar, er, dr, cr, br = er, dr, _rol(cr, 10), br, t
+        h = [
+            (h[1] + cl + dr) & _M32,
+            (h[2] + dl + er) & _M32,
+            (h[3] + el + ar) & _M32,
+            (h[4] + al + br) & _M32,
+            (h[0] + bl + cr) & _M32,
+        ]
+    return struct.pack("<5I", *h)
+
+
+def _ripemd160(data: bytes) -> bytes:
+    try:
+        return hashlib.new("ripemd160", data).digest()
+    except ValueError:
+        return _ripemd160_py(data)
+
+
+def hash160(data: bytes) -> bytes:
+    return _ripemd160(hashlib.sha256(data).digest())
+
+
+# --- bech32 (BIP173) ----------------------------------------------------------
+
+_BECH32 = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+
+
+def _polymod(values: Iterable[int]) -> int:
+    gen = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+    chk = 1
+    for v in values:
+        b = chk >> 25
+        chk = (chk & 0x1FFFFFF) << 5 ^ v
+        for i in range(5):
+            chk ^= gen[i] if (b >> i) & 1 else 0
+    return chk
+
+
+def _convertbits(data: bytes, frombits: int, tobits: int) -> List[int]:
+    acc = bits = 0
+    out: List[int] = []
+    maxv = (1 << tobits) - 1
+    for b in data:
+        acc = (acc << frombits) | b
+        bits += frombits
+        while bits >= tobits:
+            bits -= tobits
+            out.append((acc >> bits) & maxv)
+    if bits:
+        out.append((acc << (tobits - bits)) & maxv)
+    return out
+
+
+def bech32_segwit(hrp: str, version: int, program: bytes) -> str:
+    data = [version] + _convertbits(program, 8, 5)
+    expanded = [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+    pm = _polymod(expanded + data + [0] * 6) ^ 1
+    checksum = [(pm >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(_BECH32[d] for d in data + checksum)
+
+
+# --- public API ---------------------------------------------------------------
+
+@lru_cache(maxsize=1 << 16)
+def pubkey_to_address(pubkey_hex: str, kind: str = "p2pkh") -> str:
+    # Memoised: repeated keys (common across a cluster's inputs) cost one lookup.
+    key = bytes.fromhex(normalize_pubkey(pubkey_hex))
+    if kind == "p2pkh":
+        return base58.b58encode_check(b"\x00" + hash160(key)).decode("ascii")
+    if kind == "p2wpkh":
+        if len(key) != 33:
+            raise ValueError("P2WPKH requires a compressed public key")
+        return bech32_segwit("bc", 0, hash160(key))
+    raise ValueError(f"unknown address kind: {kind} (expected one of {KINDS})")
+
+
+def convert_many(pubkeys: Iterable[str], kind: str = "p2pkh") -> Dict[str, str]:
+    # key -> address; keys that fail validation are skipped (see normalize_pubkey).
+    out: Dict[str, str] = {}
+    for k in pubkeys:
+        k = k.strip()
+        if not k or k in out:
+            continue
+        try:
+            out[k] = pubkey_to_address(k, kind)
+        except ValueError:
+            continue
+    return out
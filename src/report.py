@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, TextIO, Tuple, Union
+
+from .clustering import ClusteringResult
+from .enrichment import ClusterEnrichment
+from .metrics import Metrics
+from .profiling import AddressProfile, summarize_cluster
+from .report_store import ReportWriter, is_report_store_path
+
+
+def profile_json(p: AddressProfile) -> Dict[str, Any]:
+    out = {
+        "tx_count_involving": p.tx_count_involving,
+        "first_seen": p.first_seen,
+        "last_seen": p.last_seen,
+        "total_in_btc": p.total_in_btc,
+        "total_out_btc": p.total_out_btc,
+        "fees_paid_btc": p.fees_paid_btc,
+        "top_counterparties": p.top_counterparties,
+    }
+    if p.counterparty_errors is not None:
+        out["counterparty_errors"] = p.counterparty_errors
+    out["flags"] = p.flags
+    return out
+
+
+def cluster_summaries(
+    clusters: ClusteringResult,
+    profiles: Mapping[str, AddressProfile],
+    max_clusters: int,
+    enrichment: Optional[ClusterEnrichment] = None,
+) -> List[Dict[str, Any]]:
+    out = []
+    for i, c in enumerate(clusters.clusters[:max_clusters]):
+        item: Dict[str, Any] = {"cluster_id": i, "addresses": sorted(c), "summary": summarize_cluster(c, profiles)}
+        if enrichment is not None:
+            cl = enrichment.labels.get(i)
+            item["labels"] = None if cl is None else cl.to_json()
+        out.append(item)
+    return out
+
+
+def _dumps(value: Any, depth: int) -> str:
+    return json.dumps(value, ensure_ascii=False, indent=2).replace("\n", "\n" + "  " * depth)
+
+
+def render_profile(p: AddressProfile) -> str:
+    # A profile's text in the report, for callers that keep it rendered.
+    return _dumps(profile_json(p), 2)
+
+
+def write_analysis(
+    f: TextIO,
+    root_address: str,
+    tx_count: int,
+    clusters: ClusteringResult,
+    profiles: Iterable[Tuple[str, Union[AddressProfile, str]]],
+    cluster_json: List[Dict[str, Any]],
+    graph_stats: Dict[str, int],
+    attribution: Optional[Dict[str, Any]] = None,
+    metrics: Optional[Metrics] = None,
+    address_attribution: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> None:
+    # Writes the analysis report progressively: address profiles are serialised
+    # one by one as the iterator yields them (either as AddressProfile or as
+    # render_profile text). The text is identical to
+    # json.dumps(report, ensure_ascii=False, indent=2).
+    f.write("{\n")
+    f.write(f'  "root_address": {_dumps(root_address, 1)},\n')
+    f.write(f'  "tx_count": {tx_count},\n')
+    f.write(f'  "notes": {_dumps(clusters.notes, 1)},\n')
+    f.write(f'  "clusters": {_dumps(cluster_json, 1)},\n')
+    if attribution is not None:
+        f.write(f'  "attribution": {_dumps(attribution, 1)},\n')
+    if address_attribution is not None:
+        f.write(f'  "address_attribution": {_dumps(address_attribution, 1)},\n')
+    f.write('  "address_profiles": {')
+    n = 0
+    for a, p in profiles:
+        body = p if isinstance(p, str) else render_profile(p)
+        f.write(("," if n else "") + f"\n    {_dumps(a, 2)}: {body}")
+        n += 1
+    f.write("\n  },\n" if n else "},\n")
+    f.write(f'  "graph_stats": {_dumps(graph_stats, 1)}')
+    if metrics is not None:
+        # taken last, so the stages around this call include the serialisation
+        f.write(f',\n  "metrics": {_dumps(metrics.to_json(), 1)}')
+    f.write("\n}")
+
+
+def write_report(
+    out: Path,
+    root_address: str,
+    tx_count: int,
+    clusters: ClusteringResult,
+    profiles: Iterable[Tuple[str, Union[AddressProfile, str]]],
+    cluster_json: List[Dict[str, Any]],
+    graph_stats: Dict[str, int],
+    attribution: Optional[Dict[str, Any]] = None,
+    metrics: Optional[Metrics] = None,
+    address_attribution: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> None:
+    # *.bfr -> sharded report (see report_store), anything else -> write_analysis JSON.
+    # address_attribution: ClusterEnrichment.address_attribution(); the .bfr
+    # report keeps each address's own label in its profile record.
+    if not is_report_store_path(out):
+        with out.open("w", encoding="utf-8") as f:
+            write_analysis(f, root_address, tx_count, clusters, profiles, cluster_json, graph_stats,
+                           attribution, metrics, address_attribution)
+        return
+    cluster_of = clusters.addr_to_cluster
+    attributed = address_attribution or {}
+    with ReportWriter(out) as w:
+        for a, p in profiles:
+            item = attributed.get(a)
+            w.add_profile(a, cluster_of.get(a), json.loads(p) if isinstance(p, str) else profile_json(p),
+                          None if item is None else item["label"])
+        meta: Dict[str, Any] = {
+            "root_address": root_address, "tx_count": tx_count, "notes": clusters.notes, "clusters": cluster_json,
+        }
+        if attribution is not None:
+            meta["attribution"] = attribution
+        meta["graph_stats"] = graph_stats
+        if metrics is not None:
+            meta["metrics"] = metrics.to_json()
+        w.close(meta, clusters.clusters)
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .dataset_bin import temp_path
+from .providers.jsondecode import loads
+
+
+# Sharded analysis report (.bfr): the content of analysis.json, with address
+# profiles and cluster memberships in zlib-compressed chunks so that one
+# address can be looked up without reading the rest.
+#
+#   file    := MAGIC chunk* offsets(profile chunks) offsets(cluster chunks)
+#              u64 key[n] u32 chunk[n] meta trailer
+#   chunk   := zlib(compact JSON list of records)
+#              profile record: [address, cluster_id | null, profile], plus the
+#              address's own label when the report has attribution
+#              cluster record: [cluster_id, [addresses, sorted]]
+#   offsets := u64 start of each chunk, then the end of the last one
+#   key     := first 8 bytes of blake2b(address), sorted, with the profile
+#              chunk holding that address alongside (the address -> chunk index)
+#   meta    := zlib(JSON): everything in analysis.json except the profiles
+#   trailer := u64 profile chunks, cluster chunks, index entries, meta offset,
+#              meta length, cluster chunk size, then END
+#
+# Profiles are written in report order as they are produced (the writer holds
+# one chunk plus 12 bytes per address), and cluster i is in cluster chunk
+# i // cluster chunk size. The reader maps the file and bisects the key column
+# in place, so a lookup reads a few index pages and inflates one chunk. All
+# integers are little-endian.
+
+MAGIC = b"BFREPORT\x00\x01\n"
+END = b"BFREND\x00\x01"
+REPORT_SUFFIX = ".bfr"
+FORMAT_VERSION = 2
+READ_VERSIONS = (1, 2)  # 1: no per-address labels
+
+_TRAILER = struct.Struct("<QQQQQQ8s")
+_SWAP = sys.byteorder != "little"
+
+
+def is_report_store_path(path: Path) -> bool:
+    return path.suffix == REPORT_SUFFIX
+
+
+def address_key(address: str) -> int:
+    return int.from_bytes(blake2b(address.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _pack(records: Sequence[Any]) -> bytes:
+    return zlib.compress(json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _col_bytes(col: array) -> bytes:
+    if _SWAP:
+        col = array(col.typecode, col)
+        col.byteswap()
+    return col.tobytes()
+
+
+class ReportWriter:
+    # Streaming writer, under a temporary name renamed into place by close().
+    #   w = ReportWriter(path); w.add_profile(a, cluster_id, profile_dict) ...
+    #   w.close(meta, clusters)
+
+    def __init__(self, path: Path, chunk_size: int = 256, cluster_chunk_size: int = 512):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.cluster_chunk_size = cluster_chunk_size
+        self._tmp = temp_path(path)
+        self._f = self._tmp.open("wb")
+        self._f.write(MAGIC)
+        self._buf: List[Any] = []
+        self._offsets = array("Q")
+        self._keys = array("Q")
+        self._chunks = array("I")
+        self.count = 0
+
+    def __enter__(self) -> "ReportWriter":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        # close() is called explicitly with the meta; leaving the block without it discards the file
+        if not self._f.closed:
+            self._f.close()
+            self._tmp.unlink(missing_ok=True)
+
+    def add_profile(
+        self, address: str, cluster_id: Optional[int], profile: Dict[str, Any], label: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self._keys.append(address_key(address))
+        self._chunks.append(len(self._offsets))
+        self._buf.append([address, cluster_id, profile] if label is None else [address, cluster_id, profile, label])
+        self.count += 1
+        if len(self._buf) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buf:
+            self._offsets.append(self._f.tell())
+            self._f.write(_pack(self._buf))
+            self._buf = []
+
+    def _write_offsets(self, offsets: array) -> None:
+        offsets.append(self._f.tell())
+        self._f.write(_col_bytes(offsets))
+
+    def close(self, meta: Dict[str, Any], clusters: Sequence[Set[str]]) -> None:
+        import numpy as np
+
+        self._flush()
+        p_offsets = self._offsets
+        c_offsets = array("Q")
+        step = self.cluster_chunk_size
+        for lo in range(0, len(clusters), step):
+            c_offsets.append(self._f.tell())
+            self._f.write(_pack([[i, sorted(clusters[i])] for i in range(lo, min(lo + step, len(clusters)))]))
+        n_p, n_c = len(p_offsets), len(c_offsets)
+        self._write_offsets(p_offsets)
+        self._write_offsets(c_offsets)
+
+        keys = np.frombuffer(self._keys, dtype=np.uint64)
+        order = np.argsort(keys, kind="stable")
+        index_pos = self._f.tell()
+        self._f.write(keys[order].astype("<u8").tobytes())
+        self._f.write(np.frombuffer(self._chunks, dtype=np.uint32)[order].astype("<u4").tobytes())
+
+        meta_pos = self._f.tell()
+        body = zlib.compress(json.dumps(dict(meta, version=FORMAT_VERSION, profiles=self.count),
+                                        ensure_ascii=False).encode("utf-8"))
+        self._f.write(body)
+        self._f.write(_TRAILER.pack(n_p, n_c, len(keys), meta_pos, len(body), step, END))
+        self._f.close()
+        os.replace(self._tmp, self.path)
+
+
+class ReportReader:
+    # Random access to a .bfr report.
+    #   meta                  report fields other than the profiles (root_address,
+    #                         tx_count, notes, clusters, graph_stats, ...)
+    #   profile(a)            the address's profile dict, or None
+    #   query(a)              profile plus its cluster (id, size, summary if the
+    #                         report lists it, labels, first members) and, in a
+    #                         report with attribution, the address's own label
+    #   cluster_members(i)    all addresses of cluster i
+    #   iter_profiles()       (address, profile) in report order
+    #   to_json()             the report as analysis.json would hold it
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._f = path.open("rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        if mm[: len(MAGIC)] != MAGIC or len(mm) < len(MAGIC) + _TRAILER.size:
+            self.close()
+            raise ValueError(f"{path} is not a {REPORT_SUFFIX} report")
+        n_p, n_c, n_idx, meta_pos, meta_len, self.cluster_chunk_size, end = _TRAILER.unpack_from(
+            mm, len(mm) - _TRAILER.size)
+        if end != END:
+            self.close()
+            raise ValueError(f"{path}: truncated {REPORT_SUFFIX} report")
+        self.meta: Dict[str, Any] = loads(zlib.decompress(mm[meta_pos: meta_pos + meta_len]))
+        if self.meta.get("version") not in READ_VERSIONS:
+            self.close()
+            raise ValueError(f"{path}: report format {self.meta.get('version')}, expected {FORMAT_VERSION}")
+        index_pos = meta_pos - n_idx * 12
+        c_pos = index_pos - (n_c + 1) * 8
+        p_pos = c_pos - (n_p + 1) * 8
+        self._p_offsets = self._view(p_pos, n_p + 1, "Q")
+        self._c_offsets = self._view(c_pos, n_c + 1, "Q")
+        self._keys = self._view(index_pos, n_idx, "Q")
+        self._key_chunks = self._view(index_pos + n_idx * 8, n_idx, "I")
+        self._summaries = {c["cluster_id"]: c for c in self.meta.get("clusters", [])}
+        attribution = self.meta.get("attribution")
+        # labels of every labeled cluster (listed or not), keyed by the id as a string
+        self._cluster_labels: Optional[Dict[str, Any]] = None if attribution is None else attribution.get("clusters")
+
+    def _view(self, pos: int, n: int, typecode: str) -> Sequence[int]:
+        # Columns are read in place (a memoryview over the mapping) on
+        # little-endian hosts, copied and swapped elsewhere.
+        size = array(typecode).itemsize
+        if _SWAP:
+            col = array(typecode, self._mm[pos: pos + n * size])
+            col.byteswap()
+            return col
+        return memoryview(self._mm)[pos: pos + n * size].cast(typecode)
+
+    def close(self) -> None:
+        for attr in ("_p_offsets", "_c_offsets", "_keys", "_key_chunks"):
+            v = self.__dict__.pop(attr, None)
+            if isinstance(v, memoryview):
+                v.release()
+        if not self._mm.closed:
+            self._mm.close()
+        self._f.close()
+
+    def __enter__(self) -> "ReportReader":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.meta["profiles"]
+
+    def _chunk(self, offsets: Sequence[int], i: int) -> List[Any]:
+        return loads(zlib.decompress(self._mm[offsets[i]: offsets[i + 1]]))
+
+    def _record(self, address: str) -> Optional[List[Any]]:
+        key = address_key(address)
+        keys = self._keys
+        i = bisect_left(keys, key)
+        seen = set()
+        while i < len(keys) and keys[i] == key:  # more than one on a hash collision
+            c = self._key_chunks[i]
+            if c not in seen:
+                seen.add(c)
+                for rec in self._chunk(self._p_offsets, c):
+                    if rec[0] == address:
+                        return rec
+            i += 1
+        return None
+
+    def profile(self, address: str) -> Optional[Dict[str, Any]]:
+        rec = self._record(address)
+        return rec[2] if rec is not None else None
+
+    def cluster_members(self, cluster_id: int) -> List[str]:
+        c = cluster_id // self.cluster_chunk_size
+        if cluster_id < 0 or c >= len(self._c_offsets) - 1:
+            raise KeyError(cluster_id)
+        return self._chunk(self._c_offsets, c)[cluster_id % self.cluster_chunk_size][1]
+
+    def query(self, address: str, members: int = 20) -> Optional[Dict[str, Any]]:
+        rec = self._record(address)
+        if rec is None:
+            return None
+        cid, profile = rec[1], rec[2]
+        out: Dict[str, Any] = {"address": address, "profile": profile, "cluster": None}
+        if self._cluster_labels is not None:
+            out["label"] = rec[3] if len(rec) > 3 else None
+        if cid is not None:
+            addrs = self.cluster_members(cid)
+            cl: Dict[str, Any] = {"cluster_id": cid, "size": len(addrs), "members": addrs[:members]}
+            listed = self._summaries.get(cid)
+            if listed is not None:
+                cl["summary"] = listed["summary"]
+            if self._cluster_labels is not None:
+                cl["labels"] = self._cluster_labels.get(str(cid))
+            elif listed is not None and "labels" in listed:
+                cl["labels"] = listed["labels"]
+            out["cluster"] = cl
+        return out
+
+    def _records(self) -> Iterator[List[Any]]:
+        for c in range(len(self._p_offsets) - 1):
+            yield from self._chunk(self._p_offsets, c)
+
+    def iter_profiles(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for rec in self._records():
+            yield rec[0], rec[2]
+
+    def address_attribution(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        # As ClusterEnrichment.address_attribution(); None without attribution.
+        labeled = self._cluster_labels
+        if labeled is None:
+            return None
+        out = {}
+        for rec in self._records():
+            cid = rec[1]
+            label = rec[3] if len(rec) > 3 else None
+            if label is not None or (cid is not None and str(cid) in labeled):
+                out[rec[0]] = {"cluster_id": cid, "label": label}
+        return dict(sorted(out.items()))
+
+    def to_json(self) -> Dict[str, Any]:
+        m = self.meta
+        out = {k: m[k] for k in ("root_address", "tx_count", "notes", "clusters")}
+        if "attribution" in m:
+            out["attribution"] = m["attribution"]
+            attributed = self.address_attribution()
+            if attributed is not None:
+                out["address_attribution"] = attributed
+        out["address_profiles"] = dict(self.iter_profiles())
+        out["graph_stats"] = m["graph_stats"]
+        if "metrics" in m:
+            out["metrics"] = m["metrics"]
+        return out
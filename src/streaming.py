@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
+
+from .clustering import Clusterer, ClusteringResult
+from .dataset import DatasetStream
+from .enrichment import ClusterEnrichment, EnrichmentCache, enrich_clusters
+from .graph_build import GraphStatsAggregator
+from .heuristics import DEFAULT_HEURISTICS
+from .metrics import Metrics, stage
+from .profiling import ProfileAggregator, counterparty_note
+from .report import cluster_summaries, write_report
+from .txtable import TxRow, TxTable, known_io_count
+
+
+class StreamingAnalysis:
+    # One pass over the transactions feeds clustering, profile aggregates and
+    # graph statistics together. State is per address (and per address pair for
+    # counterparties/graph edges), plus 8 bytes per change link, which the
+    # clustering applies in tx order at the end. With timing=True, seconds
+    # holds the time spent in each aggregator ("clustering", "profiling",
+    # "graph"; four clock reads per row or table). Tables are read column-wise
+    # by each aggregator in turn; they are independent, so the result is the
+    # one of add_row over the table's rows.
+
+    def __init__(
+        self, topk: Optional[int] = None, heuristics: Sequence[str] = DEFAULT_HEURISTICS, timing: bool = False,
+        change_links: str = "attach",
+    ) -> None:
+        self.clusterer = Clusterer(heuristics=heuristics, timing=timing, change_links=change_links)
+        self.profiles = ProfileAggregator(topk=topk)
+        self.graph = GraphStatsAggregator()
+        self.timing = timing
+        self.seconds: Counter = Counter()
+        self.tx_count = 0
+        self.io_count = 0
+        self.clusters: Optional[ClusteringResult] = None        # set by write_report
+        self.enrichment: Optional[ClusterEnrichment] = None
+
+    def add_row(self, row: TxRow) -> None:
+        if self.timing:
+            t0 = time.perf_counter()
+            self.clusterer.add_row(row)
+            t1 = time.perf_counter()
+            self.profiles.add_row(row)
+            t2 = time.perf_counter()
+            self.graph.add_row(row)
+            t3 = time.perf_counter()
+            s = self.seconds
+            s["clustering"] += t1 - t0
+            s["profiling"] += t2 - t1
+            s["graph"] += t3 - t2
+        else:
+            self.clusterer.add_row(row)
+            self.profiles.add_row(row)
+            self.graph.add_row(row)
+        self.tx_count += 1
+        self.io_count += len(row.ins) + len(row.outs)
+
+    def add_rows(self, rows: Iterable[TxRow]) -> "StreamingAnalysis":
+        for row in rows:
+            self.add_row(row)
+        return self
+
+    def add_table(self, table: TxTable) -> None:
+        if self.timing:
+            t0 = time.perf_counter()
+            self.clusterer.add_table(table)
+            t1 = time.perf_counter()
+            self.profiles.add_table(table)
+            t2 = time.perf_counter()
+            self.graph.add_table(table)
+            t3 = time.perf_counter()
+            s = self.seconds
+            s["clustering"] += t1 - t0
+            s["profiling"] += t2 - t1
+            s["graph"] += t3 - t2
+        else:
+            self.clusterer.add_table(table)
+            self.profiles.add_table(table)
+            self.graph.add_table(table)
+        self.tx_count += len(table)
+        self.io_count += known_io_count(table)
+
+    def add_tables(self, tables: Iterable[TxTable]) -> "StreamingAnalysis":
+        for table in tables:
+            self.add_table(table)
+        return self
+
+    def write_report(
+        self, out: Path, root_address: str, max_clusters: int,
+        label_store=None, label_cache: Optional[EnrichmentCache] = None, metrics: Optional[Metrics] = None,
+    ) -> None:
+        with stage(metrics, "clustering"):
+            clusters = self.clusters = self.clusterer.result()
+        if self.profiles.topk is not None:
+            clusters.notes.append(counterparty_note(self.profiles.topk))
+        with stage(metrics, "enrichment"):
+            enrichment = (
+                enrich_clusters(clusters, label_store, label_cache, self.profiles) if label_store is not None else None
+            )
+        self.enrichment = enrichment
+        graph_stats = self.graph.stats()
+        if metrics is not None:
+            metrics.record_analysis(self.tx_count, self.io_count, clusters, len(self.profiles), graph_stats)
+            metrics.add_parts("stream", self.seconds)
+        with stage(metrics, "report"):
+            write_report(
+                out,
+                root_address=root_address,
+                tx_count=self.tx_count,
+                clusters=clusters,
+                profiles=self.profiles.items(),
+                cluster_json=cluster_summaries(clusters, self.profiles, max_clusters, enrichment),
+                graph_stats=graph_stats,
+                attribution=enrichment.summary() if enrichment is not None else None,
+                address_attribution=enrichment.address_attribution() if enrichment is not None else None,
+                metrics=metrics,
+            )
+
+
+def analyze_stream(
+    dataset: Path, out: Path, max_clusters: int = 20,
+    label_store=None, label_cache: Optional[EnrichmentCache] = None, topk: Optional[int] = None,
+    metrics: Optional[Metrics] = None, heuristics: Sequence[str] = DEFAULT_HEURISTICS,
+    t_from: Optional[int] = None, t_to: Optional[int] = None, change_links: str = "attach",
+) -> StreamingAnalysis:
+    # Stages: "stream" (reading, graph, clustering and profiling interleaved;
+    # the last three also as stream_graph, stream_clustering, stream_profiling,
+    # the rest is reading), then "clustering" (change links applied),
+    # "enrichment", "report".
+    # t_from/t_to: only rows with t_from <= time < t_to (the file is not time-ordered, so this filters).
+    stream = DatasetStream(dataset)
+    tables: Iterator[TxTable] = stream.tables()
+    if t_from is not None or t_to is not None:
+        lo = t_from if t_from is not None else float("-inf")
+        hi = t_to if t_to is not None else float("inf")
+        tables = (t.take(i for i, s in enumerate(t.time) if lo <= s < hi) for t in tables)
+    with stage(metrics, "stream"):
+        analysis = StreamingAnalysis(topk, heuristics, metrics is not None, change_links).add_tables(tables)
+    analysis.write_report(out, stream.root_address or "UNKNOWN", max_clusters, label_store, label_cache, metrics)
+    return analysis
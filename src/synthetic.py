@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import hashlib
+import random
+from dataclasses import dataclass
+from typing import Iterator, List
+
+from .providers.blockstream import Tx, TxIO
+
+
+# Deterministic synthetic blockchain for benchmarks and demos. The same config
+# (seed included) always yields the same transactions. Three kinds of txs:
+#   spend   a wallet spends some of its addresses (fan-in) to payees and
+#           usually a change address of its own (fan-out)
+#   peel    one step of a peel chain: a single input pays a small amount and
+#           moves the rest to a fresh address, which the next step spends
+#   hub     exchange hot wallets: user deposits to hub addresses, and batched
+#           payouts spending several hub addresses to many users
+# Wallet activity is skewed (a few wallets do most of the spending), and
+# fan-in / fan-out counts have Pareto tails, so a few txs are very wide.
+
+
+@dataclass
+class SyntheticConfig:
+    n_txs: int = 10_000
+    seed: int = 7
+    wallets: int = 0              # 0 -> n_txs // 4
+    reuse: float = 0.3            # chance a payee or change address is one already used
+    fan_in_mean: float = 1.6      # mean inputs of a spend
+    fan_out_mean: float = 2.1     # mean outputs of a spend, change included
+    fan_tail: float = 2.0         # Pareto shape of the fan tails (> 1, smaller = heavier)
+    max_fan: int = 500
+    peel_share: float = 0.1       # share of txs that are peel-chain steps
+    peel_length: int = 50         # steps per chain
+    hubs: int = 3
+    hub_share: float = 0.15       # share of txs that are hub deposits or payouts
+    hub_batch_mean: float = 40.0  # outputs per hub payout
+    start_time: int = 1_700_000_000
+    interval: float = 60.0        # mean seconds between txs
+
+
+class _Chain:
+    __slots__ = ("addr", "value", "left")
+
+    def __init__(self, addr: str, value: float, left: int):
+        self.addr = addr
+        self.value = value
+        self.left = left
+
+
+class SyntheticChain:
+    def __init__(self, cfg: SyntheticConfig):
+        if cfg.fan_tail <= 1:
+            raise ValueError("fan_tail must be > 1")
+        self.cfg = cfg
+        self.rnd = random.Random(cfg.seed)
+        self.n_addrs = 0
+        self.wallets: List[List[str]] = [[] for _ in range(cfg.wallets or max(cfg.n_txs // 4, 1))]
+        self.hub_wallets: List[List[str]] = [[self._new_addr() for _ in range(4)] for _ in range(max(cfg.hubs, 0))]
+        self.chains: List[_Chain] = []
+        self.time = cfg.start_time
+
+    @property
+    def root_address(self) -> str:
+        return self.hub_wallets[0][0] if self.hub_wallets else "synthetic"
+
+    # --- helpers ----------------------------------------------------------------
+
+    def _hash(self, kind: str, i: int, size: int) -> str:
+        return hashlib.blake2b(f"{self.cfg.seed}:{kind}:{i}".encode(), digest_size=size).hexdigest()
+
+    def _new_addr(self) -> str:
+        self.n_addrs += 1
+        return "bc1q" + self._hash("addr", self.n_addrs, 19)
+
+    def _fan(self, mean: float) -> int:
+        # 1 + a Pareto-tailed count with mean `mean` - 1 (stochastic rounding
+        # keeps the mean), capped at max_fan.
+        a = self.cfg.fan_tail
+        x = (mean - 1) * (a - 1) * (self.rnd.paretovariate(a) - 1)
+        return min(1 + int(x + self.rnd.random()), self.cfg.max_fan)
+
+    def _wallet(self) -> List[str]:
+        # squaring skews activity towards low wallet ids
+        w = self.wallets[int(len(self.wallets) * self.rnd.random() ** 2)]
+        if not w:
+            w.append(self._new_addr())
+        return w
+
+    def _own_addr(self, w: List[str]) -> str:
+        if w and self.rnd.random() < self.cfg.reuse:
+            return self.rnd.choice(w)
+        a = self._new_addr()
+        w.append(a)
+        return a
+
+    def _payee(self) -> str:
+        w = self.wallets[self.rnd.randrange(len(self.wallets))]
+        return self._own_addr(w)
+
+    def _value(self) -> float:
+        return round(min(self.rnd.lognormvariate(-2.5, 1.6), 500.0), 8)
+
+    def _split(self, total: float, n: int) -> List[float]:
+        cuts = sorted(self.rnd.random() for _ in range(n - 1))
+        parts = [b - a for a, b in zip([0.0] + cuts, cuts + [1.0])]
+        return [round(total * p, 8) for p in parts]
+
+    def _tx(self, i: int, vin: List[TxIO], vout: List[TxIO], fee: float) -> Tx:
+        if self.cfg.interval > 0:
+            self.time += int(self.rnd.expovariate(1 / self.cfg.interval))
+        return Tx(txid=self._hash("tx", i, 32), time=self.time, vin=vin, vout=vout, fee_btc=fee)
+
+    def _pay(self, i: int, vin: List[TxIO], outs: List[str], fee: float) -> Tx:
+        # splits the input value (minus fee) randomly over outs
+        total = max(sum(io.value_btc for io in vin) - fee, 0.0)
+        return self._tx(i, vin, [TxIO(addr=a, value_btc=v) for a, v in zip(outs, self._split(total, len(outs)))], fee)
+
+    # --- tx kinds ---------------------------------------------------------------
+
+    def _spend(self, i: int) -> Tx:
+        w = self._wallet()
+        k = self._fan(self.cfg.fan_in_mean)
+        while len(w) < k:
+            w.append(self._new_addr())
+        ins = self.rnd.sample(w, k)
+        m = self._fan(self.cfg.fan_out_mean)
+        outs = [self._payee() for _ in range(max(m - 1, 1))]
+        if m > 1:
+            outs.append(self._own_addr(w))
+        vin = [TxIO(addr=a, value_btc=self._value()) for a in ins]
+        return self._pay(i, vin, outs, fee=round(0.00001 * (k + m), 8))
+
+    def _peel(self, i: int) -> Tx:
+        if not self.chains or self.rnd.random() < 1 / max(self.cfg.peel_length, 1):
+            w = self._wallet()
+            self.chains.append(_Chain(self._own_addr(w), round(self.rnd.uniform(5, 50), 8), self.cfg.peel_length))
+        ch = self.chains[self.rnd.randrange(len(self.chains))]
+        pay = round(ch.value * self.rnd.uniform(0.01, 0.1), 8)
+        fee = 0.00002
+        change = self._new_addr()
+        rest = round(ch.value - pay - fee, 8)
+        vin = [TxIO(addr=ch.addr, value_btc=ch.value)]
+        tx = self._tx(i, vin, [TxIO(addr=self._payee(), value_btc=pay), TxIO(addr=change, value_btc=rest)], fee)
+        ch.addr, ch.value, ch.left = change, rest, ch.left - 1
+        if ch.left <= 0 or rest < 0.001:
+            self.chains.remove(ch)
+        return tx
+
+    def _hub(self, i: int) -> Tx:
+        hub = self.hub_wallets[self.rnd.randrange(len(self.hub_wallets))]
+        if self.rnd.random() < 0.7:
+            # deposit: a user pays a hub address
+            w = self._wallet()
+            ins = self.rnd.sample(w, min(len(w), self._fan(self.cfg.fan_in_mean)))
+            outs = [self.rnd.choice(hub)]
+            if self.rnd.random() < 0.8:
+                outs.append(self._own_addr(w))
+            vin = [TxIO(addr=a, value_btc=self._value()) for a in ins]
+            return self._pay(i, vin, outs, fee=0.00003)
+        # batched payout: several hub addresses to many users, change to the hub
+        ins = self.rnd.sample(hub, min(len(hub), self._fan(self.cfg.fan_in_mean) + 1))
+        outs = [self._payee() for _ in range(self._fan(self.cfg.hub_batch_mean))]
+        if self.rnd.random() < 0.2:
+            hub.append(self._new_addr())
+        outs.append(self.rnd.choice(hub))
+        vin = [TxIO(addr=a, value_btc=round(self.rnd.uniform(1, 100), 8)) for a in ins]
+        return self._pay(i, vin, outs, fee=round(0.00001 * len(outs), 8))
+
+    def txs(self) -> Iterator[Tx]:
+        cfg = self.cfg
+        for i in range(cfg.n_txs):
+            r = self.rnd.random()
+            if r < cfg.peel_share:
+                yield self._peel(i)
+            elif r < cfg.peel_share + cfg.hub_share and self.hub_wallets:
+                yield self._hub(i)
+            else:
+                yield self._spend(i)
+
+
+def generate(cfg: SyntheticConfig) -> Iterator[Tx]:
+    return SyntheticChain(cfg).txs()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import heapq
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class SpaceSaving(Counter):
+    # Bounded heavy-hitters counter (Space-Saving, Metwally et al. 2005) with the
+    # Counter interface, so `c[key] += 1` and most_common() work unchanged.
+    #
+    # Exact while at most `capacity` distinct keys have been seen. After that a
+    # new key replaces the current minimum m and starts at m + 1 (errors[key] = m).
+    # With N = total increments:
+    #   - every stored count overestimates: count - errors[key] <= true <= count
+    #   - errors[key] <= min stored count <= N / capacity
+    #   - every key with true count > N / capacity is stored
+    # so most_common(k) is exact when the k-th largest true count exceeds the
+    # (k+1)-th by more than N / capacity. Memory stays O(capacity).
+    #
+    # Counts only grow: `c[key] += n` on a new key at capacity stores m + n.
+    # Eviction happens on that write (__setitem__); reading a missing key
+    # returns 0 and changes nothing. Until the first eviction an instance holds
+    # nothing beyond the Counter itself: capacity is a class attribute (see
+    # sized()), and the errors dict and the min-heap (one possibly stale entry
+    # per stored key) are created on demand.
+
+    capacity = 64
+    _errors: Optional[Dict[Hashable, int]] = None
+    _heap: Optional[List[Tuple[int, Hashable]]] = None
+
+    def __missing__(self, key: Hashable) -> int:
+        return 0
+
+    def __setitem__(self, key: Hashable, value: int) -> None:
+        if dict.__contains__(self, key):
+            dict.__setitem__(self, key, value)  # its heap entry is refreshed lazily
+            return
+        if len(self) < self.capacity:
+            if self._heap is not None:
+                heapq.heappush(self._heap, (value, key))
+            dict.__setitem__(self, key, value)
+            return
+        heap = self._heap
+        if heap is None:
+            heap = self._heap = [(c, k) for k, c in self.items()]
+            heapq.heapify(heap)
+            if self._errors is None:
+                self._errors = {}
+        while True:
+            c, k = heap[0]
+            cur = dict.get(self, k)
+            if cur is None:
+                heapq.heappop(heap)
+            elif cur != c:
+                heapq.heapreplace(heap, (cur, k))
+            else:
+                break
+        heapq.heapreplace(heap, (c + value, key))
+        dict.__delitem__(self, k)
+        self._errors.pop(k, None)
+        self._errors[key] = c
+        dict.__setitem__(self, key, c + value)
+
+    @property
+    def errors(self) -> Dict[Hashable, int]:
+        # key -> possible overestimate of its count (absent = exact)
+        return self._errors or {}
+
+    @property
+    def approximate(self) -> bool:
+        return bool(self._errors)
+
+    def error_bound(self) -> int:
+        # Largest possible overestimate of any stored count.
+        return max(self.errors.values(), default=0)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def sized(capacity: int) -> type:
+        # SpaceSaving subclass with a fixed capacity.
+        return type(f"SpaceSaving{capacity}", (SpaceSaving,), {"capacity": max(capacity, 1)})
+
+
+def counterparty_counter(
+    capacity: Optional[int], items: Iterable[Tuple[Hashable, int]] = (), errors: Optional[Dict[Hashable, int]] = None
+) -> Counter:
+    # capacity None -> exact Counter, else a SpaceSaving sketch of that size.
+    # items/errors restore a saved counter (items in their original order).
+    # A restored sketch rebuilds its heap on the next eviction; evictions pick
+    # the least (count, key), so it evicts exactly what the original would.
+    c = Counter() if capacity is None else SpaceSaving.sized(capacity)()
+    dict.update(c, items)
+    if errors:
+        c._errors = dict(errors)
+    return c
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .dataset_bin import temp_path
+from .edgelist import _TxIOs
+from .txtable import TxSource, TxTable
+
+
+# Fund-flow tracing over per-transaction address flows.
+#
+# FlowIndex keeps one edge per (input address, output address, tx) with the
+# same proportional value as build_graphs' address_graph, grouped by source
+# address and sorted by time within each group (CSR: the edges of address i
+# are indptr[i]:indptr[i + 1]). A query touches only the edges of its current
+# frontier: one searchsorted per hop finds the time bounds of every frontier
+# address, then the selected slices are gathered with vectorized indexing.
+#
+# Propagation, one hop at a time, of the amount that newly arrived at each
+# address. Every flow keeps the taint it has carried so far, across hops, so
+# funds that reach an address again (around a cycle, or by a second path) are
+# never pushed through the same flow beyond its value:
+#   haircut  the amount is spread over the address's later outgoing flows in
+#            proportion to what each can still carry (its value minus the
+#            taint it carried already)
+#   poison   every later outgoing flow is fully tainted, once
+# Pruning: max_hops, the [after, before] time window (flows must also be no
+# earlier than the time the funds reached the address), and min_value (flows
+# carrying less taint are dropped). Self-flows (change back to an input
+# address) are skipped.
+
+INDEX_VERSION = 1
+
+
+@dataclass
+class FlowIndex:
+    names: List[str]
+    indptr: np.ndarray  # int64, len(names) + 1
+    dst: np.ndarray     # int32 address id
+    value: np.ndarray   # float64 BTC
+    time: np.ndarray    # int64
+
+    def __post_init__(self) -> None:
+        self._ids: Optional[Dict[str, int]] = None
+        self._lookups = 0
+        self._key: Optional[np.ndarray] = None
+        self._t0 = 0
+
+    def __len__(self) -> int:
+        return len(self.dst)
+
+    def id_of(self, address: str) -> Optional[int]:
+        # The first lookups scan the name list (a one-off CLI query needs a
+        # handful, and a dict over all names costs more than the query); a
+        # long-lived index (serve mode, benchmarks) switches to a dict.
+        if self._ids is None:
+            self._lookups += 1
+            if self._lookups <= 16:
+                try:
+                    return self.names.index(address)
+                except ValueError:
+                    return None
+            self._ids = {a: i for i, a in enumerate(self.names)}
+        return self._ids.get(address)
+
+    @staticmethod
+    def build(txs: TxSource, max_pairs: int = 4_000_000) -> "FlowIndex":
+        table = txs if isinstance(txs, TxTable) else TxTable.from_txs(txs)
+        ios = _TxIOs(table, 0, len(table))
+        parts = []
+        for src, dst, w, tx in ios.pair_chunks(max_pairs):
+            keep = src != dst
+            parts.append((src[keep], dst[keep], w[keep], ios.time[tx[keep]]))
+        if parts:
+            src, dst, value, time = (np.concatenate(x) for x in zip(*parts))
+        else:
+            src = dst = np.zeros(0, dtype=np.int32)
+            value, time = np.zeros(0), np.zeros(0, dtype=np.int64)
+        order = np.lexsort((time, src))
+        n = len(table.addrs.names)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n)))).astype(np.int64)
+        return FlowIndex(
+            names=table.addrs.names, indptr=indptr,
+            dst=dst[order].astype(np.int32), value=value[order], time=time[order].astype(np.int64),
+        )
+
+    def save(self, path: Path) -> None:
+        # .npz written to a temp name and renamed, so readers never see a partial
+        # file; savez gets an open file, so it does not append ".npz" to the name
+        tmp = temp_path(path)
+        with tmp.open("wb") as f:
+            np.savez(
+                f, version=np.int64(INDEX_VERSION),
+                names=np.frombuffer("\n".join(self.names).encode("utf-8"), dtype=np.uint8),
+                indptr=self.indptr, dst=self.dst, value=self.value, time=self.time,
+            )
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path: Path) -> "FlowIndex":
+        with np.load(path) as z:
+            if int(z["version"]) != INDEX_VERSION:
+                raise ValueError(f"{path}: flow index version {int(z['version'])}, expected {INDEX_VERSION}")
+            raw = z["names"].tobytes().decode("utf-8")
+            return FlowIndex(
+                names=raw.split("\n") if raw else [],
+                indptr=z["indptr"], dst=z["dst"], value=z["value"], time=z["time"],
+            )
+
+    # --- queries ----------------------------------------------------------------
+
+    def trace(
+        self,
+        sources: Sequence[str],
+        max_hops: int = 3,
+        mode: str = "haircut",
+        after: Optional[int] = None,
+        before: Optional[int] = None,
+        min_value: float = 0.0,
+        amount: Optional[float] = None,
+    ) -> "TraceResult":
+        # amount: BTC traced out of the sources (haircut; default: everything
+        # they send within the window).
+        if mode not in ("haircut", "poison"):
+            raise ValueError(f"unknown trace mode: {mode}")
+        ids = [self.id_of(a) for a in sources]
+        missing = [a for a, i in zip(sources, ids) if i is None]
+        if missing:
+            raise KeyError(f"not in the dataset: {', '.join(missing)}")
+        n = len(self.names)
+        lo_t = after if after is not None else np.iinfo(np.int64).min
+        hi_t = before if before is not None else np.iinfo(np.int64).max
+
+        taint = np.zeros(n)                                    # haircut: BTC received; poison: BTC of tainted inflows
+        first_hop = np.full(n, -1, dtype=np.int32)
+        first_time = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+        src = np.unique(np.asarray(ids, dtype=np.int64))
+        first_hop[src] = 0
+        first_time[src] = lo_t
+        carried = np.zeros(len(self.dst))                      # taint each flow carried so far
+        # frontier: addresses, the amount that newly reached them, and when
+        front, front_t = src, np.full(len(src), lo_t, dtype=np.int64)
+        front_x = np.full(len(src), np.inf)
+        if amount is not None:
+            front_x[:] = amount / len(src)
+        edges = 0
+        hops = 0
+        for hop in range(1, max_hops + 1):
+            e_idx, e_node = self._slices(front, front_t, hi_t)
+            if not len(e_idx):
+                break
+            hops = hop
+            left = self.value[e_idx] - carried[e_idx]
+            if mode == "haircut":
+                out_sum = np.bincount(e_node, weights=left, minlength=len(front))
+                frac = np.minimum(1.0, front_x / np.where(out_sum > 0, out_sum, 1.0))
+                flow = left * frac[e_node]
+            else:
+                flow = left
+            keep = flow >= min_value if min_value > 0 else flow > 0
+            e_idx, flow = e_idx[keep], flow[keep]
+            if not len(e_idx):
+                break
+            edges += int(np.count_nonzero(carried[e_idx] == 0))
+            carried[e_idx] += flow
+            dst, t = self.dst[e_idx].astype(np.int64), self.time[e_idx]
+            nodes, inv = np.unique(dst, return_inverse=True)
+            got = np.bincount(inv, weights=flow, minlength=len(nodes))
+            arrive = np.full(len(nodes), np.iinfo(np.int64).max, dtype=np.int64)
+            np.minimum.at(arrive, inv, t)
+            taint[nodes] += got
+            new = first_hop[nodes] < 0
+            first_hop[nodes[new]] = hop
+            earlier = arrive < first_time[nodes]
+            first_time[nodes[earlier]] = arrive[earlier]
+            if mode == "poison":
+                # only addresses reached for the first time, or earlier than
+                # before, have untainted flows left
+                nxt = new | earlier
+                front, front_t, front_x = nodes[nxt], arrive[nxt], got[nxt]
+            else:
+                front, front_t, front_x = nodes, arrive, got
+        reached = np.flatnonzero(first_hop > 0)
+        return TraceResult(
+            index=self, sources=list(sources), mode=mode, hops=hops, edges=edges,
+            addrs=reached, taint=taint[reached], first_hop=first_hop[reached], first_time=first_time[reached],
+        )
+
+    def _search_key(self) -> np.ndarray:
+        # src << 32 | (time - t0): sorted like the edges, so one searchsorted
+        # finds the time bounds of every frontier address at once.
+        if self._key is None:
+            src = np.repeat(np.arange(len(self.names), dtype=np.int64), np.diff(self.indptr))
+            self._t0 = int(self.time.min()) if len(self.time) else 0
+            self._key = src << 32 | (self.time - self._t0)
+        return self._key
+
+    def _slices(self, front: np.ndarray, front_t: np.ndarray, hi_t: int):
+        # Edge indices of each frontier address with time in [front_t, hi_t],
+        # and the frontier position each edge came from.
+        key = self._search_key()
+        span = (1 << 32) - 1
+        if hi_t < self._t0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        t_lo = np.minimum(np.maximum(front_t, self._t0) - self._t0, span)
+        t_hi = min(hi_t - self._t0, span)
+        base = front.astype(np.int64) << 32
+        lo = np.searchsorted(key, base | t_lo, side="left")
+        hi = np.searchsorted(key, base | t_hi, side="right")
+        counts = np.maximum(hi - lo, 0)
+        total = int(counts.sum())
+        e_node = np.repeat(np.arange(len(front)), counts)
+        e_idx = np.repeat(lo, counts) + (np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts))
+        return e_idx, e_node
+
+
+@dataclass
+class TraceResult:
+    index: FlowIndex
+    sources: List[str]
+    mode: str
+    hops: int              # hops that reached new flows
+    edges: int             # distinct flows followed
+    addrs: np.ndarray      # address ids reached (sources excluded)
+    taint: np.ndarray      # BTC: traced amount received (haircut) / tainted inflows (poison)
+    first_hop: np.ndarray
+    first_time: np.ndarray
+
+    def top(self, n: Optional[int] = None) -> List[Dict[str, Any]]:
+        order = np.argsort(-self.taint, kind="stable")
+        if n is not None:
+            order = order[:n]
+        names = self.index.names
+        return [
+            {
+                "address": names[int(self.addrs[i])],
+                "btc": round(float(self.taint[i]), 8),
+                "hop": int(self.first_hop[i]),
+                "first_time": int(self.first_time[i]),
+            }
+            for i in order.tolist()
+        ]
+
+    def to_json(self, n: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "sources": self.sources,
+            "mode": self.mode,
+            "hops": self.hops,
+            "flows_followed": self.edges,
+            "addresses_reached": int(len(self.addrs)),
+            "addresses": self.top(n),
+        }
+
+
+def open_flow_index(dataset: Path, index: Optional[Path] = None, rebuild: bool = False) -> FlowIndex:
+    # Loads the index next to the dataset (<dataset>.flows.npz), building it
+    # when missing or older than the dataset.
+    from .dataset import Dataset
+
+    path = index or dataset.with_name(dataset.name + ".flows.npz")
+    if not rebuild and path.exists() and path.stat().st_mtime >= dataset.stat().st_mtime:
+        return FlowIndex.load(path)
+    idx = FlowIndex.build(Dataset.load(dataset).txs)
+    idx.save(path)
+    return idx
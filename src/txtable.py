@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from .providers.blockstream import Tx, TxIO
+
+
+SAT_PER_BTC = 100_000_000
+UNKNOWN = "UNKNOWN"
+UNKNOWN_ID = -1
+
+
+def btc_to_sat(v: float) -> int:
+    return int(round(v * SAT_PER_BTC))
+
+
+def sat_to_btc(sats: int) -> float:
+    return sats / SAT_PER_BTC
+
+
+class AddressIndex:
+    # Intern table: address string <-> dense int32 id. "UNKNOWN" maps to -1.
+
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, addr: str) -> int:
+        if addr == UNKNOWN:
+            return UNKNOWN_ID
+        i = self.ids.get(addr)
+        if i is None:
+            i = len(self.names)
+            self.ids[addr] = i
+            self.names.append(addr)
+        return i
+
+    def name(self, i: int) -> str:
+        return UNKNOWN if i < 0 else self.names[i]
+
+
+def known_io_count(txs: "TxSource") -> int:
+    # Inputs plus outputs with a known address.
+    if isinstance(txs, TxTable):
+        return (len(txs.vin_addr) + len(txs.vout_addr)
+                - txs.vin_addr.count(UNKNOWN_ID) - txs.vout_addr.count(UNKNOWN_ID))
+    return sum(len(r.ins) + len(r.outs) for r in iter_rows(txs))
+
+
+class TxRow(NamedTuple):
+    # Per-transaction view shared by graph building, clustering and profiling:
+    # only known addresses, values in integer satoshis. Built per tx for
+    # datasets that are not columnar; a TxTable is read column-wise instead
+    # (TxTable.inputs/outputs).
+    txid: str
+    time: int
+    fee_sat: int
+    ins: List[Tuple[str, int]]
+    outs: List[Tuple[str, int]]
+
+
+class TxTable:
+    # Columnar transaction store.
+    # Per tx: txid, time and fee (int64 sat). Inputs and outputs live in flat
+    # address-id (int32) and value (int64 sat) columns; tx i owns the slice
+    # vin_off[i]:vin_off[i + 1] (CSR offsets), and likewise for vout.
+    # Indexing or iterating yields Tx/TxIO views built on demand.
+
+    def __init__(self, addrs: Optional[AddressIndex] = None):
+        self.addrs = addrs if addrs is not None else AddressIndex()
+        self.txids: List[str] = []
+        self.time = array("q")
+        self.fee = array("q")
+        self.vin_off = array("q", [0])
+        self.vin_addr = array("i")
+        self.vin_value = array("q")
+        self.vout_off = array("q", [0])
+        self.vout_addr = array("i")
+        self.vout_value = array("q")
+
+    def __len__(self) -> int:
+        return len(self.txids)
+
+    def append(
+        self,
+        txid: str,
+        time: int,
+        fee_sat: int,
+        vin: Iterable[Tuple[str, int]],
+        vout: Iterable[Tuple[str, int]],
+    ) -> int:
+        intern = self.addrs.intern
+        for a, v in vin:
+            self.vin_addr.append(intern(a))
+            self.vin_value.append(v)
+        for a, v in vout:
+            self.vout_addr.append(intern(a))
+            self.vout_value.append(v)
+        self.vin_off.append(len(self.vin_addr))
+        self.vout_off.append(len(self.vout_addr))
+        self.txids.append(txid)
+        self.time.append(time)
+        self.fee.append(fee_sat)
+        return len(self.txids) - 1
+
+    def append_tx(self, tx: Tx) -> int:
+        return self.append(
+            tx.txid,
+            tx.time,
+            btc_to_sat(tx.fee_btc),
+            ((io.addr, btc_to_sat(io.value_btc)) for io in tx.vin),
+            ((io.addr, btc_to_sat(io.value_btc)) for io in tx.vout),
+        )
+
+    def append_from(self, other: "TxTable", i: int) -> int:
+        # Copies tx i of another table, re-interning its addresses into this one.
+        name = other.addrs.name
+        lo, hi = other.vin_range(i)
+        vin = [(name(other.vin_addr[j]), other.vin_value[j]) for j in range(lo, hi)]
+        lo, hi = other.vout_range(i)
+        vout = [(name(other.vout_addr[j]), other.vout_value[j]) for j in range(lo, hi)]
+        return self.append(other.txids[i], other.time[i], other.fee[i], vin, vout)
+
+    def take(self, indices: Iterable[int]) -> "TxTable":
+        # New table with the given txs, in the given order (address ids re-interned).
+        t = TxTable()
+        for i in indices:
+            t.append_from(self, i)
+        return t
+
+    @classmethod
+    def from_txs(cls, txs: Iterable[Tx], addrs: Optional[AddressIndex] = None) -> "TxTable":
+        t = cls(addrs)
+        for tx in txs:
+            t.append_tx(tx)
+        return t
+
+    def vin_range(self, i: int) -> Tuple[int, int]:
+        return self.vin_off[i], self.vin_off[i + 1]
+
+    def vout_range(self, i: int) -> Tuple[int, int]:
+        return self.vout_off[i], self.vout_off[i + 1]
+
+    def _ios(self, addr_col: array, value_col: array, lo: int, hi: int) -> List[TxIO]:
+        name = self.addrs.name
+        return [TxIO(addr=name(addr_col[j]), value_btc=sat_to_btc(value_col[j])) for j in range(lo, hi)]
+
+    def __getitem__(self, i: int) -> Tx:
+        if i < 0:
+            i += len(self)
+        return Tx(
+            txid=self.txids[i],
+            time=self.time[i],
+            vin=self._ios(self.vin_addr, self.vin_value, *self.vin_range(i)),
+            vout=self._ios(self.vout_addr, self.vout_value, *self.vout_range(i)),
+            fee_btc=sat_to_btc(self.fee[i]),
+        )
+
+    def __iter__(self) -> Iterator[Tx]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def _columns(self, addr_col: array, value_col: array, lo: int, hi: int) -> Tuple[List[str], Sequence[int]]:
+        names = self.addrs.names
+        ids = addr_col[lo:hi]
+        if UNKNOWN_ID not in ids:
+            return [names[a] for a in ids], value_col[lo:hi]
+        keep = [j for j in range(hi - lo) if ids[j] >= 0]
+        return [names[ids[j]] for j in keep], [value_col[lo + j] for j in keep]
+
+    def inputs(self, i: int) -> Tuple[List[str], Sequence[int]]:
+        # (known input addresses, their satoshis) of tx i: TxRow.ins as two
+        # columns, without a tuple per input
+        return self._columns(self.vin_addr, self.vin_value, self.vin_off[i], self.vin_off[i + 1])
+
+    def outputs(self, i: int) -> Tuple[List[str], Sequence[int]]:
+        return self._columns(self.vout_addr, self.vout_value, self.vout_off[i], self.vout_off[i + 1])
+
+    def _known(self, addr_col: array, value_col: array, lo: int, hi: int) -> List[Tuple[str, int]]:
+        names = self.addrs.names
+        return [(names[addr_col[j]], value_col[j]) for j in range(lo, hi) if addr_col[j] >= 0]
+
+    def rows(self, lo: int = 0, hi: Optional[int] = None) -> Iterator[TxRow]:
+        vin_off, vout_off = self.vin_off, self.vout_off
+        for i in range(lo, len(self.txids) if hi is None else hi):
+            yield TxRow(
+                self.txids[i],
+                self.time[i],
+                self.fee[i],
+                self._known(self.vin_addr, self.vin_value, vin_off[i], vin_off[i + 1]),
+                self._known(self.vout_addr, self.vout_value, vout_off[i], vout_off[i + 1]),
+            )
+
+    def nbytes(self) -> int:
+        cols = (self.time, self.fee, self.vin_off, self.vin_addr, self.vin_value,
+                self.vout_off, self.vout_addr, self.vout_value)
+        return sum(c.itemsize * len(c) for c in cols)
+
+
+class TimeIndex:
+    # Tx positions sorted by time (stable, so equal times keep file order) with
+    # the sorted times alongside; a time range is two bisections. Datasets are
+    # usually written in time order (or newest first), so the sort is skipped
+    # when the column is already monotonic.
+
+    def __init__(self, times: Sequence[int]):
+        n = len(times)
+        if all(times[i] <= times[i + 1] for i in range(n - 1)):
+            self.order: List[int] = list(range(n))
+        elif all(times[i] >= times[i + 1] for i in range(n - 1)):
+            self.order = _reverse_runs(times)
+        else:
+            self.order = sorted(range(n), key=times.__getitem__)
+        self.times = [times[i] for i in self.order]
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def bounds(self, t_from: Optional[int] = None, t_to: Optional[int] = None) -> Tuple[int, int]:
+        # Positions in sorted order of the txs with t_from <= time < t_to.
+        lo = bisect_left(self.times, t_from) if t_from is not None else 0
+        hi = bisect_left(self.times, t_to) if t_to is not None else len(self.times)
+        return lo, max(lo, hi)
+
+    def select(self, t_from: Optional[int] = None, t_to: Optional[int] = None) -> List[int]:
+        # Tx indices in [t_from, t_to), in file order.
+        lo, hi = self.bounds(t_from, t_to)
+        return sorted(self.order[lo:hi])
+
+    def first(self) -> Optional[int]:
+        return self.times[0] if self.times else None
+
+    def last(self) -> Optional[int]:
+        return self.times[-1] if self.times else None
+
+
+def _reverse_runs(times: Sequence[int]) -> List[int]:
+    # Ascending order of a non-increasing column, keeping file order within equal times.
+    out: List[int] = []
+    i = len(times)
+    while i > 0:
+        j = i - 1
+        while j > 0 and times[j - 1] == times[i - 1]:
+            j -= 1
+        out.extend(range(j, i))
+        i = j
+    return out
+
+
+TxSource = Union[Sequence[Tx], Iterable[Tx], TxTable]
+
+
+def row_of(tx: Tx) -> TxRow:
+    return TxRow(
+        tx.txid,
+        tx.time,
+        btc_to_sat(tx.fee_btc),
+        [(io.addr, btc_to_sat(io.value_btc)) for io in tx.vin if io.addr != UNKNOWN],
+        [(io.addr, btc_to_sat(io.value_btc)) for io in tx.vout if io.addr != UNKNOWN],
+    )
+
+
+def iter_rows(txs: TxSource) -> Iterator[TxRow]:
+    # Reads a TxTable straight from its columns; Tx objects are converted one by one.
+    if isinstance(txs, TxTable):
+        return txs.rows()
+    return (row_of(tx) for tx in txs)
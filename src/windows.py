@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Sequence, Set, TextIO, Tuple
+
+from .clustering import Clusterer, UnionFind
+from .heuristics import DEFAULT_HEURISTICS, HeuristicPipeline
+from .metrics import Metrics, stage
+from .txtable import TimeIndex, TxTable, sat_to_btc
+
+
+# Sliding-window analysis over a TimeIndex.
+#
+# The time range is cut into buckets of `step` seconds and every tx is
+# processed once, in time order, into its bucket's aggregates:
+#   profiles  per-address tx count and received/sent satoshis
+#   clusters  a spanning forest of the bucket's multi-input unions (at most
+#             one edge per address) and its change links, in time order
+# A window is `window / step` consecutive buckets. Profile totals slide: the
+# bucket entering the window is added and the one leaving it subtracted, so a
+# step costs the addresses of those two buckets, not the window. Union-find
+# cannot forget unions, so each window's clustering replays the forests and
+# change links of its buckets into a fresh Clusterer (no tx is re-read and no
+# heuristic re-evaluated).
+# Change heuristics run over the whole history in time order, so
+# fresh_address sees addresses from before the window.
+
+
+@dataclass
+class Bucket:
+    start: int
+    end: int
+    txs: int = 0
+    tx_count: Counter = field(default_factory=Counter)
+    in_sum: Counter = field(default_factory=Counter)
+    out_sum: Counter = field(default_factory=Counter)
+    forest: List[List[str]] = field(default_factory=list)
+    links: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def build_buckets(
+    table: TxTable, index: TimeIndex, t_from: int, t_to: int, step: int,
+    heuristics: Sequence[str] = DEFAULT_HEURISTICS,
+) -> List[Bucket]:
+    pipe = HeuristicPipeline(heuristics)
+    out = []
+    for start in range(t_from, t_to, step):
+        b = Bucket(start, min(start + step, t_to))
+        lo, hi = index.bounds(b.start, b.end)
+        uf = UnionFind()
+        for i in index.order[lo:hi]:
+            ins, in_sat = table.inputs(i)
+            outs, out_sat = table.outputs(i)
+            b.txs += 1
+            for a in dict.fromkeys(ins + outs):
+                b.tx_count[a] += 1
+            for a, v in zip(ins, in_sat):
+                b.out_sum[a] += v
+            for a, v in zip(outs, out_sat):
+                b.in_sum[a] += v
+            multi, change = pipe.links_of(ins, outs, out_sat)
+            if multi:
+                uf.union_all(multi)
+            if change:
+                b.links.append(change)
+        names = uf.names
+        b.forest = [[names[r], names[m]] for r, ms in uf.members.items() for m in ms if m != r]
+        out.append(b)
+    return out
+
+
+class WindowProfiles:
+    # Per-address totals of the buckets currently in the window.
+
+    def __init__(self) -> None:
+        self.tx_count: Counter = Counter()
+        self.in_sum: Counter = Counter()
+        self.out_sum: Counter = Counter()
+        self.txs = 0
+        self.received = 0
+
+    def _apply(self, b: Bucket, sign: int) -> None:
+        self.txs += sign * b.txs
+        self.received += sign * sum(b.in_sum.values())
+        for mine, theirs in ((self.tx_count, b.tx_count), (self.in_sum, b.in_sum), (self.out_sum, b.out_sum)):
+            for a, v in theirs.items():
+                n = mine[a] + sign * v
+                if n:
+                    mine[a] = n
+                else:
+                    mine.pop(a, None)
+
+    def add(self, b: Bucket) -> None:
+        self._apply(b, 1)
+
+    def slide(self, enter: Optional[Bucket], leave: Optional[Bucket], top: int) -> Dict[str, Any]:
+        # Applies one step and returns the address delta against the previous window.
+        touched: Set[str] = set()
+        for b in (enter, leave):
+            if b is not None:
+                touched.update(b.tx_count)
+        tc, ins, outs = self.tx_count, self.in_sum, self.out_sum
+        before = {a: (tc.get(a, 0), ins.get(a, 0), outs.get(a, 0)) for a in touched}
+        if enter is not None:
+            self._apply(enter, 1)
+        if leave is not None:
+            self._apply(leave, -1)
+        added = removed = 0
+        changes = []
+        for a, (n0, i0, o0) in before.items():
+            n1 = self.tx_count.get(a, 0)
+            if n0 == 0 and n1:
+                added += 1
+            elif n0 and n1 == 0:
+                removed += 1
+            d_in, d_out = self.in_sum.get(a, 0) - i0, self.out_sum.get(a, 0) - o0
+            if n1 != n0 or d_in or d_out:
+                changes.append((-(abs(d_in) + abs(d_out)), a, n1 - n0, d_in, d_out))
+        changes.sort()
+        return {
+            "addresses_added": added,
+            "addresses_removed": removed,
+            "top_changes": [
+                {"address": a, "tx_count_delta": dn, "in_btc_delta": sat_to_btc(d_in),
+                 "out_btc_delta": sat_to_btc(d_out)}
+                for _, a, dn, d_in, d_out in changes[:top]
+            ],
+        }
+
+
+def window_clusters(buckets: Sequence[Bucket], change_links: str = "attach") -> List[FrozenSet[str]]:
+    c = Clusterer(change_links=change_links)
+    for b in buckets:
+        c.add_links(b.forest, b.links)
+    return [frozenset(g) for g in c.groups()]
+
+
+def iter_windows(
+    table: TxTable, window: int, step: Optional[int] = None,
+    t_from: Optional[int] = None, t_to: Optional[int] = None, top: int = 10,
+    heuristics: Sequence[str] = DEFAULT_HEURISTICS, metrics: Optional[Metrics] = None,
+    index: Optional[TimeIndex] = None, change_links: str = "attach",
+) -> Iterator[Dict[str, Any]]:
+    # One dict per window [from, to): size, clusters, and the change against
+    # the previous window. Windows advance by `step` (default: window, i.e.
+    # tumbling) and must be a whole number of steps. A range holding no
+    # bucket (past the last tx, say) gives no windows.
+    step = step or window
+    if step <= 0 or window % step:
+        raise ValueError(f"window ({window}s) must be a positive multiple of step ({step}s)")
+    if t_from is not None and t_to is not None and t_from >= t_to:
+        raise ValueError(f"empty time range: --from ({t_from}) must be before --to ({t_to})")
+    with stage(metrics, "time_index"):
+        index = index if index is not None else TimeIndex(table.time)
+    if not len(index):
+        return
+    t_from = t_from if t_from is not None else index.first()
+    t_to = t_to if t_to is not None else index.last() + 1
+    with stage(metrics, "buckets"):
+        buckets = build_buckets(table, index, t_from, t_to, step, heuristics)
+    if not buckets:
+        return
+    k = window // step
+    profiles = WindowProfiles()
+    prev: Set[FrozenSet[str]] = set()
+    for w in range(max(1, len(buckets) - k + 1)):
+        with stage(metrics, "windows"):
+            if w == 0:
+                for b in buckets[:k]:
+                    profiles.add(b)
+                delta = _first_delta(profiles, top)
+            else:
+                delta = profiles.slide(buckets[w + k - 1], buckets[w - 1], top)
+            groups = window_clusters(buckets[w:w + k], change_links)
+            cur = set(groups)
+        if metrics is not None:
+            metrics.count("windows")
+        yield {
+            "from": buckets[w].start,
+            "to": buckets[min(w + k, len(buckets)) - 1].end,
+            "txs": profiles.txs,
+            "addresses": len(profiles.tx_count),
+            "received_btc": sat_to_btc(profiles.received),
+            "clusters": len(groups),
+            "largest_cluster": max((len(g) for g in groups), default=0),
+            "clusters_formed": len(cur - prev),
+            "clusters_dissolved": len(prev - cur),
+            **delta,
+        }
+        prev = cur
+
+
+def _first_delta(profiles: WindowProfiles, top: int) -> Dict[str, Any]:
+    # Delta of the first window against the empty one before it.
+    changes = sorted((-(profiles.in_sum[a] + profiles.out_sum[a]), a) for a in profiles.tx_count)
+    return {
+        "addresses_added": len(profiles.tx_count),
+        "addresses_removed": 0,
+        "top_changes": [
+            {"address": a, "tx_count_delta": profiles.tx_count[a], "in_btc_delta": sat_to_btc(profiles.in_sum[a]),
+             "out_btc_delta": sat_to_btc(profiles.out_sum[a])}
+            for _, a in changes[:top]
+        ],
+    }
+
+
+def write_windows(f: TextIO, windows: Iterator[Dict[str, Any]]) -> int:
+    # JSON lines, one window per line.
+    n = 0
+    for w in windows:
+        f.write(json.dumps(w) + "\n")
+        n += 1
+    return n
@@ -0,0 +1,529 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .clustering import Clusterer, ClusteringResult, UnionFind
+from .dataset import DatasetStream
+from .enrichment import ClusterEnrichment, EnrichmentCache, enrich_clusters
+from .graph_build import GraphStatsAggregator
+from .heuristics import DEFAULT_HEURISTICS
+from .metrics import Metrics, stage
+from .profiling import AddressProfile, AddressState, ProfileAggregator, address_profile, counterparty_note
+from .report import cluster_summaries, render_profile, write_report
+from .txtable import TxRow
+
+
+# Persistent analysis state, so that re-running analyze on a grown dataset only
+# processes the transactions it has not seen. One SQLite file in the workspace
+# directory holds:
+#   txs        applied txids
+#   addresses  one row per address, id = first-appearance order (the profile
+#              order of the report and the graph's intern id): profile
+#              aggregates, counterparty counter, graph flag, and the profile
+#              as AddressProfile fields and as report text
+#   links      change links (spender, change address ids), in tx order
+#   edges      address-graph pairs (src << 32 | dst over address ids)
+#   forest     the multi-input union-find, one row per node: union-find id
+#              (order of first appearance), address id, root id, and the
+#              tree size on roots; stored flat (every node names its root)
+#   meta       counters and settings, the dataset the workspace belongs to
+#              and, for a binary dataset, where the last pass ended
+# The state is saved before change links are applied, so applying the new
+# rows continues exactly where the last run stopped: the report is the one a
+# single pass over all transactions (analyze --stream) would write.
+#
+# An update reads and writes only the rows of addresses touched by new
+# transactions and the forest rows of the trees their multi-input unions join
+# (see _Forest): its cost follows the new transactions, not the workspace.
+# The report covers the whole workspace, so writing it restores the full
+# forest and copies every profile's stored text, but nothing is recomputed or
+# re-serialised for the old transactions.
+# Reading a binary dataset resumes after the end of the last pass when the file
+# still starts with the same bytes (datasets grown by appending batches), and
+# otherwise skips every batch whose txids are all applied already without
+# decoding it; a JSON dataset is parsed whole.
+
+VERSION = "4"
+STATE_FILE = "state.sqlite"
+
+_BATCH = 500
+_CHUNK = 20_000
+
+
+class _Forest:
+    # The workspace's union-find while update() runs, in the place of a
+    # UnionFind (Clusterer only calls union_all). Each chunk load()s the
+    # stored trees of its multi-input addresses, unions in memory, and
+    # flush()es the nodes it added and the trees it re-rooted: a re-rooted
+    # tree is one UPDATE over its rows (indexed by root). Ids, roots and
+    # sizes follow UnionFind (ids in order of first appearance, union by size,
+    # the first tree's root on a tie), so restoring the forest gives the
+    # UnionFind an uninterrupted run would have built.
+
+    def __init__(self, db: sqlite3.Connection, count: int, unions: int):
+        self._db = db
+        self.count = count                          # ids handed out
+        self.unions = unions
+        self.ids: Dict[str, int] = {}               # address -> id, loaded or added
+        self.root: Dict[int, int] = {}              # id -> root id
+        self.size: Dict[int, int] = {}              # root id -> tree size
+        self.members: Dict[int, List[int]] = {}     # root id -> its loaded ids
+        self._new: List[Tuple[int, str]] = []
+        self._rerooted: List[Tuple[int, int]] = []  # (new root, old root), in union order
+
+    def _in(self, q: str, keys: List[int]) -> Iterator[tuple]:
+        for lo in range(0, len(keys), _BATCH):
+            batch = keys[lo: lo + _BATCH]
+            yield from self._db.execute(q % ",".join("?" * len(batch)), batch)
+
+    def load(self, addrs: Iterable[str], addr_ids: Dict[str, int]) -> None:
+        # addr_ids: address -> address id (the addresses table's)
+        by_id = {addr_ids[a]: a for a in addrs if a not in self.ids}
+        roots = set()
+        for i, a, r in self._in("SELECT id, addr, root FROM forest WHERE addr IN (%s)", list(by_id)):
+            self.ids[by_id[a]] = i
+            self.root[i] = r
+            self.members.setdefault(r, []).append(i)
+            roots.add(r)
+        for r in roots:
+            if r not in self.root:  # the root itself, which union_all passes on
+                self.root[r] = r
+                self.members[r].append(r)
+        for r, n in self._in("SELECT id, size FROM forest WHERE id IN (%s)", [r for r in roots if r not in self.size]):
+            self.size[r] = n
+
+    def add(self, addr: str) -> int:
+        i = self.ids.get(addr)
+        if i is None:
+            i = self.ids[addr] = self.count
+            self.count += 1
+            self.root[i] = i
+            self.size[i] = 1
+            self.members[i] = [i]
+            self._new.append((i, addr))
+        return i
+
+    def union_ids(self, a: int, b: int) -> int:
+        ra, rb = self.root[a], self.root[b]
+        if ra == rb:
+            return ra
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        moved = self.members.pop(rb)
+        for m in moved:
+            self.root[m] = ra
+        self.members[ra].extend(moved)
+        self.size[ra] += self.size.pop(rb)
+        self._rerooted.append((ra, rb))
+        self.unions += 1
+        return ra
+
+    def union_all(self, addrs: List[str]) -> None:
+        base = self.add(addrs[0])
+        for a in addrs[1:]:
+            base = self.union_ids(base, self.add(a))
+
+    def flush(self, addr_ids: Dict[str, int]) -> None:
+        # Writes this chunk's changes and forgets the loaded trees.
+        db = self._db
+        db.executemany("UPDATE forest SET root = ? WHERE root = ?", self._rerooted)
+        db.executemany("INSERT INTO forest (id, addr, root, size) VALUES (?, ?, ?, 1)",
+                       ((i, addr_ids[a], self.root[i]) for i, a in self._new))
+        db.executemany("UPDATE forest SET size = ? WHERE id = ?", ((n, r) for r, n in self.size.items()))
+        self.ids, self.root, self.size, self.members = {}, {}, {}, {}
+        self._new, self._rerooted = [], []
+
+
+class Workspace:
+    def __init__(
+        self, path: Path, topk: Optional[int] = None,
+        heuristics: Sequence[str] = DEFAULT_HEURISTICS, timing: bool = False, change_links: str = "attach",
+        dataset: Optional[Path] = None,
+    ):
+        # topk and the change heuristics must match the workspace's: counters
+        # of one kind cannot be continued as the other, and stored change links
+        # were chosen by the heuristics it was built with. The change link mode
+        # only affects results, but is fixed too so that reports of one
+        # workspace stay comparable. dataset: the file the workspace is fed
+        # from, recorded on first use; another file is refused.
+        self.path = path
+        self.topk = topk
+        self.heuristics = tuple(heuristics)
+        self.timing = timing
+        self.change_links = change_links
+        self._seconds: Counter = Counter()  # heuristic timings of this session's updates
+        # time of this session's updates per part: "state" (reading address
+        # rows), "clustering", "profiling", "graph", "store" (writing rows)
+        self.seconds: Counter = Counter()
+        self.touched: Set[str] = set()  # addresses of the txs this session applied
+        path.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path / STATE_FILE), isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS txs (txid TEXT PRIMARY KEY) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS addresses ("
+            " id INTEGER PRIMARY KEY, address TEXT NOT NULL UNIQUE, graph_node INTEGER NOT NULL DEFAULT 0,"
+            " tx_count INTEGER NOT NULL, in_sat INTEGER NOT NULL, out_sat INTEGER NOT NULL, fees REAL NOT NULL,"
+            " first INTEGER, last INTEGER, counterparties TEXT NOT NULL, errors TEXT, top TEXT NOT NULL,"
+            " hours TEXT NOT NULL, rendered TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS links (seq INTEGER PRIMARY KEY, spender INTEGER NOT NULL,"
+            " change INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS edges (key INTEGER PRIMARY KEY);"
+            "CREATE TABLE IF NOT EXISTS forest (id INTEGER PRIMARY KEY, addr INTEGER NOT NULL UNIQUE,"
+            " root INTEGER NOT NULL, size INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS forest_root ON forest(root);"
+        )
+        meta = self._meta()
+        names = ",".join(self.heuristics)
+        if not meta:
+            self._set_meta(version=VERSION, id=uuid.uuid4().hex, topk="" if topk is None else str(topk), tx_count=0,
+                           addresses=0, graph_nodes=0, graph_edges=0, bipartite_edges=0, unions=0,
+                           heuristics=names, heuristic_hits="{}", change_links=change_links)
+        elif meta["version"] != VERSION:
+            raise ValueError(f"{path}: workspace format {meta['version']}, expected {VERSION}")
+        elif meta["topk"] != ("" if topk is None else str(topk)):
+            raise ValueError(f"{path}: workspace was built with topk={meta['topk'] or 'exact'}")
+        elif meta.get("heuristics", ",".join(DEFAULT_HEURISTICS)) != names:
+            raise ValueError(f"{path}: workspace was built with change heuristics {meta.get('heuristics')}")
+        elif meta["change_links"] != change_links:
+            raise ValueError(f"{path}: workspace was built with --change-links {meta['change_links']}")
+        elif "id" not in meta:
+            self._set_meta(id=uuid.uuid4().hex)
+        if dataset is not None:
+            name = str(dataset.resolve())
+            if meta.get("dataset", name) != name:
+                raise ValueError(f"{path}: workspace belongs to dataset {meta['dataset']}; use another --workspace")
+            self._set_meta(dataset=name)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "Workspace":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _meta(self) -> Dict[str, str]:
+        return dict(self._db.execute("SELECT k, v FROM meta"))
+
+    def _set_meta(self, **kv: object) -> None:
+        self._db.executemany("INSERT OR REPLACE INTO meta (k, v) VALUES (?, ?)", ((k, str(v)) for k, v in kv.items()))
+
+    @property
+    def tx_count(self) -> int:
+        return int(self._meta()["tx_count"])
+
+    @property
+    def state(self) -> str:
+        # names this workspace at its current transaction count; a cluster
+        # index built from it records the state it reflects
+        meta = self._meta()
+        return f"{meta['id']}:{meta['tx_count']}"
+
+    @property
+    def root_address(self) -> Optional[str]:
+        return self._meta().get("root_address")
+
+    def _in(self, q: str, keys: List[str]) -> Iterator[tuple]:
+        for lo in range(0, len(keys), _BATCH):
+            batch = keys[lo: lo + _BATCH]
+            yield from self._db.execute(q % ",".join("?" * len(batch)), batch)
+
+    # --- union-find -------------------------------------------------------------
+
+    def _load_uf(self) -> UnionFind:
+        names: List[str] = []
+        parent: List[int] = []
+        size: List[int] = []
+        q = "SELECT a.address, f.root, f.size FROM forest f JOIN addresses a ON a.id = f.addr ORDER BY f.id"
+        for a, r, n in self._db.execute(q):
+            names.append(a)
+            parent.append(r)
+            size.append(n)
+        return UnionFind.restore(names, parent, size, int(self._meta()["unions"]))
+
+    def _forest(self) -> _Forest:
+        (last,) = self._db.execute("SELECT MAX(id) FROM forest").fetchone()
+        return _Forest(self._db, 0 if last is None else last + 1, int(self._meta()["unions"]))
+
+    # --- updates ----------------------------------------------------------------
+
+    def set_root_address(self, address: str) -> None:
+        self._set_meta(root_address=address)
+
+    def has_txids(self, txids: List[str]) -> bool:
+        # True if every txid is applied already.
+        known = {t for (t,) in self._in("SELECT txid FROM txs WHERE txid IN (%s)", txids)}
+        return len(known) == len(set(txids))
+
+    def resume_point(self) -> Optional[Tuple[int, str]]:
+        # (end offset, prefix digest) of the last complete pass over a binary dataset
+        r = self._meta().get("resume")
+        return None if not r else tuple(json.loads(r))
+
+    def set_resume_point(self, resume: Optional[Tuple[int, str]]) -> None:
+        self._set_meta(resume=json.dumps(resume) if resume else "")
+
+    def update(self, rows: Iterable[TxRow]) -> int:
+        # Applies the rows whose txid is not in the workspace yet, in order, as
+        # one transaction. Returns the number applied.
+        forest = self._forest()
+        meta = self._meta()
+        counts = {k: int(meta[k]) for k in ("tx_count", "addresses", "graph_nodes", "graph_edges", "bipartite_edges")}
+        clusterer = Clusterer(forest, heuristics=self.heuristics, timing=self.timing, change_links=self.change_links)
+        applied = 0
+        self._db.execute("BEGIN")
+        try:
+            chunk: List[TxRow] = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= _CHUNK:
+                    applied += self._apply(chunk, clusterer, counts)
+                    chunk = []
+            if chunk:
+                applied += self._apply(chunk, clusterer, counts)
+            hits = Counter(json.loads(meta.get("heuristic_hits", "{}")))
+            hits.update(clusterer.pipeline.hits)
+            self._set_meta(heuristic_hits=json.dumps(hits), unions=forest.unions, **counts)
+            self._seconds.update(clusterer.pipeline.seconds)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return applied
+
+    def _apply(self, rows: List[TxRow], clusterer: Clusterer, counts: Dict[str, int]) -> int:
+        t = time.perf_counter()
+        seen = {t for (t,) in self._in("SELECT txid FROM txs WHERE txid IN (%s)", [r.txid for r in rows])}
+        new: List[TxRow] = []
+        for r in rows:
+            if r.txid not in seen:
+                seen.add(r.txid)
+                new.append(r)
+        if not new:
+            self._lap("state", t)
+            return 0
+
+        addrs = list(dict.fromkeys(a for r in new for a, _ in r.ins + r.outs))
+        self.touched.update(addrs)
+        prof = ProfileAggregator(topk=self.topk)
+        ids: Dict[str, int] = {}
+        is_node: Dict[str, int] = {}
+        q = ("SELECT address, id, graph_node, tx_count, in_sat, out_sat, fees, first, last, counterparties, errors,"
+             " hours FROM addresses WHERE address IN (%s)")
+        for a, i, node, n, in_sat, out_sat, fees, first, last, cps, errs, hours in self._in(q, addrs):
+            ids[a] = i
+            is_node[a] = node
+            prof.restore(a, AddressState(
+                n, in_sat, out_sat, fees, first, last,
+                json.loads(cps), json.loads(errs) if errs else {}, json.loads(hours),
+            ))
+        clusterer.pipeline.seed(ids)  # addresses of earlier updates, for fresh_address
+        for a in addrs:
+            if a not in ids:
+                ids[a] = counts["addresses"]
+                counts["addresses"] += 1
+        forest = clusterer.uf
+        forest.load((a for r in new if len(r.ins) >= clusterer.min_inputs for a, _ in r.ins), ids)
+
+        graph = GraphStatsAggregator()
+        graph.addrs.ids = ids  # every address is interned already
+        t = self._lap("state", t)
+        # the aggregators are independent, so each takes the whole chunk in turn
+        for part, agg in (("clustering", clusterer), ("profiling", prof), ("graph", graph)):
+            for r in new:
+                agg.add_row(r)
+            t = self._lap(part, t)
+
+        db = self._db
+        forest.flush(ids)
+        db.executemany("INSERT INTO txs (txid) VALUES (?)", ((r.txid,) for r in new))
+        records = []
+        for a in addrs:
+            st = prof.state(a)
+            p = prof.profile(a)
+            records.append((
+                ids[a], a, is_node.get(a, 0), st.tx_count, st.in_sat, st.out_sat, st.fees, st.first, st.last,
+                json.dumps(st.counterparties, ensure_ascii=False), json.dumps(st.errors) if st.errors else None,
+                json.dumps(p.top_counterparties, ensure_ascii=False), json.dumps(st.hours), render_profile(p),
+            ))
+        db.executemany("INSERT OR REPLACE INTO addresses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", records)
+        db.executemany("INSERT INTO links (spender, change) VALUES (?, ?)",
+                       ((ids[s], ids[ch]) for s, ch in clusterer.iter_links()))
+        clusterer.clear_links()
+        counts["graph_edges"] += db.executemany(
+            "INSERT OR IGNORE INTO edges (key) VALUES (?)", ((k,) for k in graph.edges)
+        ).rowcount
+        counts["graph_nodes"] += db.executemany(
+            "UPDATE addresses SET graph_node = 1 WHERE id = ? AND graph_node = 0", ((i,) for i in graph.addr_nodes)
+        ).rowcount
+        counts["bipartite_edges"] += graph.bi_edges
+        counts["tx_count"] += len(new)
+        self._lap("store", t)
+        return len(new)
+
+    def _lap(self, part: str, since: float) -> float:
+        now = time.perf_counter()
+        self.seconds[part] += now - since
+        return now
+
+    # --- results ----------------------------------------------------------------
+
+    def profiles(self) -> "WorkspaceProfiles":
+        return WorkspaceProfiles(self.path / STATE_FILE)
+
+    def clusters(self) -> ClusteringResult:
+        # Change links are applied in memory only; the workspace keeps the
+        # multi-input forest and the links for the next update.
+        clusterer = Clusterer(self._load_uf(), heuristics=self.heuristics, timing=self.timing,
+                              change_links=self.change_links)
+        q = ("SELECT s.address, c.address FROM links JOIN addresses s ON s.id = links.spender"
+             " JOIN addresses c ON c.id = links.change ORDER BY links.seq")
+        for s, ch in self._db.execute(q):
+            clusterer.add_change(s, ch)
+        clusterer.pipeline.merge(json.loads(self._meta().get("heuristic_hits", "{}")), self._seconds)
+        return clusterer.result()
+
+    def graph_stats(self) -> Dict[str, int]:
+        meta = self._meta()
+        return {
+            "address_graph_nodes": int(meta["graph_nodes"]),
+            "address_graph_edges": int(meta["graph_edges"]),
+            "bipartite_nodes": int(meta["addresses"]) + int(meta["tx_count"]),
+            "bipartite_edges": int(meta["bipartite_edges"]),
+        }
+
+
+class WorkspaceProfiles:
+    # Read-only mapping over the stored profiles (own connection, so it stays
+    # usable after the Workspace is closed). Profiles are built on access;
+    # rendered() yields the stored report text without building them.
+
+    _COLS = "address, tx_count, in_sat, out_sat, fees, first, last, top, hours, errors"
+
+    def __init__(self, path: Path):
+        self._db = sqlite3.connect(str(path))
+        self._labels: Dict[int, str] = {}
+        self._approx = self._db.execute("SELECT v FROM meta WHERE k = 'topk'").fetchone()[0] != ""
+
+    def _profile(self, row: tuple) -> AddressProfile:
+        a, n, in_sat, out_sat, fees, first, last, top, hours, errs = row
+        return address_profile(
+            a, n, in_sat, out_sat, fees, first, last, [(b, c) for b, c in json.loads(top)],
+            json.loads(hours), self._labels, (json.loads(errs) if errs else {}) if self._approx else None,
+        )
+
+    def __contains__(self, a: object) -> bool:
+        return self._db.execute("SELECT 1 FROM addresses WHERE address = ?", (a,)).fetchone() is not None
+
+    def __getitem__(self, a: str) -> AddressProfile:
+        row = self._db.execute(f"SELECT {self._COLS} FROM addresses WHERE address = ?", (a,)).fetchone()
+        if row is None:
+            raise KeyError(a)
+        return self._profile(row)
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM addresses").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        for (a,) in self._db.execute("SELECT address FROM addresses ORDER BY id"):
+            yield a
+
+    def get(self, a: str, default: Optional[AddressProfile] = None) -> Optional[AddressProfile]:
+        try:
+            return self[a]
+        except KeyError:
+            return default
+
+    def items(self) -> Iterator[Tuple[str, AddressProfile]]:
+        for row in self._db.execute(f"SELECT {self._COLS} FROM addresses ORDER BY id"):
+            yield row[0], self._profile(row)
+
+    def rendered(self) -> Iterator[Tuple[str, str]]:
+        yield from self._db.execute("SELECT address, rendered FROM addresses ORDER BY id")
+
+
+@dataclass
+class IncrementalAnalysis:
+    applied: int                        # transactions new in this run
+    tx_count: int
+    touched: Set[str]                   # addresses of the new transactions
+    base: str                           # workspace state before and after the
+    state: str                          # run (see ClusterIndex.update)
+    clusters: ClusteringResult
+    profiles: WorkspaceProfiles
+    enrichment: Optional[ClusterEnrichment]
+
+
+def analyze_incremental(
+    dataset: Path, workspace: Path, out: Path, max_clusters: int = 20,
+    label_store=None, label_cache: Optional[EnrichmentCache] = None, topk: Optional[int] = None,
+    metrics: Optional[Metrics] = None, heuristics: Sequence[str] = DEFAULT_HEURISTICS,
+    change_links: str = "attach",
+) -> IncrementalAnalysis:
+    # Metrics count the transactions decoded from the dataset ("txs", "ios"),
+    # skipped as known without decoding ("txs_skipped", not counting a resumed
+    # prefix) and applied ("txs_applied"); the other counters describe the
+    # whole workspace.
+    stream = DatasetStream(dataset)
+    ios = 0
+
+    with Workspace(workspace, topk, heuristics, metrics is not None, change_links, dataset) as ws:
+        resume = ws.resume_point()
+        start = resume[0] if resume is not None and stream.resumable(*resume) else 0
+        root = ws.root_address
+        base = ws.state
+
+        def rows() -> Iterator[TxRow]:
+            nonlocal ios
+            for row in stream.rows(start, ws.has_txids):
+                ios += len(row.ins) + len(row.outs)
+                yield row
+            # raised inside update(), which then rolls back
+            if root is not None and stream.root_address not in (None, root):
+                raise ValueError(f"{workspace}: workspace holds {root}, dataset {dataset} is {stream.root_address}")
+
+        with stage(metrics, "workspace_update"):
+            applied = ws.update(rows())
+        ws.set_resume_point(stream.resume)
+        if stream.root_address is not None:
+            ws.set_root_address(stream.root_address)
+        with stage(metrics, "clustering"):
+            clusters = ws.clusters()
+        if topk is not None:
+            clusters.notes.append(counterparty_note(topk))
+        profiles, stats = ws.profiles(), ws.graph_stats()
+        tx_count, root, state = ws.tx_count, ws.root_address, ws.state
+        update_seconds = dict(ws.seconds)
+    with stage(metrics, "enrichment"):
+        enrichment = (
+            enrich_clusters(clusters, label_store, label_cache, profiles) if label_store is not None else None
+        )
+    if metrics is not None:
+        metrics.record_analysis(stream.tx_count, ios, clusters, len(profiles), stats)
+        metrics.count("txs_applied", applied)
+        metrics.count("txs_skipped", stream.skipped)
+        metrics.add_parts("workspace_update", update_seconds)
+    with stage(metrics, "report"):
+        write_report(
+            out,
+            root_address=root or "UNKNOWN",
+            tx_count=tx_count,
+            clusters=clusters,
+            profiles=profiles.rendered(),
+            cluster_json=cluster_summaries(clusters, profiles, max_clusters, enrichment),
+            graph_stats=stats,
+            attribution=enrichment.summary() if enrichment is not None else None,
+            address_attribution=enrichment.address_attribution() if enrichment is not None else None,
+            metrics=metrics,
+        )
+    return IncrementalAnalysis(applied, tx_count, ws.touched, base, state, clusters, profiles, enrichment)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules are imported as src.* from the repository root, as main.py does.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,107 @@
+import sqlite3
+
+import pytest
+
+from src.cluster_index import ClusterIndex
+from src.clustering import build_clusters
+from src.dataset_bin import DatasetWriter
+from src.profiling import build_address_profiles, summarize_cluster
+from src.providers.blockstream import Tx, TxIO
+from src.synthetic import SyntheticChain, SyntheticConfig
+from src.workspace import analyze_incremental
+
+
+def tx(txid, ins, outs):
+    return Tx(txid, 0, [TxIO(a, 0.5) for a in ins], [TxIO(a, 0.25) for a in outs], 0.0)
+
+
+TXS = [tx("t1", ["A", "B"], ["P1", "P2"]), tx("t2", ["C", "D", "E"], ["P3", "P4"]), tx("t3", ["P1"], ["P3"])]
+
+
+def build(path, txs=TXS, **kw):
+    clusters, profiles = build_clusters(txs), build_address_profiles(txs)
+    return clusters, profiles, ClusterIndex.build(path, clusters, profiles, **kw)
+
+
+def test_info_matches_the_report_summary(tmp_path):
+    clusters, profiles, idx = build(tmp_path / "i.sqlite", labels={0: {"kinds": {"exchange": 1}}})
+    with idx:
+        for cid, members in enumerate(clusters.clusters):
+            a = min(members)
+            info = idx.info(a, members=2)
+            assert info["cluster"] == clusters.roots[cid] == idx.cluster_of(a)
+            assert info["summary"] == summarize_cluster(members, profiles)
+            assert info["members"] == sorted(members)[:2]
+            assert info["labels"] == ({"kinds": {"exchange": 1}} if cid == 0 else None)
+        single = idx.info("P3")
+        assert single["cluster"] is None and single["members"] == ["P3"]
+        assert single["summary"] == summarize_cluster({"P3"}, profiles)
+        assert idx.info("nowhere") is None
+        assert idx.stats() == {"addresses": 9, "clusters": 2}
+
+
+def test_rebuild_replaces_the_index(tmp_path):
+    path = tmp_path / "i.sqlite"
+    build(path)[2].close()
+    build(path, TXS[:1])[2].close()
+    with ClusterIndex(path) as idx:
+        assert idx.stats() == {"addresses": 4, "clusters": 1} and idx.info("C") is None
+
+
+def test_failed_build_keeps_the_old_index(tmp_path):
+    path = tmp_path / "i.sqlite"
+    clusters, profiles, idx = build(path)
+    idx.close()
+
+    class Broken(dict):
+        def items(self):
+            yield from profiles.items()
+            raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        ClusterIndex.build(path, clusters, Broken(profiles))
+    assert [p.name for p in tmp_path.iterdir()] == ["i.sqlite"]
+    with ClusterIndex(path) as idx:
+        assert idx.stats() == {"addresses": 9, "clusters": 2}
+
+
+def test_incremental_update_matches_a_fresh_build(tmp_path):
+    c = SyntheticChain(SyntheticConfig(n_txs=1200, seed=5))
+    txs = list(c.txs())
+    data, ws, path = tmp_path / "d.bftx", tmp_path / "ws", tmp_path / "i.sqlite"
+    for n, patched in ((700, False), (1200, True)):
+        with DatasetWriter(data, c.root_address, batch_size=100) as w:
+            for t in txs[:n]:
+                w.append_tx(t)
+        ia = analyze_incremental(data, ws, tmp_path / "a.json")
+        idx, updated = ClusterIndex.update(path, ia.clusters, ia.profiles, ia.touched, ia.base, ia.state)
+        assert updated == patched
+        idx.close()
+
+    fresh = ClusterIndex.build(tmp_path / "f.sqlite", ia.clusters, ia.profiles)
+    with ClusterIndex(path) as idx, fresh:
+        assert idx.stats() == fresh.stats()
+        for a in ia.profiles:
+            got, want = idx.info(a, members=None), fresh.info(a, members=None)
+            for s in (got["summary"], want["summary"]):
+                s["total_in_btc"] = pytest.approx(s["total_in_btc"])
+                s["total_out_btc"] = pytest.approx(s["total_out_btc"])
+            assert got == want
+
+
+def test_update_rebuilds_an_index_of_another_state(tmp_path):
+    path = tmp_path / "i.sqlite"
+    clusters, profiles, idx = build(path, state="ws:2")
+    idx.close()
+    idx, updated = ClusterIndex.update(path, clusters, profiles, ["A"], "ws:1", "ws:3")
+    with idx:
+        assert not updated and idx.state == "ws:3" and idx.stats() == {"addresses": 9, "clusters": 2}
+
+
+def test_old_index_format_is_refused(tmp_path):
+    path = tmp_path / "i.sqlite"
+    db = sqlite3.connect(str(path))
+    db.execute("CREATE TABLE addresses (address TEXT PRIMARY KEY, cluster_id INTEGER)")
+    db.close()
+    with pytest.raises(ValueError, match="rebuild it"):
+        ClusterIndex(path)
@@ -0,0 +1,52 @@
+from src.clustering import build_clusters
+from src.providers.blockstream import Tx, TxIO
+
+
+def tx(txid, ins, outs):
+    return Tx(txid, 0, [TxIO(a, 0.001) for a in ins], [TxIO(a, 0.001) for a in outs], 0.0)
+
+
+def clusters(res):
+    return sorted(sorted(c) for c in res.clusters)
+
+
+# A and B, C and D spend together (two payees each, so no change); A then
+# spends to itself and C, the one new output (C: change)
+TXS = [tx("t1", ["A", "B"], ["P1", "P2"]), tx("t2", ["C", "D"], ["P3", "P4"]), tx("t3", ["A"], ["A", "C"])]
+
+
+def test_attach_moves_only_the_change_address():
+    res = build_clusters(TXS)
+    assert clusters(res) == [["A", "B", "C"], ["D"]]
+    assert res.notes == ["Multi-input clusters computed: 2", "Change-address linked: 1"]
+
+
+def test_merge_joins_whole_clusters():
+    res = build_clusters(TXS, change_links="merge")
+    assert clusters(res) == [["A", "B", "C", "D"]]
+    assert res.notes[-1] == "Change links: merge"
+
+
+def test_attach_follows_tx_order():
+    # X -> Y comes before X is attached (A -> X), so Y stays out
+    txs = [tx("t1", ["A", "B"], ["P1", "P2"]), tx("t2", ["X"], ["X", "Y"]), tx("t3", ["A"], ["A", "X"])]
+    assert clusters(build_clusters(txs)) == [["A", "B", "X"]]
+    # the other way round Y follows X into the cluster
+    assert clusters(build_clusters([txs[0], txs[2], txs[1]])) == [["A", "B", "X", "Y"]]
+
+
+def test_later_link_moves_change_address_again():
+    txs = [tx("t1", ["A", "B"], ["P1", "P2"]), tx("t2", ["C", "D"], ["P3", "P4"]),
+           tx("t3", ["A"], ["A", "X"]), tx("t4", ["C"], ["C", "X"])]
+    assert clusters(build_clusters(txs)) == [["A", "B"], ["C", "D", "X"]]
+
+
+def test_clusters_come_in_order_of_first_address():
+    # E, F join the larger A cluster, whose root survives the union; the
+    # cluster is still listed first, where E appeared
+    txs = [tx("t1", ["E", "F"], ["P1", "P2"]), tx("t2", ["G", "H"], ["P3", "P4"]),
+           tx("t3", ["A", "B", "C"], ["P5", "P6"]), tx("t4", ["B", "E"], ["P7", "P8"])]
+    for mode in ("attach", "merge"):
+        assert [sorted(c) for c in build_clusters(txs, change_links=mode).clusters] == [
+            ["A", "B", "C", "E", "F"], ["G", "H"],
+        ]
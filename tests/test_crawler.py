@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_esplora import FakeEsplora
+from src.crawler import AddressCrawler
+from src.providers.blockstream import BlockstreamProvider, RateLimiter, Tx, TxIO
+
+
+def history(address, n, t0=1_700_000_000):
+    # n txs paying `address`, one per minute; newest is served first
+    return [Tx(f"{address}-{i:03d}", t0 + 60 * i, [TxIO(f"S{i}", 0.002)], [TxIO(address, 0.001)], 0.0001)
+            for i in range(n)]
+
+
+def provider(srv, **kw):
+    return BlockstreamProvider(base_url=srv.base_url, **kw)
+
+
+def test_pagination_follows_last_txid():
+    with FakeEsplora(history("A", 60), page_size=25) as srv:
+        p = provider(srv)
+        txs = p.fetch_address_txs("A", limit=1000)
+        assert [t.txid for t in txs] == [f"A-{i:03d}" for i in range(59, -1, -1)]
+        # the short last page is followed by one more (empty) page
+        assert p.requests == 4
+        assert list(srv.hits) == ["/address/A/txs", "/address/A/txs/chain/A-035", "/address/A/txs/chain/A-010",
+                                  "/address/A/txs/chain/A-000"]
+
+
+def test_pagination_stops_at_limit():
+    with FakeEsplora(history("A", 60), page_size=25) as srv:
+        p = provider(srv)
+        assert len(p.fetch_address_txs("A", limit=30)) == 30
+        assert p.requests == 2
+        assert len(p.fetch_address_txs("A", limit=25)) == 25
+        assert p.requests == 3  # a full first page needs no second request
+
+
+def test_429_backs_off_and_retries():
+    with FakeEsplora(history("A", 60), page_size=25, throttle_every=2, retry_after=0.05) as srv:
+        p = provider(srv)
+        t = time.monotonic()
+        txs = p.fetch_address_txs("A", limit=1000)
+        elapsed = time.monotonic() - t
+    assert len(txs) == 60
+    assert p.throttled == srv.throttled == 3
+    assert p.retries == 3 and p.failures == 0
+    assert elapsed >= 3 * 0.05  # each 429 paused for its Retry-After
+
+
+def test_backoff_blocks_every_thread():
+    limiter = RateLimiter()
+    limiter.backoff(0.2)
+    done = []
+
+    def worker():
+        limiter.acquire()
+        done.append(time.monotonic())
+
+    t = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert len(done) == 4 and min(done) - t >= 0.19
+
+
+def test_limiter_rate_is_shared_by_crawler_workers():
+    txs = [t for a in "ABCDEFGH" for t in history(a, 5)]
+    with FakeEsplora(txs) as srv:
+        p = provider(srv, limiter=RateLimiter(rate=40, burst=1), pool_size=8)
+        t = time.monotonic()
+        res = AddressCrawler(p, workers=8).crawl(list("ABCDEFGH"))
+        elapsed = time.monotonic() - t
+    assert len(res.txs) == 40 and p.requests == 16  # a page and an empty page per address
+    # one token at start, then 40/s for all eight workers together
+    assert elapsed >= 15 / 40 * 0.9
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_crawl_expands_counterparties_and_dedupes(workers):
+    # A pays B, B pays C; the A->B tx is in both A's and B's history
+    ab = Tx("ab", 100, [TxIO("A", 1.0)], [TxIO("B", 0.9)], 0.1)
+    bc = Tx("bc", 200, [TxIO("B", 0.9)], [TxIO("C", 0.8)], 0.1)
+    with FakeEsplora([ab, bc]) as srv:
+        res = AddressCrawler(provider(srv), workers=workers).crawl(["A"], max_depth=2)
+    assert [t.txid for t in res.txs] == ["ab", "bc"]
+    assert res.depth == {"A": 0, "B": 1, "C": 2}
+    assert res.duplicates == 2 and not res.failed
+
+
+def test_crawl_reports_failed_addresses():
+    # every request answered with 429: the provider gives up after its retries
+    with FakeEsplora(history("A", 3), throttle_every=1, retry_after=0.01) as srv:
+        p = provider(srv)
+        res = AddressCrawler(p, workers=2).crawl(["A"])
+    assert list(res.failed) == ["A"] and "Blockstream request failed" in res.failed["A"]
+    assert res.txs == [] and p.failures == 1 and p.throttled == 5
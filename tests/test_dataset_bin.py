@@ -0,0 +1,48 @@
+import pytest
+
+from src.dataset import Dataset, write_json_file
+from src.dataset_bin import DatasetWriter
+from src.providers.blockstream import Tx, TxIO
+
+
+def tx(i):
+    return Tx(f"tx{i}", 1_700_000_000 + i, [TxIO("A", 0.5)], [TxIO("B", 0.3), TxIO("A", 0.19)], 0.01)
+
+
+def test_writer_round_trip(tmp_path):
+    path = tmp_path / "d.bftx"
+    with DatasetWriter(path, "A", batch_size=2) as w:
+        for i in range(5):
+            w.append_tx(tx(i))
+    ds = Dataset.load(path)
+    assert ds.root_address == "A"
+    assert [t.txid for t in ds.txs] == [f"tx{i}" for i in range(5)]
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.parametrize("name", ["d.bftx", "d.json"])
+def test_failed_write_leaves_no_dataset(tmp_path, name):
+    path = tmp_path / name
+
+    def txs():
+        yield tx(0)
+        raise RuntimeError("provider went away")
+
+    with pytest.raises(RuntimeError):
+        if name.endswith(".bftx"):
+            with DatasetWriter(path, "A", batch_size=1) as w:
+                for t in txs():
+                    w.append_tx(t)
+        else:
+            write_json_file(path, "A", txs())
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = tmp_path / "d.bftx"
+    Dataset("A", [tx(0), tx(1)]).save(path)
+    with pytest.raises(RuntimeError):
+        with DatasetWriter(path, "A", batch_size=1) as w:
+            w.append_tx(tx(2))
+            raise RuntimeError
+    assert len(Dataset.load(path).txs) == 2
@@ -0,0 +1,57 @@
+from src.clustering import build_clusters
+from src.enrichment import EnrichmentCache, enrich_clusters
+from src.osint import OsintLabelStore
+from src.providers.blockstream import Tx, TxIO
+
+
+def tx(txid, ins, outs):
+    return Tx(txid, 0, [TxIO(a, 0.001) for a in ins], [TxIO(a, 0.001) for a in outs], 0.0)
+
+
+# clusters: {A, B}, {C, D}; P1..P4 are outside any cluster
+TXS = [tx("t1", ["A", "B"], ["P1", "P2"]), tx("t2", ["C", "D"], ["P3", "P4"])]
+ADDRESSES = ["A", "B", "C", "D", "P1", "P2", "P3", "P4"]
+
+
+def store():
+    s = OsintLabelStore()
+    s.add("A", "exchange", "Kraken", "s")
+    s.add("C", "exchange", "Binance", "s")
+    s.add("D", "mixer", "Wasabi", "s")
+    s.add("P2", "service", "Shop", "s")
+    return s
+
+
+def test_labels_reach_every_member_and_unclustered_addresses():
+    clusters = build_clusters(TXS)
+    cid = {a: clusters.addr_to_cluster[a] for a in "AC"}
+    e = enrich_clusters(clusters, store(), addresses=ADDRESSES)
+    assert e.cluster_of("B").names == ["Kraken"]
+    attributed = e.address_attribution()
+    assert attributed == {
+        "A": {"cluster_id": cid["A"], "label": {"kind": "exchange", "name": "Kraken", "source": "s"}},
+        "B": {"cluster_id": cid["A"], "label": None},
+        "C": {"cluster_id": cid["C"], "label": {"kind": "exchange", "name": "Binance", "source": "s"}},
+        "D": {"cluster_id": cid["C"], "label": {"kind": "mixer", "name": "Wasabi", "source": "s"}},
+        "P2": {"cluster_id": None, "label": {"kind": "service", "name": "Shop", "source": "s"}},
+    }
+    summ = e.summary()
+    assert summ["conflicting_clusters"] == [cid["C"]]
+    assert set(summ["clusters"]) == {str(cid["A"]), str(cid["C"])}
+    assert (summ["labeled_addresses"], summ["attributed_addresses"]) == (4, 5)
+
+
+def test_cached_clusters_keep_member_labels(tmp_path):
+    clusters = build_clusters(TXS)
+    s = store()
+    first = enrich_clusters(clusters, s, EnrichmentCache(tmp_path / "c.sqlite", "x"), ADDRESSES)
+    cache = EnrichmentCache(tmp_path / "c.sqlite", "x")
+    looked_up = []
+    lookup_many = s.lookup_many
+    s.lookup_many = lambda addrs: lookup_many(looked_up.extend(addrs) or looked_up)
+    again = enrich_clusters(clusters, s, cache, ADDRESSES)
+    # two clusters and the four addresses outside them, labeled or not
+    assert (cache.hits, cache.misses) == (6, 0)
+    assert looked_up == []
+    assert again.address_attribution() == first.address_attribution()
+    assert again.summary() == first.summary()
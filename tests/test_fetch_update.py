@@ -0,0 +1,61 @@
+from benchmarks.fake_esplora import FakeEsplora, esplora_tx
+from src.dataset import Dataset
+from src.providers.blockstream import BlockstreamProvider, Tx, TxIO
+
+T0 = 1_700_000_000
+
+
+def tx(i, address="A"):
+    return Tx(f"t{i:03d}", T0 + 600 * i, [TxIO(f"S{i}", 0.002)], [TxIO(address, 0.001)], 0.0001)
+
+
+def unconfirmed(t):
+    raw = esplora_tx(t)
+    raw["status"] = {"confirmed": False}
+    return raw
+
+
+def update(txs, stored, **kw):
+    with FakeEsplora(txs) as srv:
+        p = BlockstreamProvider(base_url=srv.base_url)
+        new, complete = p.fetch_new_address_txs("A", Dataset("A", stored).tx_times(), **kw)
+    return new, complete, p.requests
+
+
+def test_update_stops_at_stored_history():
+    hist = [tx(i) for i in range(60)]
+    new, complete, requests = update(hist, hist[:40])
+    assert [t.txid for t in new] == [f"t{i:03d}" for i in range(59, 39, -1)]
+    assert complete and requests == 1
+
+
+def test_tx_stored_unconfirmed_is_refreshed_once_confirmed():
+    hist = [tx(i) for i in range(30)]
+    pending = tx(30)
+    with FakeEsplora(hist + [unconfirmed(pending)]) as srv:
+        stored = BlockstreamProvider(base_url=srv.base_url).fetch_address_txs("A", limit=100)
+    assert stored[0].txid == "t030" and stored[0].time != pending.time  # fetch time, not a block time
+
+    # t030 confirmed since (in the block of t031), and t032 is new
+    later = hist + [Tx("t030", T0 + 600 * 31, pending.vin, pending.vout, pending.fee_btc), tx(32)]
+    new, complete, _ = update(later, stored)
+    assert [t.txid for t in new] == ["t032", "t030"] and complete
+    merged = Dataset("A", stored).merged(new)
+    assert dict(zip(merged.txs.txids, merged.txs.time))["t030"] == T0 + 600 * 31
+    assert len(merged.txs) == 32
+
+
+def test_still_unconfirmed_tx_is_refetched_without_stopping():
+    hist = [tx(i) for i in range(10)]
+    with FakeEsplora(hist + [unconfirmed(tx(10))]) as srv:
+        stored = BlockstreamProvider(base_url=srv.base_url).fetch_address_txs("A", limit=100)
+    new, complete, _ = update(hist + [unconfirmed(tx(10))], stored)
+    assert [t.txid for t in new] == ["t010"] and complete
+
+
+def test_limit_hit_before_stored_history_is_reported():
+    hist = [tx(i) for i in range(60)]
+    new, complete, _ = update(hist, hist[:10], limit=30)
+    assert len(new) == 30 and not complete
+    new, complete, _ = update(hist, hist[:10])
+    assert len(new) == 50 and complete
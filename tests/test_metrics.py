@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from src.metrics import Metrics
+
+
+def test_nested_stage_keeps_the_outer_peak():
+    m = Metrics(memory=True)
+    with m.stage("outer"):
+        big = bytearray(8 << 20)
+        del big
+        with m.stage("inner"):
+            small = bytearray(1 << 20)
+            del small
+    outer, inner = m.stages["outer"]["peak_traced_bytes"], m.stages["inner"]["peak_traced_bytes"]
+    assert outer >= 8 << 20
+    assert 1 << 20 <= inner < 8 << 20
+    assert m.to_json()["peak_traced_bytes"] >= outer
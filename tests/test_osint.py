@@ -0,0 +1,39 @@
+import pytest
+
+from src.osint import Label, SqliteLabelStore
+
+
+def failing(rows):
+    yield from rows
+    raise ValueError("bad line")
+
+
+def test_failed_import_does_not_corrupt_interned_strings(tmp_path):
+    with SqliteLabelStore(tmp_path / "labels.sqlite") as store:
+        store.add_many([("addr0", "exchange", "Kraken", "s")])
+        version = store.fingerprint()
+        with pytest.raises(ValueError):
+            store.add_many(failing([("addr1", "exchange", "Binance", "s"), ("addr1b", "service", "Foo", "bulk")]))
+        assert store.get("addr1") is None and len(store) == 1
+        assert store.fingerprint() == version
+
+        store.add_many([("addr2", "mixer", "Wasabi", "s")])
+        store.add_many([("addr3", "exchange", "Binance", "s")])
+        assert store.get("addr2") == Label("mixer", "Wasabi", "s")
+        assert store.get("addr3") == Label("exchange", "Binance", "s")
+        assert store.get("addr0") == Label("exchange", "Kraken", "s")
+
+    with SqliteLabelStore(tmp_path / "labels.sqlite") as store:  # a fresh cache reads the same
+        assert store.lookup_many(["addr0", "addr2", "addr3"]) == {
+            "addr0": Label("exchange", "Kraken", "s"),
+            "addr2": Label("mixer", "Wasabi", "s"),
+            "addr3": Label("exchange", "Binance", "s"),
+        }
+        assert store.counts() == {"exchange": 2, "mixer": 1}
+
+
+def test_later_rows_replace_earlier(tmp_path):
+    with SqliteLabelStore(tmp_path / "labels.sqlite") as store:
+        assert store.add_many([("a", "exchange", "X", "s"), ("a", "mixer", "Y", "s"), ("ab", "other", "Z", "s")]) == 3
+        assert store.get("a") == Label("mixer", "Y", "s")
+        assert list(store.with_prefix("a")) == ["a", "ab"]
@@ -0,0 +1,43 @@
+from dataclasses import asdict
+
+import pytest
+
+from src.clustering import build_clusters
+from src.edgelist import build_edge_list
+from src.parallel import analyze_parallel
+from src.profiling import build_address_profiles
+from src.synthetic import SyntheticChain, SyntheticConfig
+from src.txtable import TxTable
+
+
+@pytest.fixture(scope="module")
+def table():
+    return TxTable.from_txs(SyntheticChain(SyntheticConfig(n_txs=3000, seed=3)).txs())
+
+
+@pytest.mark.parametrize("topk", [None, 4])
+def test_workers_reproduce_one_process(table, topk):
+    clusters = build_clusters(table)
+    profiles = build_address_profiles(table, topk=topk)
+    res = analyze_parallel(table, 3, topk=topk)
+    assert [sorted(c) for c in res.clusters.clusters] == [sorted(c) for c in clusters.clusters]
+    # profile order, float fee sums and counterparty tie order included
+    assert [(a, asdict(p)) for a, p in res.profiles.items()] == [(a, asdict(p)) for a, p in profiles.items()]
+    assert res.graph_stats == build_edge_list(table).stats()
+
+
+def test_table_columns_reproduce_rows(table):
+    # the column-wise paths (TxTable.inputs/outputs) against the TxRow ones
+    from src.graph_build import GraphStatsAggregator
+    from src.heuristics import HEURISTICS
+    from src.providers.blockstream import Tx, TxIO
+
+    unknown = Tx("u", 0, [TxIO("UNKNOWN", 1.0), TxIO("A1", 0.5)], [TxIO("UNKNOWN", 0.2), TxIO("B1", 1.2)], 0.1)
+    txs = list(table) + [unknown]
+    cols = TxTable.from_txs(txs)
+    for heuristics in (("unique_new_output",), tuple(HEURISTICS)):
+        a, b = build_clusters(cols, heuristics=heuristics), build_clusters(iter(txs), heuristics=heuristics)
+        assert [sorted(c) for c in a.clusters] == [sorted(c) for c in b.clusters] and a.heuristics == b.heuristics
+    assert [(a, asdict(p)) for a, p in build_address_profiles(cols).items()] == \
+        [(a, asdict(p)) for a, p in build_address_profiles(iter(txs)).items()]
+    assert GraphStatsAggregator().add_txs(cols).stats() == GraphStatsAggregator().add_txs(iter(txs)).stats()
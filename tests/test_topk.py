@@ -0,0 +1,44 @@
+from collections import Counter
+
+from src.profiling import ProfileAggregator
+from src.providers.blockstream import Tx, TxIO
+from src.topk import SpaceSaving
+
+
+def test_reads_do_not_evict():
+    c = SpaceSaving.sized(2)()
+    c["a"] += 3
+    c["b"] += 1
+    assert c["x"] == 0 and c.get("y") is None and "x" not in c
+    assert dict(c) == {"a": 3, "b": 1} and c.errors == {}
+
+
+def test_new_key_at_capacity_replaces_the_minimum():
+    c = SpaceSaving.sized(2)()
+    for k in "aaabc":
+        c[k] += 1
+    assert dict(c) == {"a": 3, "c": 2} and c.errors == {"c": 1}
+    c["d"] += 5
+    assert dict(c) == {"a": 3, "d": 7} and c.errors == {"d": 2}
+
+
+def test_counts_bound_the_true_counts():
+    stream = [f"k{i % 7}" if i % 3 else f"k{i % 40}" for i in range(2000)]
+    c = SpaceSaving.sized(8)()
+    for k in stream:
+        c[k] += 1
+    true = Counter(stream)
+    for k, n in c.items():
+        assert n - c.errors.get(k, 0) <= true[k] <= n
+    assert c.error_bound() <= len(stream) // 8
+
+
+def test_approx_profiles_report_per_entry_errors():
+    txs = [Tx(f"t{i}", i, [TxIO("H", 0.001)], [TxIO(f"P{i % 5}", 0.001)], 0.0) for i in range(12)]
+    exact = ProfileAggregator().add_txs(txs).profile("H")
+    approx = ProfileAggregator(topk=2).add_txs(txs).profile("H")
+    assert exact.counterparty_errors is None
+    assert len(approx.counterparty_errors) == len(approx.top_counterparties)
+    true = dict(exact.top_counterparties)
+    for (b, n), err in zip(approx.top_counterparties, approx.counterparty_errors):
+        assert n - err <= true[b] <= n
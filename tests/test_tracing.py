@@ -0,0 +1,30 @@
+from src.providers.blockstream import Tx, TxIO
+from src.tracing import FlowIndex
+
+
+def flows(*edges):
+    # (src, dst, btc, time) -> one single-input, single-output tx each
+    return FlowIndex.build([
+        Tx(f"t{i}", t, [TxIO(s, v)], [TxIO(d, v)], 0.0) for i, (s, d, v, t) in enumerate(edges)
+    ])
+
+
+def taint(result):
+    return {r["address"]: r["btc"] for r in result.top()}
+
+
+def test_poison_follows_each_flow_once():
+    # A is reached again, earlier, through B: A -> C must not be tainted twice
+    idx = flows(("S", "A", 1.0, 100), ("S", "B", 1.0, 10), ("B", "A", 1.0, 50), ("A", "C", 3.0, 200))
+    res = idx.trace(["S"], max_hops=5, mode="poison")
+    assert taint(res) == {"A": 2.0, "C": 3.0, "B": 1.0}
+    assert res.edges == 4
+
+
+def test_haircut_never_exceeds_a_flow():
+    # 4 BTC reach A over two paths, only 3 can leave through A -> C
+    idx = flows(("S", "A", 2.0, 10), ("S", "B", 2.0, 20), ("B", "A", 2.0, 30), ("A", "C", 3.0, 40))
+    res = idx.trace(["S"], max_hops=5)
+    assert taint(res) == {"A": 4.0, "B": 2.0, "C": 3.0}
+    assert res.edges == 4
+
@@ -0,0 +1,55 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.clustering import build_clusters
+from src.dataset import Dataset
+from src.profiling import build_address_profiles
+from src.synthetic import SyntheticChain, SyntheticConfig
+from src.txtable import TimeIndex, TxTable
+from src.windows import iter_windows
+
+ROOT = Path(__file__).resolve().parent.parent
+DAY = 86400
+
+
+@pytest.fixture(scope="module")
+def table():
+    return TxTable.from_txs(SyntheticChain(SyntheticConfig(n_txs=2000, seed=11)).txs())
+
+
+def test_range_without_txs_gives_no_windows(table):
+    index = TimeIndex(table.time)
+    assert list(iter_windows(table, DAY, t_from=index.last() + DAY)) == []
+    assert list(iter_windows(table, DAY, t_to=index.first() - DAY)) == []
+    with pytest.raises(ValueError, match="empty time range"):
+        list(iter_windows(table, DAY, t_from=index.first() + DAY, t_to=index.first()))
+
+
+def test_windows_match_analyze_on_the_same_slices(table):
+    index = TimeIndex(table.time)
+    windows = list(iter_windows(table, DAY, t_from=index.first(), t_to=index.last() + 1))
+    assert len(windows) > 1
+    for w in windows:
+        part = table.take(index.select(w["from"], w["to"]))
+        clusters = build_clusters(part).clusters
+        assert w["txs"] == len(part)
+        assert w["addresses"] == len(build_address_profiles(part))
+        assert w["clusters"] == len(clusters)
+        assert w["largest_cluster"] == max((len(c) for c in clusters), default=0)
+
+
+def test_failed_window_run_leaves_no_output(tmp_path):
+    data = tmp_path / "ds.json"
+    Dataset("synthetic", list(SyntheticChain(SyntheticConfig(n_txs=200, seed=2)).txs())).save(data)
+    out = tmp_path / "w.jsonl"
+    run = lambda *a: subprocess.run([sys.executable, "main.py", "analyze", str(data), "--window", "7d", "--out", str(out),
+                                     *a], cwd=ROOT, capture_output=True, text=True)
+    r = run("--from", "2100-01-01")
+    assert r.returncode == 0 and out.read_text() == ""
+    out.unlink()
+    r = run("--from", "2024-02-01", "--to", "2024-01-01")
+    assert r.returncode == 1 and "empty time range" in r.stderr and "Traceback" not in r.stderr
+    assert not out.exists() and list(tmp_path.iterdir()) == [data]
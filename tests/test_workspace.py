@@ -0,0 +1,98 @@
+import pytest
+
+from src import workspace
+from src.clustering import Clusterer
+from src.dataset_bin import DatasetReader, DatasetWriter
+from src.metrics import Metrics
+from src.streaming import analyze_stream
+from src.synthetic import SyntheticChain, SyntheticConfig
+from src.workspace import Workspace, analyze_incremental
+
+
+@pytest.fixture(scope="module")
+def chain():
+    c = SyntheticChain(SyntheticConfig(n_txs=1200, seed=5))
+    return c.root_address, list(c.txs())
+
+
+def write(path, root, txs):
+    with DatasetWriter(path, root, batch_size=100) as w:
+        for t in txs:
+            w.append_tx(t)
+
+
+def test_appended_dataset_resumes_after_last_pass(tmp_path, chain):
+    root, txs = chain
+    data, ws = tmp_path / "d.bftx", tmp_path / "ws"
+    write(data, root, txs[:700])
+    analyze_incremental(data, ws, tmp_path / "a.json")
+
+    write(data, root, txs)
+    m = Metrics()
+    res = analyze_incremental(data, ws, tmp_path / "a.json", metrics=m)
+    assert res.applied == 500 and m.counters["txs"] == 500 and m.counters["txs_skipped"] == 0
+
+    # nothing new, and the report is the one of a full pass
+    assert analyze_incremental(data, ws, tmp_path / "a.json").applied == 0
+    analyze_stream(data, tmp_path / "s.json")
+    assert (tmp_path / "a.json").read_bytes() == (tmp_path / "s.json").read_bytes()
+
+
+def test_stored_forest_is_the_one_pass_union_find(tmp_path, chain, monkeypatch):
+    # several chunks per run, each loading and writing back only its trees
+    monkeypatch.setattr(workspace, "_CHUNK", 97)
+    root, txs = chain
+    data, ws = tmp_path / "d.bftx", tmp_path / "ws"
+    for n in (300, 700, 1200):
+        write(data, root, txs[:n])
+        analyze_incremental(data, ws, tmp_path / "a.json")
+    with Workspace(ws) as w:
+        uf, resume = w._load_uf(), w.resume_point()
+    one = Clusterer().add_txs(txs).uf
+    assert uf.names == one.names and uf.unions == one.unions
+    roots = [one.find(i) for i in range(len(one))]
+    assert [uf.find(i) for i in range(len(uf))] == roots
+    assert [uf.size[r] for r in roots] == [one.size[r] for r in roots]
+    # the resumed passes hashed only what was appended, to the same digest
+    with DatasetReader(data) as r:
+        assert resume == (r.end, r.digest(r.end).hexdigest())
+
+
+def test_rewritten_dataset_skips_known_batches_undecoded(tmp_path, chain, monkeypatch):
+    root, txs = chain
+    data, ws = tmp_path / "d.bftx", tmp_path / "ws"
+    write(data, root, txs[:700])
+    analyze_incremental(data, ws, tmp_path / "a.json")
+
+    # new transactions first, as fetch --update writes them: the prefix changed
+    write(data, root, txs[700:] + txs[:700])
+    decoded = []
+    read_batch = DatasetReader._read_batch
+    monkeypatch.setattr(DatasetReader, "_read_batch", lambda self, pos, *a: decoded.append(pos) or read_batch(self, pos, *a))
+    m = Metrics()
+    res = analyze_incremental(data, ws, tmp_path / "a.json", metrics=m)
+    assert res.applied == 500 and m.counters["txs_skipped"] == 700
+    assert len(decoded) == 5
+
+
+def test_workspace_refuses_another_dataset(tmp_path, chain):
+    root, txs = chain
+    ws = tmp_path / "ws"
+    write(tmp_path / "d.bftx", root, txs[:300])
+    analyze_incremental(tmp_path / "d.bftx", ws, tmp_path / "a.json")
+    write(tmp_path / "e.bftx", root, txs)
+    with pytest.raises(ValueError, match="belongs to dataset"):
+        analyze_incremental(tmp_path / "e.bftx", ws, tmp_path / "a.json")
+
+
+def test_workspace_refuses_another_root_address(tmp_path, chain):
+    root, txs = chain
+    data, ws = tmp_path / "d.bftx", tmp_path / "ws"
+    write(data, root, txs[:300])
+    analyze_incremental(data, ws, tmp_path / "a.json")
+    write(data, "bc1qother", txs)
+    with pytest.raises(ValueError, match="workspace holds"):
+        analyze_incremental(data, ws, tmp_path / "a.json")
+    # rolled back: the original dataset still applies cleanly
+    write(data, root, txs[:300])
+    assert analyze_incremental(data, ws, tmp_path / "a.json").applied == 0